@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import datetime
+import platform
+import resource
+import multiprocessing
+
+# registered benchmarks: name -> function(scale) returning a dictionary of metrics
+BENCHMARKS = {}
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# metrics describing the size of a benchmark, not compared with the baseline
+INFORMATIONAL_METRICS = {'records', 'runs', 'schedules'}
+
+
+def benchmark(name):
+    """
+    Register a benchmark function. Metrics whose name ends with '_per_second' are better when higher, the other
+    metrics (durations, memory, jitter) are better when lower
+    """
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def is_higher_better(metric):
+    return metric.endswith('_per_second')
+
+
+def run_case(name, scale, queue):
+    try:
+        metrics = BENCHMARKS[name](scale)
+        metrics['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        queue.put((name, metrics, None))
+    except Exception as e:
+        queue.put((name, None, repr(e)))
+
+
+def run_benchmarks(names=None, scale=1.0, verbose=True):
+    """
+    Run the benchmarks, each one in its own process so that its peak RSS is not shared with the other ones
+    """
+    load_benchmarks()
+    if names is None:
+        names = list(BENCHMARKS)
+    results = {}
+    errors = {}
+    queue = multiprocessing.Queue()
+    for name in names:
+        if name not in BENCHMARKS:
+            raise KeyError("Benchmark '{}' not found".format(name))
+        process = multiprocessing.Process(target=run_case, args=(name, scale, queue))
+        process.start()
+        case_name, metrics, error = queue.get()
+        process.join()
+        if error is not None:
+            errors[name] = error
+        else:
+            results[name] = metrics
+        if verbose:
+            print('{}: {}'.format(name, error if error is not None else ', '.join(
+                '{}={:.6g}'.format(metric, value) for metric, value in metrics.items())))
+    return {
+        'created_time': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'scale': scale,
+        'results': results,
+        'errors': errors,
+    }
+
+
+def compare_results(results, baseline, tolerance=0.1):
+    """
+    Compare results with baseline results, return the list of (benchmark, metric, baseline value, value) of the
+    metrics worse than the baseline by more than tolerance (relative)
+    """
+    regressions = []
+    for name, metrics in results['results'].items():
+        baseline_metrics = baseline['results'].get(name)
+        if baseline_metrics is None:
+            continue
+        for metric, value in metrics.items():
+            baseline_value = baseline_metrics.get(metric)
+            if metric in INFORMATIONAL_METRICS or not baseline_value:
+                continue
+            change = (value - baseline_value) / abs(baseline_value)
+            if (is_higher_better(metric) and change < -tolerance) or (not is_higher_better(metric) and change > tolerance):
+                regressions.append((name, metric, baseline_value, value))
+    return regressions
+
+
+def load_benchmarks():
+    # importing the benchmark modules registers their benchmarks
+    if ROOT_DIRECTORY not in sys.path:
+        sys.path.insert(0, ROOT_DIRECTORY)
+    from benchmarks import generator_benchmarks, scheduler_benchmarks, sink_benchmarks
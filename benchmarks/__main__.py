@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import json
+import argparse
+
+from benchmarks import BENCHMARKS, run_benchmarks, compare_results, load_benchmarks
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmark generators, sinks and schedulers')
+    parser.add_argument('names', nargs='*', help='benchmarks to run, all of them if not set')
+    parser.add_argument('--list', action='store_true', help='list the benchmarks and exit')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply the size of every benchmark')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare the results with this JSON results file')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='relative change flagged as a regression')
+    arguments = parser.parse_args()
+
+    load_benchmarks()
+    if arguments.list:
+        for name in BENCHMARKS:
+            print(name)
+        return 0
+
+    results = run_benchmarks(arguments.names or None, arguments.scale)
+    if arguments.output:
+        with open(arguments.output, 'w') as fp:
+            json.dump(results, fp, indent=2)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as fp:
+            baseline = json.load(fp)
+        regressions = compare_results(results, baseline, arguments.tolerance)
+        for name, metric, baseline_value, value in regressions:
+            print('REGRESSION {} {}: {:.6g} -> {:.6g}'.format(name, metric, baseline_value, value))
+        if regressions:
+            return 1
+    return 1 if results['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import random
+import tempfile
+import tracemalloc
+
+from benchmarks import benchmark, ROOT_DIRECTORY
+from generators.base_generator import BaseGenerator, numpy
+from generators.file_generator import FileGenerator, pyarrow, zstandard
+from generators.entity_pool import EntityPool
+
+FIELD_COUNT = 10
+
+# one data config per field type, used to build the synthetic configs
+FIELD_TYPES = {
+    'numeric': {"type": "numeric", "lower-bound": 0, "upper-bound": 1000000},
+    'float': {"type": "float", "lower-bound": 0, "upper-bound": 1000},
+    'string': {"type": "string", "length": 32},
+    'datetime': {"type": "datetime", "lower-bound": "YEAR-60", "upper-bound": "YEAR-20"},
+    'list': ["red", "green", "blue", "yellow"],
+    'constant': "constant value",
+    'variable': {"type": "variable", "id": "shared"},
+    'unique_permutation': {"type": "numeric", "lower-bound": 0, "upper-bound": 1000000000000, "unique": "permutation"},
+    'unique_bitmap': {"type": "numeric", "lower-bound": 0, "upper-bound": 10000000, "unique": "bitmap"},
+    'unique_bloom': {"type": "string", "length": 16, "unique": "bloom", "capacity": 1000000},
+    'weighted_choice': {"type": "choice", "values": list(range(0, 10000)), "weights": [1 / (i + 1) for i in range(0, 10000)]},
+    'normal': {"type": "float", "lower-bound": 0, "upper-bound": 1000, "distribution": "normal", "mean": 500, "stddev": 100},
+    'poisson': {"type": "numeric", "lower-bound": 0, "upper-bound": 1000, "distribution": "poisson", "lambda": 20},
+    'zipf': {"type": "numeric", "lower-bound": 1, "upper-bound": 1000000, "distribution": "zipf", "skew": 1.1},
+}
+
+# (output format, compression, whether the modules they need are installed) of the file benchmarks
+FILE_OUTPUTS = [
+    ('json', None, True),
+    ('ndjson', None, True),
+    ('ndjson', 'gzip', True),
+    ('ndjson', 'zstd', zstandard is not None),
+    ('parquet', None, pyarrow is not None),
+    ('parquet', 'zstd', pyarrow is not None),
+    ('arrow', None, pyarrow is not None),
+    ('arrow', 'zstd', pyarrow is not None),
+]
+
+
+def get_corpus():
+    corpus = {'sample_config': BaseGenerator.sample}
+    samples_directory = os.path.join(ROOT_DIRECTORY, 'samples')
+    for filename in sorted(os.listdir(samples_directory)):
+        if filename.endswith('.json'):
+            with open(os.path.join(samples_directory, filename)) as fp:
+                corpus[filename[:-len('.json')].replace('-', '_')] = fp.read()
+    return corpus
+
+
+def get_synthetic_config(field_type):
+    # one object of FIELD_COUNT fields of the same type
+    fields = {'{}_{}'.format(field_type, index): FIELD_TYPES[field_type] for index in range(0, FIELD_COUNT)}
+    return json.dumps({"variables": {"shared": {"type": "numeric", "lower-bound": 0, "upper-bound": 100}},
+                       "objects": [fields]})
+
+
+def measure_generate(job_config, generate_time, vectorized=False):
+    generator = BaseGenerator(job_config=job_config, vectorized=vectorized)
+    generator.generate(min(generate_time, 1000))  # warm up
+    start = time.perf_counter()
+    records = len(generator.generate(generate_time))
+    elapsed = time.perf_counter() - start
+    return {'records': records, 'records_per_second': records / elapsed}
+
+
+def get_size(path):
+    # size of a file, or of all the files of a directory
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(directory, filename))
+               for directory, directories, filenames in os.walk(path) for filename in filenames)
+
+
+def measure_file(job_config, generate_time, output_format, compression=None):
+    with tempfile.TemporaryDirectory() as directory:
+        generator = FileGenerator(job_config=job_config, directory=directory, filename='benchmark', output_format=output_format,
+                                  compression=compression)
+        start = time.perf_counter()
+        records = generator.generate(generate_time, append=False)
+        elapsed = time.perf_counter() - start
+        size = get_size(generator.get_full_filename())
+    return {'records_per_second': records / elapsed, 'bytes_per_second': size / elapsed,
+            'bytes_per_record': size / records if records else 0}
+
+
+def register_corpus_benchmarks():
+    for name, job_config in get_corpus().items():
+        benchmark('generate.{}'.format(name))(
+            lambda scale, job_config=job_config: measure_generate(job_config, int(200000 * scale)))
+        benchmark('generate_vectorized.{}'.format(name))(
+            lambda scale, job_config=job_config: measure_generate(job_config, int(1000000 * scale), vectorized=True)
+            if numpy is not None else {})
+        for output_format, compression, available in FILE_OUTPUTS:
+            output_name = output_format if compression is None else '{}_{}'.format(output_format, compression)
+            benchmark('file_{}.{}'.format(output_name, name))(
+                lambda scale, job_config=job_config, output_format=output_format, compression=compression, available=available:
+                    measure_file(job_config, int(200000 * scale), output_format, compression) if available else {})
+
+
+def register_field_type_benchmarks():
+    for field_type in FIELD_TYPES:
+        def measure_field_type(scale, field_type=field_type):
+            metrics = measure_generate(get_synthetic_config(field_type), int(100000 * scale))
+            metrics['ns_per_value'] = 1e9 / (metrics['records_per_second'] * FIELD_COUNT)
+            return metrics
+        benchmark('field_type.{}'.format(field_type))(measure_field_type)
+
+
+def measure_construct(job_config, count, cached):
+    # generators built from the same stored generator config, as schedulers sharing one generator are
+    generator_id = 'benchmark' if cached else None
+    start = time.perf_counter()
+    for index in range(0, count):
+        BaseGenerator(job_config=job_config, generator_id=generator_id, edited_time='2020-01-01 00:00:00')
+    elapsed = time.perf_counter() - start
+    return {'generators_per_second': count / elapsed, 'us_per_generator': 1e6 * elapsed / count}
+
+
+@benchmark('construct.uncached')
+def measure_construct_uncached(scale):
+    return measure_construct(get_corpus()['sample_1'], int(5000 * scale), False)
+
+
+@benchmark('construct.cached')
+def measure_construct_cached(scale):
+    return measure_construct(get_corpus()['sample_1'], int(5000 * scale), True)
+
+
+def measure_entity_pool(key_count, draw_count, distribution):
+    pool = EntityPool('benchmark', 'integer', 4)
+    start = time.perf_counter()
+    for key in range(0, key_count):
+        pool.add(key)
+    add_elapsed = time.perf_counter() - start
+    sample = pool.get_sampler(random.random, distribution, 1.1)
+    start = time.perf_counter()
+    for index in range(0, draw_count):
+        sample()
+    draw_elapsed = time.perf_counter() - start
+    return {'ns_per_add': 1e9 * add_elapsed / key_count, 'ns_per_draw': 1e9 * draw_elapsed / draw_count,
+            'bytes_per_key': pool.nbytes / key_count}
+
+
+@benchmark('entity_pool.uniform')
+def measure_entity_pool_uniform(scale):
+    return measure_entity_pool(int(2000000 * scale), int(500000 * scale), 'uniform')
+
+
+@benchmark('entity_pool.zipf')
+def measure_entity_pool_zipf(scale):
+    return measure_entity_pool(int(2000000 * scale), int(500000 * scale), 'zipf')
+
+
+def measure_memory(job_config, generate_time, representation):
+    """
+    Memory allocated per generated record held in memory: as dictionaries ('dicts', generate()), or in compact form
+    as rows ('rows', generate_rows()) or as numpy columns ('columns', generate_rows() of the vectorized engine)
+    """
+    generator = BaseGenerator(job_config=job_config, vectorized=representation == 'columns')
+    generator.generate(1000)  # warm up
+    tracemalloc.start()
+    objects = generator.generate(generate_time) if representation == 'dicts' else generator.generate_rows(generate_time)
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    records = len(objects)
+    return {'records': records, 'bytes_per_record': size / records}
+
+
+@benchmark('memory.dicts')
+def measure_memory_dicts(scale):
+    return measure_memory(get_corpus()['sample_1'], int(200000 * scale), 'dicts')
+
+
+@benchmark('memory.rows')
+def measure_memory_rows(scale):
+    return measure_memory(get_corpus()['sample_1'], int(200000 * scale), 'rows')
+
+
+@benchmark('memory.columns')
+def measure_memory_columns(scale):
+    return measure_memory(get_corpus()['sample_1'], int(200000 * scale), 'columns') if numpy is not None else {}
+
+
+register_corpus_benchmarks()
+register_field_type_benchmarks()
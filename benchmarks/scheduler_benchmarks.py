@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import sqlite3
+import datetime
+import tempfile
+
+from benchmarks import benchmark
+from generators.base_generator import BaseGenerator
+from schedulers.base_scheduler import BaseScheduler
+from schedulers.scheduler_host import SchedulerHost
+from schedulers.schedule_loader import ScheduleLoader
+
+
+class JitterScheduler(BaseScheduler):
+    """
+    Schedule running every 'interval' seconds, recording how late every run starts
+    """
+
+    def __init__(self, scheduler_id, interval, generator):
+        super().__init__(scheduler_id, {'type': 'benchmark', 'status': 'Active'}, generator)
+        self.interval = interval
+        self.planned_run = None
+        self.lateness = []
+
+    def get_next_run(self, now):
+        self.planned_run = now + datetime.timedelta(0, self.interval)
+        return self.planned_run
+
+    def execute(self):
+        self.lateness.append((datetime.datetime.now() - self.planned_run).total_seconds())
+        self.generator.generate(1)
+
+    def terminate(self):
+        pass
+
+
+@benchmark('scheduler_host.wake_up_jitter')
+def measure_wake_up_jitter(scale):
+    generator = BaseGenerator(job_config=BaseGenerator.sample)
+    host = SchedulerHost(max_workers=4)
+    schedulers = [JitterScheduler(str(index), 0.05, generator) for index in range(0, max(1, int(100 * scale)))]
+    for scheduler in schedulers:
+        host.add(scheduler)
+    host.start()
+    time.sleep(max(1.0, 3 * scale))
+    host.stop()
+
+    lateness = sorted(value for scheduler in schedulers for value in scheduler.lateness)
+    if not lateness:
+        return {}
+    return {
+        'schedules': len(schedulers),
+        'runs': len(lateness),
+        'mean_jitter_ms': 1000 * sum(lateness) / len(lateness),
+        'p99_jitter_ms': 1000 * lateness[int(0.99 * (len(lateness) - 1))],
+        'max_jitter_ms': 1000 * lateness[-1],
+    }
+
+
+@benchmark('schedule_loader.reload')
+def measure_schedule_reload(scale):
+    """
+    Load thousands of schedules from the schedulers table, then poll it without changes and after editing one of them
+    """
+    count = max(10, int(5000 * scale))
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, 'schedules.db')
+        connection = sqlite3.connect(database)
+        connection.execute('CREATE TABLE generators (id TEXT, name TEXT, config TEXT, created_by TEXT, created_time TEXT, edited_by TEXT, edited_time TEXT)')
+        connection.execute('CREATE TABLE schedulers (id TEXT, name TEXT, generator_id TEXT, config TEXT, status TEXT, created_by TEXT, created_date TEXT, edited_by TEXT, edited_date TEXT)')
+        connection.executemany('INSERT INTO generators (id, config, edited_time) VALUES (?, ?, ?)',
+                               [(str(index), json.dumps(BaseGenerator.sample), '2020-01-01 00:00:00') for index in range(0, 100)])
+        schedule = {'type': 'batch', 'generating_time': 10, 'interval': 'daily', 'detail': {'hour': 3, 'minute': 0}}
+        connection.executemany('INSERT INTO schedulers (id, generator_id, config, status, edited_date) VALUES (?, ?, ?, ?, ?)',
+                               [(str(index), str(index % 100), json.dumps(schedule), 'Active', str(datetime.datetime(2020, 1, 1) + datetime.timedelta(0, index)))
+                                for index in range(0, count)])
+        connection.commit()
+
+        loader = ScheduleLoader(SchedulerHost(), database)
+        start = time.perf_counter()
+        loader.poll()
+        load_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        loader.poll()
+        unchanged_seconds = time.perf_counter() - start
+        schedule['detail']['hour'] = 4
+        connection.execute('UPDATE schedulers SET config = ?, edited_date = ? WHERE id = ?', (json.dumps(schedule), '2021-01-01 00:00:00', '0'))
+        connection.commit()
+        connection.close()
+        start = time.perf_counter()
+        loader.poll()
+        edited_seconds = time.perf_counter() - start
+    return {
+        'schedules': count,
+        'load_schedules_per_second': count / load_seconds,
+        'unchanged_poll_ms': 1000 * unchanged_seconds,
+        'edited_poll_ms': 1000 * edited_seconds,
+    }
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import operator
+import sqlite3
+import tempfile
+
+from benchmarks import benchmark
+from benchmarks.generator_benchmarks import get_corpus
+from generators.base_generator import BaseGenerator
+from generators.file_generator import FileGenerator, get_arrow_array, pyarrow
+from generators.database_generator import DatabaseGenerator
+
+
+@benchmark('database.batched_insert')
+def measure_batched_insert(scale):
+    with tempfile.TemporaryDirectory() as directory:
+        generator = DatabaseGenerator(job_config=get_corpus()['sample_1'],
+                                      database_uri='sqlite:///{}'.format(os.path.join(directory, 'benchmark.db')))
+        start = time.perf_counter()
+        rows = generator.generate(int(500000 * scale))
+        elapsed = time.perf_counter() - start
+    return {'records': rows, 'rows_per_second': rows / elapsed}
+
+
+@benchmark('database.naive_insert')
+def measure_naive_insert(scale):
+    """
+    Baseline of database.batched_insert: one INSERT and one commit per row, as a row by row ORM load does
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        generator = BaseGenerator(job_config=get_corpus()['sample_1'])
+        simulated_objects = generator.generate_grouped(int(20000 * scale))
+        connection = sqlite3.connect(os.path.join(directory, 'benchmark.db'))
+        for object_index in range(0, len(simulated_objects)):
+            connection.execute('CREATE TABLE object_{} (customer_id TEXT, birthdate DATETIME)'.format(object_index))
+        start = time.perf_counter()
+        rows = 0
+        for object_index, objects in enumerate(simulated_objects):
+            for simulated_object in objects:
+                connection.execute('INSERT INTO object_{} (customer_id, birthdate) VALUES (?, ?)'.format(object_index),
+                                   (simulated_object['customer_id'], simulated_object['birthdate']))
+                connection.commit()
+                rows += 1
+        elapsed = time.perf_counter() - start
+        connection.close()
+    return {'records': rows, 'rows_per_second': rows / elapsed}
+
+
+def measure_file_and_database(scale, queue_size):
+    with tempfile.TemporaryDirectory() as directory:
+        job_config = get_corpus()['sample_1']
+        generator = BaseGenerator(job_config=job_config, queue_size=queue_size)
+        sinks = [FileGenerator(job_config=job_config, directory=directory, filename='benchmark', output_format='ndjson',
+                               compression='gzip'),
+                 DatabaseGenerator(job_config=job_config, database_uri='sqlite:///{}'.format(os.path.join(directory, 'benchmark.db')))]
+        start = time.perf_counter()
+        records = generator.generate_to(sinks, int(200000 * scale))
+        elapsed = time.perf_counter() - start
+    return {'records': records, 'records_per_second': records / elapsed}
+
+
+@benchmark('pipeline.file_and_database')
+def measure_pipelined_file_and_database(scale):
+    """
+    Objects generated once and written to a gzip file and a database, the stages running concurrently
+    """
+    return measure_file_and_database(scale, 4)
+
+
+@benchmark('pipeline.sequential_file_and_database')
+def measure_sequential_file_and_database(scale):
+    """
+    Baseline of pipeline.file_and_database: every batch generated, serialized and written one after the other
+    """
+    return measure_file_and_database(scale, 0)
+
+
+def serialize_dicts(output_format, objects, schemas):
+    """
+    Serialization of the objects as dictionaries grouped by object type, as the sinks did before serializing from
+    the compact form
+    """
+    if output_format == 'ndjson':
+        return ''.join([json.dumps(simulated_object) + '\n' for simulated_objects in objects for simulated_object in simulated_objects])
+    if output_format == 'parquet':
+        return [pyarrow.RecordBatch.from_arrays([get_arrow_array(list(map(operator.itemgetter(key), simulated_objects)), data_type)
+                                                 for key, data_type in schema], names=[key for key, data_type in schema])
+                for schema, simulated_objects in zip(schemas, objects) if simulated_objects]
+    return [list(map(operator.itemgetter(*[key for key, data_type in schema]), simulated_objects))
+            for schema, simulated_objects in zip(schemas, objects) if simulated_objects]
+
+
+def measure_serialize(scale, output_format, representation):
+    """
+    Records serialized per second by the sink of an output format ('ndjson', 'parquet' or 'database'), from the
+    compact form ('rows') or from dictionaries ('dicts')
+    """
+    if output_format == 'parquet' and pyarrow is None:
+        return {}
+    with tempfile.TemporaryDirectory() as directory:
+        job_config = get_corpus()['sample_1']
+        if output_format == 'database':
+            generator = DatabaseGenerator(job_config=job_config, database_uri='sqlite:///{}'.format(os.path.join(directory, 'benchmark.db')))
+        else:
+            generator = FileGenerator(job_config=job_config, directory=directory, filename='benchmark', output_format=output_format)
+        row_batches = [generator.generate_rows(10000) for index in range(0, max(1, int(20 * scale)))]
+        schemas = [generator.get_object_schema(object_index) for object_index in range(0, len(generator.object_keys))]
+        sink = generator.open_sink(append=False)
+        try:
+            if representation == 'dicts':
+                batches = [row_batch.to_grouped_dicts() for row_batch in row_batches]
+                start = time.perf_counter()
+                for objects in batches:
+                    serialize_dicts(output_format, objects, schemas)
+            else:
+                start = time.perf_counter()
+                for row_batch in row_batches:
+                    sink.serialize(row_batch)
+            elapsed = time.perf_counter() - start
+        finally:
+            sink.close()
+    records = sum(map(len, row_batches))
+    return {'records': records, 'records_per_second': records / elapsed}
+
+
+def register_serialize_benchmarks():
+    for output_format in ['ndjson', 'parquet', 'database']:
+        for representation in ['rows', 'dicts']:
+            benchmark('serialize_{}.{}'.format(output_format, representation))(
+                lambda scale, output_format=output_format, representation=representation:
+                    measure_serialize(scale, output_format, representation))
+
+
+register_serialize_benchmarks()
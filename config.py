@@ -6,4 +6,7 @@ ADMINS = frozenset(['df.thangld@hotmail.com'])
 SECRET_KEY = '319cf9cbfcea4c3892b680bc79560113'
 
 SQLALCHEMY_DATABASE_URI = 'Database connection string'
-SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# maximum number of validated generator configs cached per process
+CONFIG_CACHE_SIZE = 256
@@ -1,13 +1,34 @@
 # -*- coding: utf-8 -*-
 
+import os
+import copy
+import math
 import json
 import uuid
 import random
-import math
-import datetime
+import time
+import hashlib
+import operator
+import concurrent.futures
 
+from instrumentation import get_instrumentation, CountingTemplate
+from generators.time_anchor import TimeAnchor, format_timestamp
+from generators.string_source import RandomStringSource, get_alphabet
+from generators.delay_queue import DelayQueue
+from generators.config_cache import get_config_cache
+from generators.entity_pool import get_entity_pool
+from generators.unique import get_unique_constraint, get_keyspace, MAX_BITMAP_BITS
+from generators.pipeline import Pipeline
+from generators.rows import RowBatch, get_order
+from generators.distributions import (ZipfSampler, DISTRIBUTIONS, LOCATION_PARAMETERS, MAX_POISSON_TABLE_LAMBDA,
+                                      get_alias_table, get_poisson_table, alias_sampler, alias_column_sampler)
 from errors import *
 
+try:
+    import numpy
+except ImportError:  # numpy is only needed by the vectorized engine
+    numpy = None
+
 
 class BaseGenerator:
 
@@ -42,21 +63,92 @@ class BaseGenerator:
     }
     '''
 
-    def __init__(self, task_id=None, job_config='{}'):
+    # number of seconds of the time units of the time configs
+    time_unit_seconds = {'NOW': 0, 'SECOND': 1, 'MINUTE': 60, 'HOUR': 3600, 'DAY': 86400, 'MONTH': 30*86400, 'YEAR': 365*86400}
+
+    def __init__(self, task_id=None, job_config='{}', vectorized=False, time_anchor=None, time_refresh_interval=None,
+                 seed=None, shard=None, delay_queue_size=100000, delay_overflow='release', generator_id=None, edited_time=None,
+                 pool_directory=None, unique_directory=None, queue_size=4, shards=None):
+        """
+        time_anchor: the time relative datetime bounds are resolved against. None follows the current time, refreshed
+            on every generate call or at most once per time_refresh_interval seconds. A datetime (or a time in
+            'YYYY-MM-DD HH24:MI:SS' format) fixes the anchor, a TimeAnchor can be shared between generators
+        seed, shard: the random streams of the generator are derived from task_id, seed and shard index
+            (see derive_seed()). With neither seed nor shard, the generator is seeded by the system
+        delay_queue_size, delay_overflow: size and overflow policy of the queue holding the delayed objects
+            (see DelayQueue)
+        generator_id, edited_time: id and edited time of the generator config in the generators table. When set, the
+            validated job config is taken from the process-wide config cache (see ConfigCache), job_config is only
+            parsed and validated if that version of the config is not cached yet
+        pool_directory: directory of the files of the entity pools (see EntityPool), None to keep the entity pools in
+            memory
+        unique_directory: directory of the files of the unique fields (see UniqueConstraint), so that their values stay
+            unique across restarts. None to keep them in memory, unique for the lifetime of the process
+        shards: number of shards of a sharded generation (see iter_sharded()), shard being the index of this one. Every
+            shard has its own state for the unique fields and generates their values of its own share only, so that
+            the values stay unique across the shards
+        queue_size: maximum number of batches waiting to be serialized or written by the pipeline of the sinks
+            (see Pipeline, generate_to()), 0 to generate, serialize and write one batch at a time
+        """
+        if isinstance(time_anchor, TimeAnchor):
+            self.time_anchor = time_anchor
+        else:
+            self.time_anchor = TimeAnchor(time_anchor, time_refresh_interval)
         self.validated_job_config = None
+        self.generation_plan = None
+        self.object_keys = None
+        self.column_plan = None
+        self.numpy_random = None
+        self.string_sources = {}
+        self.delay_queue = DelayQueue(delay_queue_size, delay_overflow)
+        self.instrumentation = get_instrumentation()
+        self.vectorized = vectorized
+        if vectorized and numpy is None:
+            raise ConfigurationError("Vectorized generation requires numpy to be installed")
         if task_id is not None:
             self.task_id = task_id
         else:
             self.task_id = str(uuid.uuid4())
+        self.seed = seed
+        self.shard = shard
+        self.shards = shards
+        self.random = random.Random(derive_seed(self.task_id, seed, shard))
+        self.generator_id = generator_id
+        self.edited_time = edited_time
+        self.pool_directory = pool_directory
+        self.unique_directory = unique_directory
+        self.unique_constraints = {}
+        self.queue_size = queue_size
+        self.pipeline = Pipeline(self.task_id, queue_size)
         self.validate_job_config(job_config)
 
+    def get_string_source(self, alphabet):
+        """
+        Random string source of an alphabet, shared by all string fields using that alphabet
+        """
+        if alphabet not in self.string_sources:
+            if self.seed is None and self.shard is None:
+                self.string_sources[alphabet] = RandomStringSource(alphabet)
+            else:
+                self.string_sources[alphabet] = RandomStringSource(alphabet, random_bytes=self.random.randbytes)
+        return self.string_sources[alphabet]
+
     def validate_job_config(self, job_config):
 
-        if job_config is not dict:
+        if self.generator_id is not None:
+            cached = get_config_cache().get(self.generator_id, self.edited_time)
+            if cached is not None:
+                self.job_config, self.validated_job_config = cached
+                self.__compile_plan()
+                return
+
+        if not isinstance(job_config, dict):
             try:
                 job_config = json.loads(job_config)
             except:
                 raise ConfigurationError("Configuration is not in JSON format")
+        else:
+            job_config = copy.deepcopy(job_config)
 
         if 'variables' not in job_config:
             job_config['variables'] = {}
@@ -70,13 +162,19 @@ class BaseGenerator:
                 object_config['__delay'] = {"probability": 0, "delay_time": "NOW"}
 
         self.job_config = job_config
-        self.validated_job_config = dict(job_config)
+        # validation rewrites the data configs in place, keep the job config as given
+        self.validated_job_config = copy.deepcopy(job_config)
         for key in self.validated_job_config['variables'].keys():
             self.validated_job_config['variables'][key] = self.__validate_data_config(key, self.validated_job_config['variables'][key])
         for object_config in self.validated_job_config['objects']:
+            object_config['__delay'] = self.__validate_delay_config(object_config['__delay'])
             for key in object_config:
                 if not key.startswith('__'):
                     object_config[key] = self.__validate_data_config(key, object_config[key])
+        self.__validate_pool_configs()
+        if self.generator_id is not None:
+            get_config_cache().put(self.generator_id, self.edited_time, self.job_config, self.validated_job_config)
+        self.__compile_plan()
 
     def __validate_data_config(self, key, config):
         if isinstance(config, dict):
@@ -93,22 +191,217 @@ class BaseGenerator:
                 else:  # datetime
                     config['lower-bound'] = self.__validate_time_config(config['lower-bound'])
                     config['upper-bound'] = self.__validate_time_config(config['upper-bound'])
+                    # checked against the current time, the bounds are resolved again on every refresh
+                    if self.time_anchor.get_time_bound(config['upper-bound']) < self.time_anchor.get_time_bound(config['lower-bound']):
+                        raise ExporterError("Data type 'datetime' in data field or variable '{}' should have parameter 'upper-bound' later than parameter 'lower-bound'".format(key))
+                self.__validate_distribution_config(key, config)
             elif config['type'] == 'string':
-                if 'length' not in config:
-                    raise ExporterError("Data type 'string' in data field or variable '{}' should have parameter 'length'".format(key))
-                if config['length'] <= 0:
+                # a fixed 'length' is the same as equal 'min-length' and 'max-length'
+                if 'length' in config:
+                    config['min-length'] = config['max-length'] = config['length']
+                if 'min-length' not in config or 'max-length' not in config:
+                    raise ExporterError("Data type 'string' in data field or variable '{}' should have parameter 'length' or parameters 'min-length' and 'max-length'".format(key))
+                if config['min-length'] <= 0:
                     raise ExporterError("Data type 'string' in data field or variable '{}' should have length greater than 0".format(key))
-                if config['length'] > 32:
-                    generating_time = math.ceil(config['length']/32)
-                else:
-                    generating_time = 1
-                config['generating_time'] = generating_time
+                if config['max-length'] < config['min-length']:
+                    raise ExporterError("Data type 'string' in data field or variable '{}' should have parameter 'max-length' greater than parameter 'min-length'".format(key))
+                try:
+                    config['alphabet'] = get_alphabet(config.get('alphabet', 'hex'))
+                except ConfigurationError as e:
+                    raise ExporterError("Data type 'string' in data field or variable '{}': {}".format(key, e))
             elif config['type'] == 'variable':
                 if 'id' not in config:
                     raise ExporterError("Data type 'variable' in data field or variable '{}' should have parameter 'id'".format(key))
+            elif config['type'] == 'choice':
+                if not isinstance(config.get('values'), list) or len(config['values']) == 0:
+                    raise ExporterError("Data type 'choice' in data field or variable '{}' should have parameter 'values', a list of values".format(key))
+                weights = config.get('weights', [1] * len(config['values']))
+                if not isinstance(weights, list) or len(weights) != len(config['values']) or any(
+                        isinstance(weight, bool) or not isinstance(weight, (int, float)) for weight in weights):
+                    raise ExporterError("Data type 'choice' in data field or variable '{}' should have parameter 'weights', a list of one number per value".format(key))
+                try:
+                    config['alias-table'] = get_alias_table(weights)
+                except ConfigurationError as e:
+                    raise ExporterError("Data type 'choice' in data field or variable '{}': {}".format(key, e))
+            elif config['type'] == 'entity':
+                if 'pool' not in config:
+                    raise ExporterError("Data type 'entity' in data field or variable '{}' should have parameter 'pool'".format(key))
+                config.setdefault('distribution', 'uniform')
+                config.setdefault('skew', 1)
+                if config['distribution'] not in ['uniform', 'zipf']:
+                    raise ExporterError("Data type 'entity' in data field or variable '{}' should have parameter 'distribution' 'uniform' or 'zipf'".format(key))
+                if not isinstance(config['skew'], (int, float)) or config['skew'] <= 0:
+                    raise ExporterError("Data type 'entity' in data field or variable '{}' should have parameter 'skew' greater than 0".format(key))
+                if config.get('key-type', 'integer') not in ['integer', 'string']:
+                    raise ExporterError("Data type 'entity' in data field or variable '{}' should have parameter 'key-type' 'integer' or 'string'".format(key))
+            if 'unique' in config:
+                self.__validate_unique_config(key, config)
+            if 'pool' in config and (not isinstance(config['pool'], str) or config['pool'] == ''):
+                raise ExporterError("Parameter 'pool' in data field or variable '{}' should be a pool name".format(key))
+            if 'pool' in config and config['type'] not in ['numeric', 'string', 'entity']:
+                raise ExporterError("Only data types 'numeric' and 'string' can populate entity pool '{}'".format(config['pool']))
 
         return config
 
+    def __validate_distribution_config(self, key, config):
+        """
+        Validate parameter 'distribution' of a 'numeric', 'float' or 'datetime' data config and set the parameters of
+        the distribution. A distribution draws the offset of the values from 'lower-bound' (in seconds for datetimes),
+        the values being clipped to the bounds. 'mean' and 'lambda' are values between the bounds, times such as
+        'YEAR-40' for the datetimes:
+            'uniform' (default)
+            'normal': 'mean' (the middle of the range if not set) and 'stddev' (a sixth of the range if not set)
+            'lognormal': 'mu' (0 if not set) and 'sigma' (1 if not set) of the logarithm of the offset
+            'exponential': 'scale', the mean offset (a tenth of the range if not set)
+            'poisson': 'lambda', the mean value, above 'lower-bound'. Drawn from an alias table of the mean offset,
+                computed here for the numbers, up to a mean offset of MAX_POISSON_TABLE_LAMBDA
+            'zipf': offset k drawn with a probability proportional to 1 / (k + 1) ** 'skew' (1 if not set)
+        """
+        distribution = config.setdefault('distribution', 'uniform')
+        if distribution not in DISTRIBUTIONS or config['type'] not in DISTRIBUTIONS[distribution]:
+            raise ExporterError("Data type '{}' in data field or variable '{}' should have parameter 'distribution' among {}".format(
+                config['type'], key, ', '.join("'{}'".format(name) for name in DISTRIBUTIONS if config['type'] in DISTRIBUTIONS[name])))
+        defaults = {'normal': {'mean': None, 'stddev': None}, 'lognormal': {'mu': 0, 'sigma': 1},
+                    'exponential': {'scale': None}, 'poisson': {'lambda': None}, 'zipf': {'skew': 1}}.get(distribution, {})
+        location = LOCATION_PARAMETERS.get(distribution)
+        for parameter, default in defaults.items():
+            value = config.setdefault(parameter, default)
+            if value is None or (parameter == location and config['type'] == 'datetime'):
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ExporterError("Parameter '{}' in data field or variable '{}' should be a number".format(parameter, key))
+            if value <= 0 and parameter in ['stddev', 'sigma', 'scale', 'skew']:
+                raise ExporterError("Parameter '{}' in data field or variable '{}' should be greater than 0".format(parameter, key))
+        if distribution == 'poisson' and config['lambda'] is None:
+            raise ExporterError("Distribution 'poisson' in data field or variable '{}' should have parameter 'lambda'".format(key))
+        if location is None or config[location] is None:
+            return
+
+        if config['type'] == 'datetime':
+            if not isinstance(config[location], str):
+                raise ExporterError("Parameter '{}' in data field or variable '{}' should be a time".format(location, key))
+            config[location] = self.__validate_time_config(config[location])
+            # checked against the current time, the bounds and the location are resolved again on every refresh
+            lower_bound, value, upper_bound = [self.time_anchor.get_time_bound(config[parameter])
+                                               for parameter in ('lower-bound', location, 'upper-bound')]
+        else:
+            lower_bound, value, upper_bound = config['lower-bound'], config[location], config['upper-bound']
+        if not lower_bound <= value <= upper_bound or (distribution == 'poisson' and value == lower_bound):
+            raise ExporterError("Parameter '{}' in data field or variable '{}' should be between parameters 'lower-bound' and 'upper-bound'".format(
+                location, key))
+        if distribution == 'poisson' and config['type'] != 'datetime' and value - lower_bound <= MAX_POISSON_TABLE_LAMBDA:
+            config['poisson-table'] = get_poisson_table(value - lower_bound)
+
+    def __validate_unique_config(self, key, config):
+        """
+        Resolve parameter 'unique' of a 'numeric' or 'string' data config to its method:
+            'permutation': exact, without storage, for uniform integer ranges and fixed length strings (default)
+            'bitmap': exact, one bit per value of an integer range, for uniform values
+            'bloom': through a Bloom filter of 'capacity' values (10000000 if not set) and 'error-rate' (0.001 if not
+                set) false positive rate, for any field (default for variable length strings)
+        """
+        if config['type'] not in ['numeric', 'string']:
+            raise ExporterError("Parameter 'unique' in data field or variable '{}' only supported by data types 'numeric' and 'string'".format(key))
+        method = config['unique']
+        if method is False:
+            del config['unique']
+            return
+        keyspace = get_keyspace(config)
+        if method is True:
+            # a permutation cannot follow a distribution
+            method = 'permutation' if keyspace is not None and config.get('distribution', 'uniform') == 'uniform' else 'bloom'
+        if method not in ['permutation', 'bitmap', 'bloom']:
+            raise ExporterError("Parameter 'unique' in data field or variable '{}' should be true, 'permutation', 'bitmap' or 'bloom'".format(key))
+        if method == 'permutation' and (keyspace is None or keyspace > 2**128):
+            raise ExporterError("Method 'permutation' of unique data field or variable '{}' needs an integer range or a fixed length string of at most 128 bits".format(key))
+        if method in ['permutation', 'bitmap'] and config.get('distribution', 'uniform') != 'uniform':
+            # a bitmap draws again until a value not generated yet is drawn, a skewed draw may never reach one
+            raise ExporterError("Method '{}' of unique data field or variable '{}' only generates uniform values".format(method, key))
+        if method == 'bitmap' and (config['type'] != 'numeric' or keyspace > MAX_BITMAP_BITS):
+            raise ExporterError("Method 'bitmap' of unique data field or variable '{}' needs an integer range of at most {} values".format(key, MAX_BITMAP_BITS))
+        if method == 'bloom':
+            config.setdefault('capacity', 10000000)
+            config.setdefault('error-rate', 0.001)
+            if not isinstance(config['capacity'], int) or config['capacity'] <= 0:
+                raise ExporterError("Parameter 'capacity' in data field or variable '{}' should be a positive integer".format(key))
+            if not isinstance(config['error-rate'], float) or not 0 < config['error-rate'] < 1:
+                raise ExporterError("Parameter 'error-rate' in data field or variable '{}' should be between 0 and 1".format(key))
+        config['unique'] = method
+
+    def get_unique_constraint(self, path, config):
+        """
+        Unique constraint of the field of a validated data config with a 'unique' parameter, path being 'variables.<key>'
+        or '<object name>.<key>'
+        """
+        if path not in self.unique_constraints:
+            # same key for all the shards, so that their shares are disjoint
+            key = derive_seed(self.task_id, self.seed, path)
+            if self.shards is None:
+                self.unique_constraints[path] = get_unique_constraint('{}.{}'.format(self.task_id, path), config,
+                                                                      self.unique_directory, key)
+            else:
+                self.unique_constraints[path] = get_unique_constraint(
+                    '{}.{}.shard-{}-of-{}'.format(self.task_id, path, self.shard, self.shards), config,
+                    self.unique_directory, key, self.shard, self.shards)
+        return self.unique_constraints[path]
+
+    def get_unique_stats(self):
+        """
+        Method, number of generated values and memory (bytes) of the unique fields
+        """
+        return {path: {'method': constraint.method, 'count': constraint.count, 'bytes': constraint.nbytes}
+                for path, constraint in self.unique_constraints.items()}
+
+    def __validate_pool_configs(self):
+        """
+        Set the key type and key length of the entity pools on the fields populating them ('numeric' and 'string'
+        fields with a 'pool' parameter) and on the 'entity' fields drawing from them. An 'entity' field drawing from a
+        pool populated by another job must have parameter 'key-type'
+        """
+        data_configs = list(self.validated_job_config['variables'].items())
+        for object_config in self.validated_job_config['objects']:
+            data_configs.extend((key, config) for key, config in object_config.items() if not key.startswith('__'))
+        data_configs = [(key, config) for key, config in data_configs if isinstance(config, dict) and 'pool' in config]
+
+        pool_keys = {}
+        for key, config in data_configs:
+            if config['type'] == 'numeric':
+                fits_int32 = -2**31 <= config['lower-bound'] and config['upper-bound'] < 2**31
+                pool_key = ('integer', 4 if fits_int32 else 8)
+            elif config['type'] == 'string':
+                pool_key = ('string', config['max-length'])
+            else:
+                continue
+            config['key-type'], config['key-length'] = pool_key
+            if pool_keys.setdefault(config['pool'], pool_key)[0] != pool_key[0]:
+                raise ExporterError("Entity pool '{}' populated by both integer and string keys".format(config['pool']))
+            pool_keys[config['pool']] = (pool_key[0], max(pool_keys[config['pool']][1], pool_key[1]))
+        for key, config in data_configs:
+            if config['type'] == 'entity':
+                if config['pool'] in pool_keys:
+                    config['key-type'], config['key-length'] = pool_keys[config['pool']]
+                elif 'key-type' not in config:
+                    raise ExporterError("Data type 'entity' in data field or variable '{}' should have parameter 'key-type', entity pool '{}' is not populated by this job".format(key, config['pool']))
+                else:
+                    config.setdefault('key-length', None)
+
+    def get_entity_pool(self, config):
+        # entity pool of a validated data config populating or drawing from it
+        return get_entity_pool(config['pool'], config['key-type'], config['key-length'], self.pool_directory)
+
+    def __validate_delay_config(self, delay_config):
+        if not isinstance(delay_config, dict) or 'probability' not in delay_config or 'delay_time' not in delay_config:
+            raise ConfigurationError("Object parameter '__delay' must have parameters 'probability' and 'delay_time'")
+        if not 0 <= delay_config['probability'] <= 1:
+            raise ConfigurationError("Object parameter '__delay' should have parameter 'probability' between 0 and 1")
+        time_config = self.__validate_time_config(delay_config['delay_time'])
+        if time_config['unit'] not in self.time_unit_seconds:
+            raise ConfigurationError("Time parameter '{}' not valid".format(time_config['__org']))
+        delay_seconds = time_config['delta'] * time_config['direction'] * self.time_unit_seconds[time_config['unit']]
+        if delay_seconds < 0:
+            raise ConfigurationError("Object parameter '__delay' should have a positive 'delay_time'")
+        return {'probability': delay_config['probability'], 'delay_time': delay_config['delay_time'], 'delay_seconds': delay_seconds}
+
     def __validate_time_config(self, time_config):
         time_config_org = time_config
         time_delta_direction = 1
@@ -125,96 +418,707 @@ class BaseGenerator:
 
         return {'__org': time_config_org, 'direction': time_delta_direction, 'delta': time_delta, 'unit': time_unit}
 
-    def __get_time_bound(self, time_config):
-        time_config_org = time_config['__org']
-        time_delta_direction = time_config['direction']
-        time_unit = time_config['unit']
-        time_delta = time_config['delta']
-
-        value = datetime.datetime.now()
-        if time_unit == 'NOW':
-            pass  # already take datetime.datetime.now() in the previous 2 lines
-        elif time_unit == 'SECOND':
-            value = value + datetime.timedelta(0, time_delta*time_delta_direction)
-        elif time_unit == 'MINUTE':
-            value = value.replace(second=0)
-            value = value + datetime.timedelta(0, time_delta * 60 * time_delta_direction)
-        elif time_unit == 'HOUR':
-            value = value.replace(minute=0, second=0)
-            value = value + datetime.timedelta(0, time_delta * 3600 * time_delta_direction)
-        elif time_unit == 'DAY':
-            value = value.replace(hour=0, minute=0, second=0)
-            value = value + datetime.timedelta(time_delta * time_delta_direction)
-        elif time_unit == 'MONTH':
-            # TODO: should solve the case a month have more or less than 30 days for absolute correction
-            # TO BE CONSIDERED: should it be that much accuracy?
-            value = value.replace(hour=0, minute=0, second=0)
-            value = value + datetime.timedelta(time_delta * 30 * time_delta_direction)
-        elif time_unit == 'YEAR':
-            # TODO: should solve the case a year have more than 365 days for absolute correction
-            # TO BE CONSIDERED: should it be that much accuracy?
-            value = value.replace(hour=0, minute=0, second=0)
-            value = value + datetime.timedelta(time_delta * 365 * time_delta_direction)
-        else:
-            raise ExporterError("Time parameter '{}' not valid".format(time_config_org))
+    def __compile_plan(self):
+        """
+        Compile the validated job config into a generation plan, so that generate() does not re-dispatch every value:
+            variables: list of callables, one per variable, in slot order
+            objects: list of (probability, delay probability, delay in seconds, row template, [(field index, callable)])
+        Every callable takes the list of variable values of the current iteration; 'variable' references are
+        resolved to their slot index in that list. The objects are generated as rows (see RowBatch), tuples of values in
+        field order filled from the row template of their object type
+        """
+        variable_slots = {}
+        variable_generators = []
+        for key, config in self.validated_job_config['variables'].items():
+            variable_generators.append(self.__compile_field(key, config, variable_slots, 'variables.{}'.format(key)))
+            variable_slots[key] = len(variable_generators) - 1
+
+        object_plans = []
+        self.object_keys = []
+        instrumentation = self.instrumentation
+        for object_index, object_config in enumerate(self.validated_job_config['objects']):
+            # static values are copied from the template, only the other fields are generated
+            keys = [key for key in object_config if not key.startswith('__')]
+            template = []
+            fields = []
+            for field_index, key in enumerate(keys):
+                config = object_config[key]
+                if isinstance(config, (list, dict)):
+                    template.append(None)
+                    fields.append((field_index, self.__compile_field(key, config, variable_slots,
+                                                                     '{}.{}'.format(self.get_object_name(object_index), key))))
+                else:
+                    template.append(config)
+            if instrumentation is not None:
+                # instrumented plans time every field and count the objects copied from the template
+                object_timer = instrumentation.get_timer('object.{}.{}'.format(self.task_id, object_index))
+                template = CountingTemplate(template, object_timer)
+                fields = [(field_index, instrumentation.timed('field_type.{}'.format(get_field_type(object_config[keys[field_index]])),
+                                                              generate_value, object_timer))
+                          for field_index, generate_value in fields]
+            self.object_keys.append(tuple(keys))
+            delay_config = object_config['__delay']
+            object_plans.append((object_config['__probability'], delay_config['probability'], delay_config['delay_seconds'],
+                                 template, fields))
+
+        self.generation_plan = (variable_generators, object_plans)
 
-        return value
+    def __compile_field(self, key, config, variable_slots, path):
+        generate_value = self.__compile_value(key, config, variable_slots)
+        if isinstance(config, dict) and 'unique' in config:
+            generate_value = self.get_unique_constraint(path, config).get_generator(generate_value)
+        if isinstance(config, dict) and 'pool' in config and config['type'] != 'entity':
+            # the values of a field populating an entity pool are added to the pool as they are generated
+            add = self.get_entity_pool(config).add
+            return lambda variables: add(generate_value(variables))
+        return generate_value
+
+    def __compile_value(self, key, config, variable_slots):
+        rand = self.random.random
 
-    def __generate_value(self, config, predefined_variables=[]):
         # if the config is a list of several values => choose a random value in that list
         if isinstance(config, list):
-            index = random.randint(0, len(config)-1)
-            return config[index]
-        if isinstance(config, dict):
-            if config['type'] == 'numeric':
-                value = random.randint(config['lower-bound'], config['upper-bound'])
-            elif config['type'] == 'float':
-                value = config['lower-bound'] + (config['upper-bound'] - config['lower-bound'])*random.random()
-            elif config['type'] == 'string':
-                value = ''
-                for i in range(0, config['generating_time']):
-                    value += str(uuid.uuid4())
-                value = value.replace('-', '')
-                value = value[32*config['generating_time'] - config['length']:]
-            elif config['type'] == 'datetime':
-                if config['lower-bound'] == config['upper-bound'] == 'NOW':
-                    value = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                else:
-                    lower_bound = self.__get_time_bound(config['lower-bound'])
-                    upper_bound = self.__get_time_bound(config['upper-bound'])
-                    value = lower_bound + (datetime.timedelta(0, random.randint(0, int((upper_bound - lower_bound).total_seconds()))))
-                    value = value.strftime('%Y-%m-%d %H:%M:%S')
-            elif config['type'] == 'variable':
-                return predefined_variables[config['id']]
+            values = tuple(config)
+            count = len(values)
+            return lambda variables: values[int(rand() * count)]
+
+        # otherwise, the variable is a static value => return that value
+        if not isinstance(config, dict):
+            return lambda variables: config
+
+        if config['type'] in ['numeric', 'float', 'datetime'] and config['distribution'] != 'uniform':
+            return self.__compile_distribution(config)
+
+        if config['type'] == 'numeric':
+            lower_bound = config['lower-bound']
+            upper_bound = config['upper-bound']
+            span = upper_bound - lower_bound + 1
+            if span > 2**32:
+                randint = self.random.randint
+                return lambda variables: randint(lower_bound, upper_bound)
+            return lambda variables: lower_bound + int(rand() * span)
+        elif config['type'] == 'float':
+            lower_bound = config['lower-bound']
+            span = config['upper-bound'] - config['lower-bound']
+            return lambda variables: lower_bound + span * rand()
+        elif config['type'] == 'string':
+            draw = self.get_string_source(config['alphabet']).draw
+            min_length = config['min-length']
+            length_span = config['max-length'] - min_length + 1
+            if length_span == 1:
+                return lambda variables: draw(min_length)
+            return lambda variables: draw(min_length + int(rand() * length_span))
+        elif config['type'] == 'datetime':
+            # bounds are resolved by the time anchor once per refresh, a value is one integer draw between them
+            resolved = self.time_anchor.resolved
+            lower_key = self.time_anchor.register(config['lower-bound'])
+            upper_key = self.time_anchor.register(config['upper-bound'])
+
+            def generate_datetime(variables):
+                lower_bound = resolved[lower_key]
+                return format_timestamp(lower_bound + int(rand() * (resolved[upper_key] - lower_bound + 1)))
+            return generate_datetime
+        elif config['type'] == 'variable':
+            if config['id'] not in variable_slots:
+                raise ExporterError("Variable '{}' referenced by data field or variable '{}' not found".format(config['id'], key))
+            return operator.itemgetter(variable_slots[config['id']])
+        elif config['type'] == 'entity':
+            sample = self.get_entity_pool(config).get_sampler(rand, config['distribution'], config['skew'])
+            return lambda variables: sample()
+        elif config['type'] == 'choice':
+            values = tuple(config['values'])
+            sample = alias_sampler(*config['alias-table'], rand)
+            return lambda variables: values[sample()]
+        else:
+            raise ExporterError("Export data type {} not supported".format(config['type']))
+
+    def __compile_distribution(self, config):
+        # value generating function of a 'numeric', 'float' or 'datetime' data config with a non-uniform distribution
+        draw_offset = self.__compile_offset(config, config['type'] != 'float')
+        location = LOCATION_PARAMETERS.get(config['distribution'])
+        if config['type'] == 'datetime':
+            resolved = self.time_anchor.resolved
+            lower_key = self.time_anchor.register(config['lower-bound'])
+            upper_key = self.time_anchor.register(config['upper-bound'])
+            if location is None or config[location] is None:
+                location_key = lower_key
             else:
-                raise ExporterError("Export data type {} not supported".format(config['type']))
+                location_key = self.time_anchor.register(config[location])
 
-            return value
+            def generate_datetime(variables):
+                lower_bound = resolved[lower_key]
+                return format_timestamp(lower_bound + draw_offset(resolved[upper_key] - lower_bound, resolved[location_key] - lower_bound))
+            return generate_datetime
+        lower_bound = config['lower-bound']
+        span = config['upper-bound'] - lower_bound
+        location_offset = 0 if location is None or config[location] is None else config[location] - lower_bound
+        return lambda variables: lower_bound + draw_offset(span, location_offset)
 
-        # otherwise, the variable is a static value => return that value
-        return config
+    def __compile_offset(self, config, integer):
+        """
+        Function drawing the offset of a value from the lower bound of its field, following the distribution of the
+        field: a function of the range of the field (upper bound - lower bound) and of the offset of its 'mean' or
+        'lambda' returning an offset in that range, rounded for the integer values
+        """
+        rand = self.random.random
+        distribution = config['distribution']
+        if distribution == 'normal':
+            gauss = self.random.gauss
+            mean = config['mean']
+            stddev = config['stddev']
+            draw = lambda span, location: gauss(span / 2 if mean is None else location, span / 6 if stddev is None else stddev)
+        elif distribution == 'lognormal':
+            lognormvariate = self.random.lognormvariate
+            mu = config['mu']
+            sigma = config['sigma']
+            draw = lambda span, location: lognormvariate(mu, sigma)
+        elif distribution == 'exponential':
+            expovariate = self.random.expovariate
+            scale = config['scale']
+            draw = lambda span, location: expovariate(1 / (scale if scale is not None else max(span, 1) / 10))
+        elif distribution == 'poisson':
+            gauss = self.random.gauss
+            # sampler of the current mean offset, which only changes when times resolved again on refresh are involved
+            current = [None, None]
+
+            def draw(span, location):
+                if current[0] != location:
+                    current[:] = [location, self.__compile_poisson_sampler(config, location, rand, gauss)]
+                return current[1]()
+        else:  # zipf
+            sample_rank = ZipfSampler(config['skew']).sample
+            return lambda span, location: sample_rank(int(span) + 1, rand) - 1
+        if integer:
+            return lambda span, location: min(max(int(draw(span, location) + 0.5), 0), span)
+        return lambda span, location: min(max(draw(span, location), 0.0), span)
+
+    def __compile_poisson_sampler(self, config, mean, rand, gauss):
+        # function drawing a Poisson offset of a mean offset
+        if mean <= 0:
+            return lambda: 0
+        if mean > MAX_POISSON_TABLE_LAMBDA:
+            # normal approximation of the large means
+            stddev = math.sqrt(mean)
+            return lambda: gauss(mean, stddev)
+        first, probabilities, aliases = config['poisson-table'] if 'poisson-table' in config else get_poisson_table(mean)
+        sample = alias_sampler(probabilities, aliases, rand)
+        return lambda: first + sample()
 
     def generate(self, generate_time=1):
-        exported_object = []
+        return self.generate_rows(generate_time).to_dicts()
+
+    def generate_grouped(self, generate_time=1):
+        """
+        Same as generate(), with the objects grouped by object type: one list per object in the job config
+        """
+        return self.generate_rows(generate_time).to_grouped_dicts()
 
-        for i in range (0, generate_time):
-            variables = {}
-            variable_config = self.validated_job_config['variables']
-            for key in variable_config:
-                variables[key] = self.__generate_value(variable_config[key])
-            #print(variables)
-            for object_config in self.validated_job_config['objects']:
-                simulated_object = {}
-                appear_probability = random.random()
-                if appear_probability > object_config['__probability']:
+    def generate_rows(self, generate_time=1):
+        """
+        Same as generate(), with the objects in compact form (see RowBatch)
+        """
+        if self.vectorized:
+            return self.__generate_row_batch(generate_time)
+
+        self.time_anchor.refresh()
+        delay_queue = self.delay_queue
+        now = delay_queue.clock()
+        object_count = len(self.object_keys)
+        object_rows = [[] for object_index in range(0, object_count)]
+        order = get_order(object_count)
+        # the delayed objects due by now are exported first
+        for object_index, delayed_row in delay_queue.pop_due(now):
+            object_rows[object_index].append(delayed_row)
+            if order is not None:
+                order.append(object_index)
+        variable_generators, object_plans = self.generation_plan
+        object_appends = [(object_index, object_plan, rows.append) for object_index, (object_plan, rows) in enumerate(zip(object_plans, object_rows))]
+        rand = self.random.random
+
+        for i in range(0, generate_time):
+            variables = []
+            for generate_variable in variable_generators:
+                variables.append(generate_variable(variables))
+            for object_index, (probability, delay_probability, delay_seconds, template, fields), append in object_appends:
+                if probability < 1 and rand() > probability:
                     continue
-                delayed_probability = random.random()
-                if delayed_probability > object_config['__delay']['probability']:
-                    #TODO: create delayed situation
-                    pass
-                for key in object_config.keys():
-                    if not key.startswith('__'):
-                        simulated_object[key] = self.__generate_value(object_config[key], predefined_variables=variables)
-                exported_object.append(simulated_object)
+                row = template.copy()
+                for field_index, generate_value in fields:
+                    row[field_index] = generate_value(variables)
+                if delay_probability > 0 and rand() < delay_probability:
+                    released = delay_queue.push(delay_seconds, (object_index, tuple(row)), now)
+                    if released is not None:
+                        object_rows[released[0]].append(released[1])
+                        if order is not None:
+                            order.append(released[0])
+                    continue
+                append(tuple(row))
+                if order is not None:
+                    order.append(object_index)
+
+        return RowBatch(self.object_keys, object_rows, order=order)
+
+    def flush(self):
+        """
+        Release all the delayed objects, whether they are due or not
+        """
+        return self.flush_rows().to_dicts()
+
+    def flush_grouped(self):
+        """
+        Same as flush(), with the objects grouped by object type
+        """
+        return self.flush_rows().to_grouped_dicts()
+
+    def flush_rows(self):
+        """
+        Same as flush(), with the objects in compact form (see RowBatch)
+        """
+        object_count = len(self.object_keys)
+        object_rows = [[] for object_index in range(0, object_count)]
+        order = get_order(object_count)
+        for object_index, delayed_row in self.delay_queue.flush():
+            object_rows[object_index].append(delayed_row)
+            if order is not None:
+                order.append(object_index)
+        return RowBatch(self.object_keys, object_rows, order=order)
 
+    def iter_generate(self, generate_time=1, batch_size=10000, grouped=False):
+        """
+        Streaming counterpart of generate(): yield the generated objects in batches of at most batch_size iterations,
+        so that the memory used does not grow with generate_time
+            grouped: yield the objects grouped by object type (see generate_grouped())
+        """
+        for row_batch in self.iter_rows(generate_time, batch_size):
+            yield row_batch.to_grouped_dicts() if grouped else row_batch.to_dicts()
+
+    def iter_rows(self, generate_time=1, batch_size=10000):
+        """
+        Same as iter_generate(), with the objects of every batch in compact form (see RowBatch)
+        """
+        if batch_size <= 0:
+            raise ConfigurationError("Parameter 'batch_size' must be a positive number")
+        remaining = generate_time
+        while remaining > 0:
+            batch_time = min(batch_size, remaining)
+            remaining -= batch_time
+            yield self.generate_rows(batch_time)
+
+    def generate_to(self, sinks, generate_time=1, batch_size=10000, append=True):
+        """
+        Generate the objects once and write them to several sinks at the same time, for example a file and a database
+        (see Pipeline). The sinks are generators with an open_sink() method (FileGenerator, DatabaseGenerator) built
+        from the same job config as this generator, only their output parameters are used
+        Return the number of generated records, the number of bytes written to every file is set in the
+        last_written_bytes of its generator
+        """
+        for sink_generator in sinks:
+            # the sinks read the values of the rows by position
+            if sink_generator.object_keys != self.object_keys:
+                raise ConfigurationError("Sink generator {} does not have the object types and fields of the job config".format(
+                    sink_generator.task_id))
+        opened_sinks = []
+        try:
+            for sink_generator in sinks:
+                opened_sinks.append(sink_generator.open_sink(append))
+        except Exception:
+            for sink in opened_sinks:
+                sink.close()
+            raise
+        generated_count, written = self.pipeline.run(self.iter_rows(generate_time, batch_size), opened_sinks)
+        for sink_generator, written_bytes in zip(sinks, written):
+            sink_generator.last_written_bytes = written_bytes
+        return generated_count
+
+    def get_object_schema(self, object_index):
+        """
+        List of (field name, data type) of an object type, data type being one of 'integer', 'float', 'boolean',
+        'string' or 'datetime' (a string in '%Y-%m-%d %H:%M:%S' format)
+        """
+        schema = []
+        for key, config in self.validated_job_config['objects'][object_index].items():
+            if not key.startswith('__'):
+                schema.append((key, self.__get_data_type(config)))
+        return schema
+
+    def get_object_name(self, object_index):
+        # name of the table (or file) of an object type, set by its '__table' parameter
+        return self.validated_job_config['objects'][object_index].get('__table', 'object_{}'.format(object_index))
+
+    def __get_data_type(self, config):
+        if isinstance(config, list):
+            data_types = set(get_value_type(value) for value in config if value is not None)
+            if data_types == {'integer', 'float'}:
+                return 'float'
+            return data_types.pop() if len(data_types) == 1 else 'string'
+        if not isinstance(config, dict):
+            return get_value_type(config)
+        if config['type'] == 'variable':
+            return self.__get_data_type(self.validated_job_config['variables'][config['id']])
+        if config['type'] == 'entity':
+            return config['key-type']
+        if config['type'] == 'choice':
+            return self.__get_data_type(config['values'])
+        return {'numeric': 'integer', 'float': 'float', 'string': 'string', 'datetime': 'datetime'}[config['type']]
+
+    def get_shard_config(self):
+        """
+        Constructor parameters to rebuild this generator in a shard process, time_anchor, shard and shards excepted
+        """
+        return {'task_id': self.task_id, 'job_config': self.job_config, 'vectorized': self.vectorized, 'seed': self.seed,
+                'generator_id': self.generator_id, 'edited_time': self.edited_time, 'pool_directory': self.pool_directory,
+                'unique_directory': self.unique_directory, 'queue_size': self.queue_size}
+
+    def iter_sharded(self, generate_time=1, shards=2, processes=None, generate_kwargs=None, rows=False):
+        """
+        Split generate_time iterations into shards generated in a process pool
+        Every shard has its own random streams derived from task_id, seed and its shard index, and all shards share the
+        current time anchor: running the same task with the same seed, shard count and a fixed time anchor reproduces
+        the same output. The shards generate disjoint shares of the values of the unique fields. Yield the result of
+        every shard, in shard order
+            generate_kwargs: list of keyword arguments of generate() of the generator class, one per shard.
+                None to get the generated objects of every shard
+            rows: get the generated objects of every shard in compact form (see RowBatch), when generate_kwargs is
+                None. The compact form is also cheaper to send from the shard processes
+        """
+        if shards <= 0:
+            raise ConfigurationError("Parameter 'shards' must be a positive number")
+        if processes is None:
+            processes = min(shards, os.cpu_count() or 1)
+        self.time_anchor.refresh()
+        shard_config = dict(self.get_shard_config(), shards=shards)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = []
+            for shard_index in range(0, shards):
+                # the first generate_time % shards shards take one more iteration
+                shard_time = generate_time // shards + (1 if shard_index < generate_time % shards else 0)
+                futures.append(executor.submit(generate_shard, type(self), shard_config, shard_index, self.time_anchor.now,
+                                               shard_time, None if generate_kwargs is None else generate_kwargs[shard_index], rows))
+            for future in futures:
+                yield future.result()
+
+    def generate_sharded(self, generate_time=1, shards=2, processes=None):
+        exported_object = []
+        for shard_objects in self.iter_sharded(generate_time, shards, processes):
+            exported_object.extend(shard_objects)
         return exported_object
+
+    def __compile_column_plan(self):
+        """
+        Columnar counterpart of the generation plan: every callable takes (count, variable columns, rows) and returns
+        a column of count values, rows being the iterations the object appears in (None for the variables themselves)
+        """
+        variable_slots = {}
+        variable_generators = []
+        self.numpy_random = numpy.random.default_rng(derive_seed(self.task_id, self.seed, self.shard))
+        for key, config in self.validated_job_config['variables'].items():
+            variable_generators.append(self.__compile_column_field(key, config, variable_slots, 'variables.{}'.format(key)))
+            variable_slots[key] = len(variable_generators) - 1
+
+        object_plans = []
+        for object_index, object_config in enumerate(self.validated_job_config['objects']):
+            fields = []
+            for key, config in object_config.items():
+                if not key.startswith('__'):
+                    fields.append((key, self.__compile_column_field(key, config, variable_slots,
+                                                                    '{}.{}'.format(self.get_object_name(object_index), key))))
+            delay_config = object_config['__delay']
+            object_plans.append((object_config['__probability'], delay_config['probability'], delay_config['delay_seconds'],
+                                 fields))
+
+        self.column_plan = (variable_generators, object_plans)
+
+    def __compile_column_field(self, key, config, variable_slots, path):
+        generate_column = self.__compile_column(key, config, variable_slots)
+        if isinstance(config, dict) and 'unique' in config:
+            generate_column = self.get_unique_constraint(path, config).get_column_generator(generate_column)
+        if isinstance(config, dict) and 'pool' in config and config['type'] != 'entity':
+            extend = self.get_entity_pool(config).extend
+
+            def generate_populating_column(count, variables, rows):
+                column = generate_column(count, variables, rows)
+                extend(column)
+                return column
+            return generate_populating_column
+        return generate_column
+
+    def __compile_column(self, key, config, variable_slots):
+        if isinstance(config, list):
+            values = numpy.empty(len(config), dtype=object)
+            for index, value in enumerate(config):
+                values[index] = value
+            return lambda count, variables, rows: values[self.numpy_random.integers(0, len(values), count)]
+
+        if not isinstance(config, dict):
+            return lambda count, variables, rows: numpy.full(count, config, dtype=object)
+
+        if config['type'] == 'numeric' and not fits_int64(config['lower-bound'], config['upper-bound'] + 1,
+                                                          config['upper-bound'] - config['lower-bound'] + 1):
+            # the numpy draws are int64 values, the larger integers are drawn one by one
+            generate_value = self.__compile_value(key, config, variable_slots)
+
+            def generate_integers(count, variables, rows):
+                column = numpy.empty(count, dtype=object)
+                column[:] = [generate_value(None) for index in range(0, count)]
+                return column
+            return generate_integers
+
+        if config['type'] in ['numeric', 'float', 'datetime'] and config['distribution'] != 'uniform':
+            return self.__compile_column_distribution(config)
+
+        if config['type'] == 'numeric':
+            lower_bound = config['lower-bound']
+            upper_bound = config['upper-bound'] + 1
+            return lambda count, variables, rows: self.numpy_random.integers(lower_bound, upper_bound, count)
+        elif config['type'] == 'float':
+            lower_bound = config['lower-bound']
+            span = config['upper-bound'] - config['lower-bound']
+            return lambda count, variables, rows: lower_bound + span * self.numpy_random.random(count)
+        elif config['type'] == 'string':
+            min_length = config['min-length']
+            max_length = config['max-length']
+            alphabet = numpy.frombuffer(config['alphabet'].encode('ascii'), dtype=numpy.uint8)
+
+            def generate_strings(count, variables, rows):
+                characters = alphabet[self.numpy_random.integers(0, len(alphabet), (count, max_length), dtype=numpy.uint16)]
+                values = characters.astype(numpy.uint8).view('S{}'.format(max_length)).ravel().astype('U{}'.format(max_length))
+                if min_length == max_length:
+                    return values
+                lengths = self.numpy_random.integers(min_length, max_length + 1, count).tolist()
+                strings = numpy.empty(count, dtype=object)
+                strings[:] = [value[:length] for value, length in zip(values.tolist(), lengths)]
+                return strings
+            return generate_strings
+        elif config['type'] == 'datetime':
+            resolved = self.time_anchor.resolved
+            lower_key = self.time_anchor.register(config['lower-bound'])
+            upper_key = self.time_anchor.register(config['upper-bound'])
+
+            def generate_datetimes(count, variables, rows):
+                # values are drawn as epoch-second offsets between the bounds resolved by the time anchor
+                lower_bound = resolved[lower_key]
+                span = resolved[upper_key] - lower_bound + 1
+                if span > 0:
+                    seconds = lower_bound + self.numpy_random.integers(0, span, count)
+                else:
+                    # bounds resolved in reverse order since validation, the same values as the scalar engine
+                    seconds = lower_bound + (self.numpy_random.random(count) * span).astype(numpy.int64)
+                return format_datetime_column(seconds)
+            return generate_datetimes
+        elif config['type'] == 'variable':
+            if config['id'] not in variable_slots:
+                raise ExporterError("Variable '{}' referenced by data field or variable '{}' not found".format(config['id'], key))
+            slot = variable_slots[config['id']]
+            return lambda count, variables, rows: variables[slot] if rows is None else variables[slot][rows]
+        elif config['type'] == 'entity':
+            sample = self.get_entity_pool(config).get_column_sampler(self.numpy_random, config['distribution'], config['skew'])
+            return lambda count, variables, rows: sample(count)
+        elif config['type'] == 'choice':
+            values = numpy.empty(len(config['values']), dtype=object)
+            values[:] = config['values']
+            sample = alias_column_sampler(*config['alias-table'], self.numpy_random)
+            return lambda count, variables, rows: values[sample(count)]
+        else:
+            raise ExporterError("Export data type {} not supported".format(config['type']))
+
+    def __compile_column_distribution(self, config):
+        # columnar counterpart of __compile_distribution()
+        draw_offsets = self.__compile_column_offsets(config, config['type'] != 'float')
+        location = LOCATION_PARAMETERS.get(config['distribution'])
+        if config['type'] == 'datetime':
+            resolved = self.time_anchor.resolved
+            lower_key = self.time_anchor.register(config['lower-bound'])
+            upper_key = self.time_anchor.register(config['upper-bound'])
+            if location is None or config[location] is None:
+                location_key = lower_key
+            else:
+                location_key = self.time_anchor.register(config[location])
+
+            def generate_datetimes(count, variables, rows):
+                lower_bound = resolved[lower_key]
+                seconds = lower_bound + draw_offsets(count, resolved[upper_key] - lower_bound, resolved[location_key] - lower_bound)
+                return format_datetime_column(seconds)
+            return generate_datetimes
+        lower_bound = config['lower-bound']
+        span = config['upper-bound'] - lower_bound
+        location_offset = 0 if location is None or config[location] is None else config[location] - lower_bound
+        return lambda count, variables, rows: lower_bound + draw_offsets(count, span, location_offset)
+
+    def __compile_column_offsets(self, config, integer):
+        # columnar counterpart of __compile_offset(): function of (count, range, location offset) returning a column of
+        # count offsets
+        numpy_random = self.numpy_random
+        distribution = config['distribution']
+        if distribution == 'normal':
+            mean = config['mean']
+            stddev = config['stddev']
+            draw = lambda count, span, location: numpy_random.normal(span / 2 if mean is None else location,
+                                                                     span / 6 if stddev is None else stddev, count)
+        elif distribution == 'lognormal':
+            draw = lambda count, span, location: numpy_random.lognormal(config['mu'], config['sigma'], count)
+        elif distribution == 'exponential':
+            scale = config['scale']
+            draw = lambda count, span, location: numpy_random.exponential(scale if scale is not None else max(span, 1) / 10, count)
+        elif distribution == 'poisson':
+            draw = lambda count, span, location: numpy_random.poisson(max(location, 0), count)
+        else:  # zipf
+            sample_ranks = ZipfSampler(config['skew']).sample_array
+            return lambda count, span, location: sample_ranks(int(span) + 1, count, numpy_random) - 1
+        if integer:
+            return lambda count, span, location: numpy.clip(numpy.rint(draw(count, span, location)), 0, span).astype(numpy.int64)
+        return lambda count, span, location: numpy.clip(draw(count, span, location), 0, span)
+
+    def __generate_columns(self, generate_time):
+        if numpy is None:
+            raise ConfigurationError("Vectorized generation requires numpy to be installed")
+        if self.column_plan is None:
+            self.__compile_column_plan()
+        variable_generators, object_plans = self.column_plan
+
+        variables = []
+        for generate_variable in variable_generators:
+            variables.append(generate_variable(generate_time, variables, None))
+
+        generated = []
+        instrumentation = self.instrumentation
+        for object_index, (probability, delay_probability, delay_seconds, fields) in enumerate(object_plans):
+            if probability < 1:
+                # appearance mask: the same rule as the scalar path, an object appears when random() <= probability
+                rows = numpy.flatnonzero(self.numpy_random.random(generate_time) <= probability)
+            else:
+                rows = numpy.arange(generate_time)
+            columns = {}
+            for key, generate_column in fields:
+                if instrumentation is None:
+                    columns[key] = generate_column(len(rows), variables, rows)
+                    continue
+                start = time.perf_counter()
+                columns[key] = generate_column(len(rows), variables, rows)
+                seconds = time.perf_counter() - start
+                config = self.validated_job_config['objects'][object_index][key]
+                instrumentation.get_timer('field_type.{}'.format(get_field_type(config))).add(seconds, len(rows))
+                instrumentation.get_timer('object.{}.{}'.format(self.task_id, object_index)).add(seconds, 0)
+            if instrumentation is not None:
+                instrumentation.get_timer('object.{}.{}'.format(self.task_id, object_index)).add(0, len(rows))
+            generated.append((rows, columns, delay_probability, delay_seconds))
+        return generated
+
+    def generate_columns(self, generate_time=1):
+        """
+        Columnar generation mode: generate the objects of generate_time iterations in one pass per object type
+        Return one dictionary {field name: numpy array} per object in the job config. Objects are not delayed
+        """
+        return [generated[1] for generated in self.__generate_columns(generate_time)]
+
+    def generate_batch(self, generate_time=1, grouped=False):
+        """
+        Same output as generate() (or generate_grouped()), produced by the vectorized engine
+        """
+        row_batch = self.__generate_row_batch(generate_time)
+        return row_batch.to_grouped_dicts() if grouped else row_batch.to_dicts()
+
+    def __generate_row_batch(self, generate_time):
+        """
+        Vectorized generate_rows(): the object types are stored as columns, except the ones with delayed objects to
+        export, stored as rows
+        """
+        self.time_anchor.refresh()
+        delay_queue = self.delay_queue
+        now = delay_queue.clock()
+        generated = self.__generate_columns(generate_time)
+        object_count = len(generated)
+
+        # the delayed objects due by now (or pushed out of the delay queue) are exported first
+        released_rows = [[] for object_index in range(0, object_count)]
+        released_order = []
+        for object_index, delayed_row in delay_queue.pop_due(now):
+            released_rows[object_index].append(delayed_row)
+            released_order.append(object_index)
+
+        object_columns = []
+        positions = []
+        for object_index, (rows, columns, delay_probability, delay_seconds) in enumerate(generated):
+            columns = list(columns.values())
+            if delay_probability > 0:
+                delayed = self.numpy_random.random(len(rows)) < delay_probability
+                for delayed_row in zip(*[column[delayed].tolist() for column in columns]):
+                    released = delay_queue.push(delay_seconds, (object_index, delayed_row), now)
+                    if released is not None:
+                        released_rows[released[0]].append(released[1])
+                        released_order.append(released[0])
+                columns = [column[~delayed] for column in columns]
+                rows = rows[~delayed]
+            object_columns.append((len(rows), columns))
+            positions.append(rows * object_count + object_index)
+
+        object_rows = [None] * object_count
+        for object_index, (count, columns) in enumerate(object_columns):
+            if released_rows[object_index] or not columns:
+                rows = list(zip(*[column.tolist() for column in columns])) if columns else [()] * count
+                object_rows[object_index] = released_rows[object_index] + rows
+                object_columns[object_index] = None
+            else:
+                object_columns[object_index] = columns
+
+        order = get_order(object_count)
+        if order is not None:
+            # restore the order of the scalar path: iteration by iteration, objects in config order
+            order.extend(released_order)
+            object_order = numpy.sort(numpy.concatenate(positions)) % object_count
+            order.frombytes(object_order.astype(order.typecode).tobytes())
+        return RowBatch(self.object_keys, object_rows, object_columns, order)
+
+
+def get_field_type(config):
+    # type name of a data config, as used by the instrumentation
+    if isinstance(config, list):
+        return 'list'
+    if isinstance(config, dict):
+        return config['type']
+    return 'constant'
+
+
+def get_value_type(value):
+    # data type of a static value, see BaseGenerator.get_object_schema()
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, int):
+        return 'integer'
+    if isinstance(value, float):
+        return 'float'
+    return 'string'
+
+
+def fits_int64(*values):
+    # whether integers can be drawn and stored by numpy as int64 values
+    return all(-2**63 <= value < 2**63 for value in values)
+
+
+def format_datetime_column(seconds):
+    """
+    Column of 'YYYY-MM-DD HH24:MI:SS' strings of a column of epoch seconds
+    """
+    values = numpy.datetime_as_string(seconds.astype('datetime64[s]')).astype('U19')
+    # replace the 'T' separator in place, one UCS-4 code point per character
+    values.view(numpy.uint32).reshape(len(values), 19)[:, 10] = ord(' ')
+    return values
+
+
+def derive_seed(task_id, seed=None, shard=None):
+    """
+    Seed of the random streams of a generator, None to let the system seed them
+    """
+    if seed is None and shard is None:
+        return None
+    digest = hashlib.sha256('{}:{}:{}'.format(task_id, seed, shard).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def generate_shard(generator_class, shard_config, shard_index, time_anchor, generate_time, generate_kwargs, rows=False):
+    # run in a process of the pool of BaseGenerator.iter_sharded()
+    generator = generator_class(time_anchor=time_anchor, shard=shard_index, **shard_config)
+    if generate_kwargs is None:
+        if rows:
+            return generator.generate_rows(generate_time)
+        return BaseGenerator.generate(generator, generate_time)
+    return generator.generate(generate_time, **generate_kwargs)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import collections
+
+import config
+from errors import *
+
+
+class ConfigCache:
+    """
+    LRU cache of validated job configs, keyed by generator id and edited time of the generator config
+    A new edited time of a generator replaces the cached versions of that generator. The cached configs are shared by
+    all the generators built from them and must not be modified
+        max_size: maximum number of cached configs, the least recently used one is evicted first
+    """
+
+    def __init__(self, max_size=256):
+        if max_size <= 0:
+            raise ConfigurationError("Config cache size must be a positive number")
+        self.max_size = max_size
+        # (generator id, edited time) -> (job config, validated job config), least recently used first
+        self.entries = collections.OrderedDict()
+        # generator id -> edited time of its cached version
+        self.versions = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, generator_id, edited_time):
+        """
+        Return (job config, validated job config) of a generator version, None if it is not cached
+        """
+        key = (generator_id, edited_time)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, generator_id, edited_time, job_config, validated_job_config):
+        with self.lock:
+            if generator_id in self.versions and self.versions[generator_id] != edited_time:
+                # the generator config was edited, its previous version will not be asked for anymore
+                del self.entries[(generator_id, self.versions[generator_id])]
+            self.versions[generator_id] = edited_time
+            self.entries[(generator_id, edited_time)] = (job_config, validated_job_config)
+            self.entries.move_to_end((generator_id, edited_time))
+            while len(self.entries) > self.max_size:
+                (evicted_id, evicted_time), entry = self.entries.popitem(last=False)
+                del self.versions[evicted_id]
+                self.evictions += 1
+
+    def invalidate(self, generator_id):
+        # remove the cached config of a generator, when it is edited or deleted
+        with self.lock:
+            if generator_id in self.versions:
+                del self.entries[(generator_id, self.versions.pop(generator_id))]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.versions.clear()
+
+    def get_stats(self):
+        with self.lock:
+            return {'size': len(self.entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions}
+
+    def to_text(self):
+        """
+        Statistics in plain text, in the format of Instrumentation.to_text()
+        """
+        stats = self.get_stats()
+        lines = [
+            'simulated_data_config_cache_size {}'.format(stats['size']),
+            'simulated_data_config_cache_max_size {}'.format(stats['max_size']),
+            'simulated_data_config_cache_hits_total {}'.format(stats['hits']),
+            'simulated_data_config_cache_misses_total {}'.format(stats['misses']),
+            'simulated_data_config_cache_evictions_total {}'.format(stats['evictions']),
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+config_cache = ConfigCache(config.CONFIG_CACHE_SIZE)
+
+
+def get_config_cache():
+    # process-wide cache of the validated job configs
+    return config_cache
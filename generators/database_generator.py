@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+import queue
+import sqlite3
+import threading
+import contextlib
+
+import config
+from generators.base_generator import BaseGenerator
+from errors import *
+
+# column types of the data types of BaseGenerator.get_object_schema()
+COLUMN_TYPES = {
+    'integer': 'INTEGER',
+    'float': 'REAL',
+    'boolean': 'BOOLEAN',
+    'string': 'TEXT',
+    'datetime': 'DATETIME',
+}
+
+PLACEHOLDERS = {
+    'qmark': '?',
+    'format': '%s',
+    'pyformat': '%s',
+}
+
+
+class ConnectionPool:
+    """
+    Pool of DBAPI connections to a database, reused across generate calls and scheduler ticks
+    SQLite URIs ('sqlite:///relative/path.db', 'sqlite:////absolute/path.db', 'sqlite://' for an in-memory database) use
+    the sqlite3 module, the other URIs use a SQLAlchemy engine and its connection pool
+    """
+
+    def __init__(self, database_uri, size=5):
+        self.database_uri = database_uri
+        self.size = size
+        self.engine = None
+        self.idle_connections = queue.LifoQueue()
+        if database_uri.startswith('sqlite:'):
+            path = database_uri[len('sqlite:'):]
+            if path.startswith('///'):
+                path = path[len('///'):]
+            elif path not in ('', '//'):
+                raise ConfigurationError("SQLite database URI {} not valid".format(database_uri))
+            self.database = path if path not in ('', '//') else ':memory:'
+            if self.database == ':memory:':
+                # every connection to ':memory:' is a different database, share one connection
+                self.size = 1
+            self.paramstyle = 'qmark'
+            self.quote = lambda name: '"{}"'.format(name.replace('"', '""'))
+        else:
+            try:
+                import sqlalchemy
+            except ImportError:
+                raise ConfigurationError("Database URI {} requires sqlalchemy to be installed".format(database_uri))
+            self.engine = sqlalchemy.create_engine(database_uri, pool_size=size)
+            self.paramstyle = self.engine.dialect.paramstyle
+            self.quote = self.engine.dialect.identifier_preparer.quote
+        if self.paramstyle not in PLACEHOLDERS:
+            raise ConfigurationError("Database driver parameter style '{}' not supported".format(self.paramstyle))
+        self.placeholder = PLACEHOLDERS[self.paramstyle]
+
+    def acquire(self):
+        if self.engine is not None:
+            return self.engine.raw_connection()
+        try:
+            return self.idle_connections.get_nowait()
+        except queue.Empty:
+            return sqlite3.connect(self.database, check_same_thread=False)
+
+    def release(self, connection):
+        if self.engine is not None:
+            # returns the connection to the pool of the engine
+            connection.close()
+        elif self.idle_connections.qsize() < self.size:
+            self.idle_connections.put(connection)
+        else:
+            connection.close()
+
+    @contextlib.contextmanager
+    def connection(self):
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+
+connection_pools = {}
+connection_pools_lock = threading.Lock()
+
+
+def get_connection_pool(database_uri, size=5):
+    # process-wide connection pool of a database
+    with connection_pools_lock:
+        if database_uri not in connection_pools:
+            connection_pools[database_uri] = ConnectionPool(database_uri, size)
+        return connection_pools[database_uri]
+
+
+class _DatabaseSink:
+    """
+    Insert batches of objects through one pooled connection, one transaction per batch. The rows of the batches are
+    inserted as they are, their values being in the order of the columns
+    """
+
+    name = 'database'
+
+    def __init__(self, pool, tables):
+        self.pool = pool
+        self.tables = tables
+        self.connection = pool.acquire()
+        self.cursor = self.connection.cursor()
+
+    def serialize(self, row_batch):
+        # insert statement and rows of every object type having objects
+        return [(insert, row_batch.get_rows(object_index))
+                for object_index, (table, schema, insert) in enumerate(self.tables) if row_batch.get_count(object_index) > 0]
+
+    def write(self, inserts):
+        try:
+            for insert, rows in inserts:
+                self.cursor.executemany(insert, rows)
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        return 0
+
+    def close(self):
+        self.pool.release(self.connection)
+        return 0
+
+
+class DatabaseGenerator(BaseGenerator):
+    """
+    Insert the generated objects in database tables, one table per object type
+    The table of an object type is set by its '__table' parameter ('object_<index>' if not set) and is created from the
+    data types of its fields if it does not exist. Rows are inserted with executemany() by batches of batch_size rows,
+    one transaction per batch, through connections pooled per database. The rows of a batch are inserted while the next
+    batches are generated, at most queue_size batches waiting at each stage (see Pipeline)
+    """
+
+    def __init__(self, task_id=None, job_config='{}', database_uri=None, batch_size=10000, pool_size=5, **kwargs):
+        super().__init__(task_id, job_config, **kwargs)
+        if database_uri is None:
+            database_uri = config.SQLALCHEMY_DATABASE_URI
+        if batch_size <= 0:
+            raise ConfigurationError("Parameter 'batch_size' must be a positive number")
+        self.database_uri = database_uri
+        self.batch_size = batch_size
+        self.pool_size = pool_size
+        self.pool = get_connection_pool(database_uri, pool_size)
+        self.tables_created = False
+
+        # per object type: table name, schema and insert statement, the columns being in the order of the row values
+        self.tables = []
+        for object_index in range(0, len(self.validated_job_config['objects'])):
+            table = self.get_object_name(object_index)
+            schema = self.get_object_schema(object_index)
+            if not schema:
+                raise ConfigurationError("Object {} must have at least 1 data field to be inserted in a table".format(object_index))
+            columns = ', '.join(self.pool.quote(key) for key, data_type in schema)
+            insert = 'INSERT INTO {} ({}) VALUES ({})'.format(self.pool.quote(table), columns,
+                                                             ', '.join([self.pool.placeholder] * len(schema)))
+            self.tables.append((table, schema, insert))
+
+    def get_shard_config(self):
+        shard_config = super().get_shard_config()
+        shard_config.update({'database_uri': self.database_uri, 'batch_size': self.batch_size, 'pool_size': self.pool_size})
+        return shard_config
+
+    def create_tables(self):
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            for table, schema, insert in self.tables:
+                cursor.execute('CREATE TABLE IF NOT EXISTS {} ({})'.format(self.pool.quote(table), ', '.join(
+                    '{} {}'.format(self.pool.quote(key), COLUMN_TYPES[data_type]) for key, data_type in schema)))
+            connection.commit()
+        self.tables_created = True
+
+    def generate(self, generating_time=1):
+        # insert the generated objects batch by batch, return the number of inserted rows
+        return self.insert_batches(self.iter_rows(generating_time, self.batch_size))
+
+    def flush(self):
+        # insert all the delayed objects
+        return self.insert_batches([self.flush_rows()])
+
+    def open_sink(self, append=True, filename=None):
+        """
+        Inserter of the rows in the tables, a sink of Pipeline. append and filename are not used
+        """
+        if not self.tables_created:
+            self.create_tables()
+        return _DatabaseSink(self.pool, self.tables)
+
+    def insert_batches(self, batches):
+        inserted_count, written = self.pipeline.run(batches, [self.open_sink()])
+        return inserted_count
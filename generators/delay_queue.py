@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import time
+import heapq
+import itertools
+
+from errors import *
+
+
+class DelayQueue:
+    """
+    Hold delayed records in a min-heap ordered by due time, until a later generate call releases them
+        max_size: maximum number of records held
+        overflow: what to do with a new delayed record when the queue is full:
+            'release': release the record due the earliest right away, to make room for the new one
+            'drop': drop the new record
+        clock: function returning the current time in seconds
+    """
+
+    overflow_policies = ['release', 'drop']
+
+    def __init__(self, max_size=100000, overflow='release', clock=time.time):
+        if max_size <= 0:
+            raise ConfigurationError("Delay queue size must be a positive number")
+        if overflow not in self.overflow_policies:
+            raise ConfigurationError("Delay queue overflow policy only take the following values: {}".format(
+                ', '.join("'{}'".format(policy) for policy in self.overflow_policies)))
+        self.max_size = max_size
+        self.overflow = overflow
+        self.clock = clock
+        # heap of (due time, sequence, record), the sequence keeps records due at the same time in arrival order
+        self.heap = []
+        self.sequence = itertools.count()
+        self.dropped_count = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, delay, record, now=None):
+        """
+        Delay a record by delay seconds. Return the record released early to make room for it, None otherwise
+        """
+        if now is None:
+            now = self.clock()
+        entry = (now + delay, next(self.sequence), record)
+        if len(self.heap) < self.max_size:
+            heapq.heappush(self.heap, entry)
+            return None
+        if self.overflow == 'drop':
+            self.dropped_count += 1
+            return None
+        return heapq.heappushpop(self.heap, entry)[2]
+
+    def pop_due(self, now=None):
+        """
+        Remove and return the records whose due time has passed, in due time order
+        """
+        if now is None:
+            now = self.clock()
+        released = []
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            released.append(heapq.heappop(heap)[2])
+        return released
+
+    def flush(self):
+        """
+        Remove and return all the records, in due time order
+        """
+        released = [entry[2] for entry in sorted(self.heap)]
+        self.heap = []
+        return released
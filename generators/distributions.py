@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+import math
+
+from errors import *
+
+try:
+    import numpy
+except ImportError:  # numpy is only needed by the batched samplers of the vectorized engine
+    numpy = None
+
+
+def _log1p_ratio(x):
+    # log(1 + x) / x, continuous at 0
+    return math.log1p(x) / x if abs(x) > 1e-8 else 1 - x * (0.5 - x / 3)
+
+
+def _expm1_ratio(x):
+    # (exp(x) - 1) / x, continuous at 0
+    return math.expm1(x) / x if abs(x) > 1e-8 else 1 + x * (0.5 + x / 6)
+
+
+class ZipfSampler:
+    """
+    Draw ranks 1..n with probabilities proportional to 1 / rank ** skew, in O(1) expected time and memory whatever n,
+    by rejection-inversion (W. Hormann, G. Derflinger, "Rejection-inversion to generate variates from monotone
+    discrete distributions", 1996). n can change between two draws, the constants depending on n are recomputed when
+    it does
+    """
+
+    def __init__(self, skew=1.0):
+        if not isinstance(skew, (int, float)) or skew <= 0:
+            raise ConfigurationError("Zipf skew must be a positive number")
+        self.skew = skew
+        self.h_integral_x1 = self.h_integral(1.5) - 1
+        self.s = 2 - self.h_integral_inverse(self.h_integral(2.5) - self.h(2))
+        self.n = None
+        self.h_integral_n = None
+
+    def h(self, x):
+        return math.exp(-self.skew * math.log(x))
+
+    def h_integral(self, x):
+        log_x = math.log(x)
+        return _expm1_ratio((1 - self.skew) * log_x) * log_x
+
+    def h_integral_inverse(self, x):
+        t = max(x * (1 - self.skew), -1)
+        return math.exp(_log1p_ratio(t) * x)
+
+    def sample(self, n, random):
+        """
+        Draw a rank in 1..n, random being a function returning a float in [0, 1)
+        """
+        if n != self.n:
+            self.n = n
+            self.h_integral_n = self.h_integral(n + 0.5)
+        h_integral_n = self.h_integral_n
+        h_integral_x1 = self.h_integral_x1
+        one_minus_skew = 1 - self.skew
+        while True:
+            u = h_integral_n + random() * (h_integral_x1 - h_integral_n)
+            # x = h_integral_inverse(u)
+            t = u * one_minus_skew
+            if t < -1:
+                t = -1
+            x = math.exp((math.log1p(t) / t if abs(t) > 1e-8 else 1 - t * (0.5 - t / 3)) * u)
+            k = int(x + 0.5)
+            if k < 1:
+                k = 1
+            elif k > n:
+                k = n
+            if k - x <= self.s or u >= self.h_integral(k + 0.5) - self.h(k):
+                return k
+
+    def sample_array(self, n, count, numpy_random):
+        """
+        Draw count ranks in 1..n with a numpy Generator, the rejected draws being drawn again as a smaller batch
+        """
+        if n != self.n:
+            self.n = n
+            self.h_integral_n = self.h_integral(n + 0.5)
+        h_integral_n = self.h_integral_n
+        skew = self.skew
+        ranks = numpy.empty(count, dtype=numpy.int64)
+        pending = numpy.arange(count)
+        while len(pending) > 0:
+            u = h_integral_n + numpy_random.random(len(pending)) * (self.h_integral_x1 - h_integral_n)
+            t = numpy.maximum(u * (1 - skew), -1)
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                ratio = numpy.where(numpy.abs(t) > 1e-8, numpy.log1p(t) / t, 1 - t * (0.5 - t / 3))
+            x = numpy.exp(ratio * u)
+            k = numpy.clip((x + 0.5).astype(numpy.int64), 1, n)
+            log_k = numpy.log(k + 0.5)
+            y = (1 - skew) * log_k
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                h_integral_k = numpy.where(numpy.abs(y) > 1e-8, numpy.expm1(y) / y, 1 + y * (0.5 + y / 6)) * log_k
+            accepted = (k - x <= self.s) | (u >= h_integral_k - numpy.exp(-skew * numpy.log(k)))
+            ranks[pending[accepted]] = k[accepted]
+            pending = pending[~accepted]
+        return ranks
+
+
+# distributions of the 'numeric', 'float' and 'datetime' fields, with the data types they apply to
+DISTRIBUTIONS = {
+    'uniform': ['numeric', 'float', 'datetime'],
+    'normal': ['numeric', 'float', 'datetime'],
+    'lognormal': ['numeric', 'float', 'datetime'],
+    'exponential': ['numeric', 'float', 'datetime'],
+    'poisson': ['numeric', 'datetime'],
+    'zipf': ['numeric', 'datetime'],
+}
+
+# parameter of a distribution giving the location of its values, a value of the field (a time for the datetimes)
+LOCATION_PARAMETERS = {'normal': 'mean', 'poisson': 'lambda'}
+
+# Poisson means up to which the distribution is drawn from an alias table, a normal approximation above
+MAX_POISSON_TABLE_LAMBDA = 100000
+
+
+def get_alias_table(weights):
+    """
+    Alias table of a discrete distribution (Vose's method): two lists of len(weights) items such that drawing a
+    uniform index i and keeping it with probability probabilities[i] (aliases[i] otherwise) draws index j with
+    probability weights[j] / sum(weights). Built in O(n), each draw is then O(1)
+    """
+    count = len(weights)
+    total = float(sum(weights))
+    if count == 0 or total <= 0 or any(weight < 0 for weight in weights):
+        raise ConfigurationError("Weights must be positive numbers with a positive sum")
+    scaled = [weight * count / total for weight in weights]
+    probabilities = [1.0] * count
+    aliases = list(range(0, count))
+    small = [index for index, weight in enumerate(scaled) if weight < 1]
+    large = [index for index, weight in enumerate(scaled) if weight >= 1]
+    while small and large:
+        less = small.pop()
+        more = large[-1]
+        probabilities[less] = scaled[less]
+        aliases[less] = more
+        scaled[more] -= 1 - scaled[less]
+        if scaled[more] < 1:
+            small.append(large.pop())
+    # the remaining items are kept with probability 1, up to rounding errors
+    return probabilities, aliases
+
+
+def get_poisson_table(mean):
+    """
+    Alias table of a Poisson distribution of a mean, truncated to mean +/- 12 standard deviations (the remaining
+    probability is negligible). Return (first value, probabilities, aliases), the drawn indexes being offsets from
+    the first value
+    """
+    spread = 12 * math.sqrt(mean) + 12
+    first = max(0, int(mean - spread))
+    log_mean = math.log(mean)
+    weights = [math.exp(k * log_mean - mean - math.lgamma(k + 1)) for k in range(first, int(mean + spread) + 1)]
+    probabilities, aliases = get_alias_table(weights)
+    return first, probabilities, aliases
+
+
+def alias_sampler(probabilities, aliases, random):
+    """
+    Function drawing an index from an alias table, with one call of random (a function returning a float in [0, 1))
+    """
+    count = len(probabilities)
+
+    def sample():
+        u = random() * count
+        index = int(u)
+        return index if u - index < probabilities[index] else aliases[index]
+    return sample
+
+
+def alias_column_sampler(probabilities, aliases, numpy_random):
+    """
+    Vectorized alias_sampler(): function drawing a numpy array of count indexes
+    """
+    probabilities = numpy.asarray(probabilities)
+    aliases = numpy.asarray(aliases)
+    count = len(probabilities)
+
+    def sample(size):
+        u = numpy_random.random(size) * count
+        indexes = u.astype(numpy.intp)
+        return numpy.where(u - indexes < probabilities[indexes], indexes, aliases[indexes])
+    return sample
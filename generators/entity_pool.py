@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+import os
+import mmap
+import struct
+import threading
+
+from generators.distributions import ZipfSampler
+from errors import *
+
+try:
+    import numpy
+except ImportError:  # numpy is only needed by the vectorized engine
+    numpy = None
+
+# pool file header: magic, key format ('i', 'q' or 's'), key length in bytes, number of keys
+HEADER = struct.Struct('<4scxHQ')
+MAGIC = b'SDEP'
+
+
+class EntityPool:
+    """
+    Keys of the entities of one kind (customers, products...) generated by a field, to be referenced by other fields
+    Keys are stored back to back in a flat buffer of fixed-size items: 4 or 8 byte integers, or ASCII strings padded
+    to key_length bytes, so a key costs key_length bytes whatever the number of keys. With a directory, the buffer is
+    a memory-mapped file '<directory>/<name>.pool' that keeps the keys across runs and restarts
+        key_type: 'integer' or 'string'
+        key_length: bytes per key: 4 or 8 for integers, the maximum string length for strings
+    The keys are never removed, the first added key having index 0
+    """
+
+    def __init__(self, name, key_type='integer', key_length=8, directory=None, initial_capacity=4096):
+        if key_type == 'integer' and key_length not in (4, 8):
+            raise ConfigurationError("Entity pool '{}' must have integer keys of 4 or 8 bytes".format(name))
+        if key_type == 'string' and not 0 < key_length < 65536:
+            raise ConfigurationError("Entity pool '{}' must have string keys of 1 to 65535 characters".format(name))
+        if key_type not in ('integer', 'string'):
+            raise ConfigurationError("Entity pool '{}' key type must be 'integer' or 'string'".format(name))
+        self.name = name
+        self.key_type = key_type
+        self.key_length = key_length
+        self.key_format = ('i' if key_length == 4 else 'q') if key_type == 'integer' else 's'
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.count = 0
+        self.fp = None
+
+        if directory is None:
+            self.header_size = 0
+            self.buffer = bytearray(initial_capacity * key_length)
+        else:
+            os.makedirs(directory, exist_ok=True)
+            self.filename = os.path.join(directory, '{}.pool'.format(name))
+            self.header_size = HEADER.size
+            if os.path.isfile(self.filename) and os.path.getsize(self.filename) >= HEADER.size:
+                self.fp = open(self.filename, 'r+b')
+                magic, key_format, key_length, self.count = HEADER.unpack(self.fp.read(HEADER.size))
+                if magic != MAGIC:
+                    raise ConfigurationError("File {} is not an entity pool".format(self.filename))
+                # the keys of an existing pool keep their format
+                key_format = key_format.decode('ascii')
+                if (key_format == 's') != (key_type == 'string'):
+                    raise ConfigurationError("Entity pool file {} does not hold {} keys".format(self.filename, key_type))
+                self.key_format = key_format
+                self.key_length = key_length
+            else:
+                self.fp = open(self.filename, 'w+b')
+                self.fp.write(HEADER.pack(MAGIC, self.key_format.encode('ascii'), self.key_length, 0))
+                self.fp.truncate(HEADER.size + initial_capacity * key_length)
+            self.buffer = mmap.mmap(self.fp.fileno(), 0)
+        self.view = self.__get_view()
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        # memory (or file) size of the pool
+        return len(self.buffer)
+
+    def __get_view(self):
+        # keys of the buffer, indexed by key index for the integer keys
+        view = memoryview(self.buffer)[self.header_size:]
+        return view.cast(self.key_format) if self.key_format != 's' else view
+
+    def __reserve(self, count):
+        """
+        Grow the buffer by doubling, so that adding a key is O(1) amortized. The buffer is replaced instead of being
+        resized, a sampler still reading the previous buffer keeps reading valid keys
+        """
+        needed = self.header_size + (self.count + count) * self.key_length
+        if needed <= len(self.buffer):
+            return
+        size = max(needed, self.header_size + 2 * (len(self.buffer) - self.header_size))
+        if self.fp is None:
+            buffer = bytearray(size)
+            buffer[:len(self.buffer)] = self.buffer
+        else:
+            self.fp.truncate(size)
+            buffer = mmap.mmap(self.fp.fileno(), 0)
+        self.buffer = buffer
+        self.view = self.__get_view()
+
+    def __set_count(self, count):
+        if self.fp is not None:
+            struct.pack_into('<Q', self.buffer, 8, count)
+        self.count = count
+
+    def add(self, key):
+        """
+        Add a key, return it
+        """
+        with self.lock:
+            self.__reserve(1)
+            if self.key_format == 's':
+                value = key.encode('ascii')
+                if len(value) > self.key_length:
+                    raise ExporterError("Key '{}' longer than the {} characters of entity pool '{}'".format(key, self.key_length, self.name))
+                offset = self.count * self.key_length
+                self.view[offset:offset + len(value)] = value
+            else:
+                self.view[self.count] = key
+            self.__set_count(self.count + 1)
+        return key
+
+    def extend(self, keys):
+        """
+        Add a numpy array of keys
+        """
+        if self.key_format == 's':
+            data = numpy.asarray(keys).astype('S{}'.format(self.key_length)).tobytes()
+        else:
+            data = numpy.asarray(keys).astype('<i{}'.format(self.key_length)).tobytes()
+        with self.lock:
+            self.__reserve(len(keys))
+            offset = self.header_size + self.count * self.key_length
+            self.buffer[offset:offset + len(data)] = data
+            self.__set_count(self.count + len(keys))
+
+    def get(self, index):
+        if self.key_format == 's':
+            offset = index * self.key_length
+            return bytes(self.view[offset:offset + self.key_length]).rstrip(b'\0').decode('ascii')
+        return self.view[index]
+
+    def take(self, indexes):
+        """
+        Keys at a numpy array of indexes, as a numpy array
+        """
+        dtype = 'S{}'.format(self.key_length) if self.key_format == 's' else '<i{}'.format(self.key_length)
+        keys = numpy.frombuffer(self.view, dtype=dtype, count=self.count)[indexes]
+        return keys.astype(str) if self.key_format == 's' else keys.astype(numpy.int64)
+
+    def get_sampler(self, random, distribution='uniform', skew=1.0):
+        """
+        Function drawing a key, None while the pool is empty
+            random: function returning a float in [0, 1)
+            distribution: 'uniform', or 'zipf' for keys of index i drawn with a probability proportional to
+                1 / (i + 1) ** skew, the first added keys being the most popular ones
+        """
+        pool = self
+        key_length = self.key_length
+        if self.key_format == 's':
+            def get(index):
+                offset = index * key_length
+                return bytes(pool.view[offset:offset + key_length]).rstrip(b'\0').decode('ascii')
+        else:
+            get = None
+
+        if distribution == 'zipf':
+            sample_rank = ZipfSampler(skew).sample
+            if get is None:
+                return lambda: pool.view[sample_rank(pool.count, random) - 1] if pool.count > 0 else None
+            return lambda: get(sample_rank(pool.count, random) - 1) if pool.count > 0 else None
+        if get is None:
+            return lambda: pool.view[int(random() * pool.count)] if pool.count > 0 else None
+        return lambda: get(int(random() * pool.count)) if pool.count > 0 else None
+
+    def get_column_sampler(self, numpy_random, distribution='uniform', skew=1.0):
+        """
+        Vectorized get_sampler(): function drawing a numpy array of count keys, of None values while the pool is empty
+        """
+        take = self.take
+        if distribution == 'zipf':
+            sample_ranks = ZipfSampler(skew).sample_array
+            draw_indexes = lambda count: sample_ranks(self.count, count, numpy_random) - 1
+        else:
+            draw_indexes = lambda count: numpy_random.integers(0, self.count, count)
+
+        def sample(count):
+            if self.count == 0:
+                return numpy.full(count, None, dtype=object)
+            return take(draw_indexes(count))
+        return sample
+
+    def flush(self):
+        if self.fp is not None:
+            self.buffer.flush()
+
+    def close(self):
+        if self.fp is not None:
+            self.view.release()
+            self.buffer.close()
+            self.fp.close()
+            self.fp = None
+
+
+entity_pools = {}
+entity_pools_lock = threading.Lock()
+
+
+def get_entity_pool(name, key_type='integer', key_length=None, directory=None):
+    """
+    Process-wide entity pool of a name and directory, created if needed
+        key_length: minimum bytes per key, None to accept the key length of an existing pool (8 bytes for integers, 32
+            characters for strings when the pool is created)
+    """
+    with entity_pools_lock:
+        key = (os.path.abspath(directory) if directory is not None else None, name)
+        pool = entity_pools.get(key)
+        if pool is None:
+            default_length = 8 if key_type == 'integer' else 32
+            pool = EntityPool(name, key_type, key_length if key_length is not None else default_length, directory)
+            entity_pools[key] = pool
+        if pool.key_type != key_type:
+            raise ExporterError("Entity pool '{}' holds {} keys, not {} keys".format(name, pool.key_type, key_type))
+        if key_length is not None and pool.key_length < key_length:
+            raise ExporterError("Entity pool '{}' holds keys of {} bytes, keys of {} bytes do not fit".format(
+                name, pool.key_length, key_length))
+        return pool
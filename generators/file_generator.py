@@ -1,32 +1,362 @@
 # -*- coding: utf-8 -*-
 
-import json
 import os
+import gzip
+import json
 
 from generators.base_generator import BaseGenerator
+from errors import *
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # pyarrow is only needed by the 'parquet' and 'arrow' output formats
+    pyarrow = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is only needed by the zstd compressed 'ndjson' output format
+    zstandard = None
+
+
+class _JsonArrayWriter:
+    """
+    Write the objects as one JSON array, batch by batch
+    """
+
+    name = 'json'
+    extension = '.json'
+    columnar = False
+    compressions = []
+
+    def __init__(self, full_filename, append, buffer_size, compression=None, objects=None):
+        self.first_object = True
+        if append and os.path.isfile(full_filename) and os.path.getsize(full_filename) > 0:
+            # reopen the existing array: drop its closing bracket and continue after its last object
+            with open(full_filename, 'r+b') as fp:
+                position = fp.seek(0, os.SEEK_END)
+                while position > 0:
+                    position -= 1
+                    fp.seek(position)
+                    if fp.read(1) == b']':
+                        break
+                else:
+                    raise ExporterError("File {} does not contain a JSON array, cannot append to it".format(full_filename))
+                fp.truncate(position)
+                while position > 0:
+                    position -= 1
+                    fp.seek(position)
+                    character = fp.read(1)
+                    if not character.isspace():
+                        self.first_object = character == b'['
+                        break
+            self.fp = open(full_filename, 'a', buffering=buffer_size)
+        else:
+            self.fp = open(full_filename, 'w', buffering=buffer_size)
+            self.fp.write('[')
+
+    def serialize(self, row_batch):
+        texts = row_batch.to_json()
+        if len(texts) == 0:
+            return ''
+        text = ', '.join(texts) if self.first_object else ', ' + ', '.join(texts)
+        self.first_object = False
+        return text
+
+    def write(self, text):
+        # return the number of written characters
+        return self.fp.write(text)
+
+    def close(self):
+        # return the number of written characters
+        written = self.fp.write(']')
+        self.fp.close()
+        return written
+
+
+class _NdjsonWriter:
+    """
+    Write the objects as newline delimited JSON, one object per line, optionally compressed with gzip or zstd
+    A compressed file is appended to by adding a gzip member (or a zstd frame) to it, which the decompressors read as
+    the continuation of the previous content
+    """
+
+    name = 'ndjson'
+    extension = '.ndjson'
+    columnar = False
+    compressions = ['gzip', 'zstd']
+    compression_extensions = {'gzip': '.gz', 'zstd': '.zst'}
+
+    def __init__(self, full_filename, append, buffer_size, compression=None, objects=None):
+        self.compression = compression
+        if compression is None:
+            self.fp = open(full_filename, 'a' if append else 'w', buffering=buffer_size)
+            return
+        self.raw_fp = open(full_filename, 'ab' if append else 'wb', buffering=buffer_size)
+        self.start_position = self.raw_fp.tell()
+        if compression == 'gzip':
+            self.fp = gzip.GzipFile(fileobj=self.raw_fp, mode='wb', compresslevel=6)
+        else:
+            self.fp = zstandard.ZstdCompressor(level=3).stream_writer(self.raw_fp, closefd=False)
+
+    def serialize(self, row_batch):
+        texts = row_batch.to_json()
+        text = '\n'.join(texts) + '\n' if texts else ''
+        return text if self.compression is None else text.encode('utf-8')
+
+    def write(self, data):
+        # return the number of written characters, 0 for compressed files (see close())
+        if self.compression is None:
+            return self.fp.write(data)
+        self.fp.write(data)
+        return 0
+
+    def close(self):
+        # return the number of compressed bytes written to the file
+        self.fp.close()
+        if self.compression is None:
+            return 0
+        written = self.raw_fp.tell() - self.start_position
+        self.raw_fp.close()
+        return written
+
+
+class _ColumnarWriter:
+    """
+    Write the objects of every object type to its own columnar dataset: a directory named after the object type
+    (see BaseGenerator.get_object_name()) holding one file per generate call. The columns of every batch of objects
+    are converted to a record batch of the schema of its object type, without building the objects, and written right
+    away as one row group (or one record batch)
+    Appending adds a new part file to the datasets, otherwise the existing part files are removed first
+    """
+
+    extension = ''
+    part_extension = None
+    columnar = True
+    compressions = []
+
+    def __init__(self, full_filename, append, buffer_size, compression=None, objects=None):
+        self.compression = compression
+        # per object type: part file name, arrow schema, data types of the columns
+        self.datasets = []
+        self.writers = []
+        for name, schema in objects:
+            dataset_directory = os.path.join(full_filename, name)
+            os.makedirs(dataset_directory, exist_ok=True)
+            part_numbers = []
+            for part_filename in os.listdir(dataset_directory):
+                if part_filename.startswith('part-') and part_filename.endswith(self.part_extension):
+                    if append:
+                        part_number = part_filename[len('part-'):-len(self.part_extension)]
+                        if part_number.isdigit():
+                            part_numbers.append(int(part_number))
+                    else:
+                        os.remove(os.path.join(dataset_directory, part_filename))
+            part_filename = os.path.join(dataset_directory, 'part-{:05d}{}'.format(max(part_numbers, default=-1) + 1,
+                                                                                  self.part_extension))
+            arrow_schema = pyarrow.schema([(key, ARROW_TYPES[data_type]()) for key, data_type in schema])
+            self.datasets.append((part_filename, arrow_schema, [data_type for key, data_type in schema]))
+            self.writers.append(None)
+
+    def serialize(self, row_batch):
+        # one record batch per object type having objects
+        record_batches = []
+        for object_index, (part_filename, arrow_schema, data_types) in enumerate(self.datasets):
+            if row_batch.get_count(object_index) > 0:
+                record_batches.append((object_index, pyarrow.RecordBatch.from_arrays(
+                    [get_arrow_array(column, data_type) for column, data_type in zip(row_batch.get_columns(object_index), data_types)],
+                    schema=arrow_schema)))
+        return record_batches
+
+    def write(self, record_batches):
+        # return 0, the size of the files is known when they are closed
+        for object_index, record_batch in record_batches:
+            if self.writers[object_index] is None:
+                # the part file of an object type is created by its first objects
+                part_filename, arrow_schema, data_types = self.datasets[object_index]
+                self.writers[object_index] = self.open_part(part_filename, arrow_schema)
+            self.write_batch(self.writers[object_index], record_batch)
+        return 0
+
+    def close(self):
+        # return the number of bytes written to the files
+        written = 0
+        for (part_filename, arrow_schema, data_types), writer in zip(self.datasets, self.writers):
+            if writer is not None:
+                writer.close()
+                written += os.path.getsize(part_filename)
+        return written
+
+
+class _ParquetWriter(_ColumnarWriter):
+    """
+    Parquet datasets, one row group per batch
+    """
+
+    name = 'parquet'
+    part_extension = '.parquet'
+    compressions = ['snappy', 'gzip', 'zstd', 'lz4', 'brotli', 'none']
+
+    def open_part(self, part_filename, arrow_schema):
+        return pyarrow.parquet.ParquetWriter(part_filename, arrow_schema, compression=self.compression or 'snappy')
+
+    def write_batch(self, writer, record_batch):
+        writer.write_batch(record_batch)
+
+
+class _ArrowWriter(_ColumnarWriter):
+    """
+    Arrow IPC file datasets (Feather v2), one record batch per batch
+    """
+
+    name = 'arrow'
+    part_extension = '.arrow'
+    compressions = ['zstd', 'lz4']
+
+    def open_part(self, part_filename, arrow_schema):
+        compression = {'lz4': 'lz4_frame'}.get(self.compression, self.compression)
+        return pyarrow.ipc.new_file(part_filename, arrow_schema, options=pyarrow.ipc.IpcWriteOptions(compression=compression))
+
+    def write_batch(self, writer, record_batch):
+        writer.write_batch(record_batch)
+
+
+# arrow types of the data types of BaseGenerator.get_object_schema()
+ARROW_TYPES = {
+    'integer': lambda: pyarrow.int64(),
+    'float': lambda: pyarrow.float64(),
+    'boolean': lambda: pyarrow.bool_(),
+    'string': lambda: pyarrow.string(),
+    'datetime': lambda: pyarrow.timestamp('s'),
+}
+
+
+def get_arrow_array(values, data_type):
+    if data_type == 'datetime':
+        # generated datetimes are '%Y-%m-%d %H:%M:%S' strings
+        return pyarrow.array(values, pyarrow.string()).cast(pyarrow.timestamp('s'))
+    try:
+        return pyarrow.array(values, ARROW_TYPES[data_type]())
+    except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+        # string column of a list field mixing value types
+        return pyarrow.array([value if value is None or isinstance(value, str) else str(value) for value in values],
+                             pyarrow.string())
+
 
 class FileGenerator(BaseGenerator):
     """
-    Export the generated objects to a JSON file
-    Because there may have several types of objects, only semi-structured file format like JSON (or XML) can be used
+    Export the generated objects to files
+    Supported output formats:
+        'json': one JSON array, streamed to the file
+        'ndjson': newline delimited JSON, one object per line, compressed if compression is 'gzip' or 'zstd'
+        'parquet': one Parquet dataset per object type in a directory named after the file name, the schema of the
+            dataset being derived from the field types (see BaseGenerator.get_object_schema()). compression is one of
+            'snappy' (default), 'gzip', 'zstd', 'lz4', 'brotli' or 'none'. Requires pyarrow
+        'arrow': same as 'parquet', with Arrow IPC files. compression is None, 'zstd' or 'lz4'. Requires pyarrow
+    Objects are generated and written in batches of batch_size iterations, the memory used does not depend on
+    generating_time. The batches are serialized and written while the next ones are generated, at most queue_size
+    batches waiting at each stage (see Pipeline). queue_size 0 generates, serializes and writes one batch at a time
     """
 
-    def __init__(self, task_id=None, job_config='{}', directory=None, filename='exported_file'):
-        super().__init__(task_id, job_config)
+    writers = {
+        'json': _JsonArrayWriter,
+        'ndjson': _NdjsonWriter,
+        'parquet': _ParquetWriter,
+        'arrow': _ArrowWriter,
+    }
+
+    def __init__(self, task_id=None, job_config='{}', directory=None, filename='exported_file', output_format='json',
+                 batch_size=10000, buffer_size=1024*1024, compression=None, **kwargs):
+        super().__init__(task_id, job_config, **kwargs)
         if directory is None:
             directory = os.getcwd()
+        if output_format not in self.writers:
+            raise ConfigurationError("Output format only take the following values: {}".format(
+                ', '.join("'{}'".format(name) for name in self.writers)))
+        writer_class = self.writers[output_format]
+        if compression is not None and compression not in writer_class.compressions:
+            raise ConfigurationError("Output format '{}' only support the following compressions: {}".format(
+                output_format, ', '.join("'{}'".format(name) for name in writer_class.compressions) or 'none'))
+        if writer_class.columnar and pyarrow is None:
+            raise ConfigurationError("Output format '{}' requires pyarrow to be installed".format(output_format))
+        if compression == 'zstd' and output_format == 'ndjson' and zstandard is None:
+            raise ConfigurationError("zstd compression requires zstandard to be installed")
+
+        # per object type: dataset name and schema, for the columnar output formats
+        self.objects = None
+        if writer_class.columnar:
+            self.objects = []
+            for object_index in range(0, len(self.validated_job_config['objects'])):
+                schema = self.get_object_schema(object_index)
+                if not schema:
+                    raise ConfigurationError("Object {} must have at least 1 data field to be written in format '{}'".format(
+                        object_index, output_format))
+                self.objects.append((self.get_object_name(object_index), schema))
+
         self.directory = directory
         self.filename = filename
+        self.output_format = output_format
+        self.compression = compression
+        self.extension = writer_class.extension + getattr(writer_class, 'compression_extensions', {}).get(compression, '')
+        self.batch_size = batch_size
+        self.buffer_size = buffer_size
+        # number of bytes (characters for the uncompressed JSON formats) written by the last generate call
+        self.last_written_bytes = 0
 
-    def generate(self, generating_time=1, append=True, filename=None):
-        # dump the generated objects to a json file
+    def get_shard_config(self):
+        shard_config = super().get_shard_config()
+        shard_config.update({'directory': self.directory, 'filename': self.filename, 'output_format': self.output_format,
+                             'batch_size': self.batch_size, 'buffer_size': self.buffer_size, 'compression': self.compression})
+        return shard_config
+
+    def get_full_filename(self, filename=None):
+        # file name, or directory of the datasets for the columnar output formats
         if filename is None:
             filename = self.filename
-        generated_objects = super().generate(generating_time)
         full_filename = os.path.join(self.directory, filename)
-        if filename.find(".json") < 0 or filename.find(".json") != len(filename):
-            full_filename += ".json"
+        if not filename.endswith(self.extension):
+            full_filename += self.extension
+        return full_filename
 
-        with open(full_filename, 'w') as fp:
-            json.dump(generated_objects, fp)
+    def generate(self, generating_time=1, append=True, filename=None):
+        # stream the generated objects to the file, batch by batch
+        return self.write_batches(self.iter_rows(generating_time, self.batch_size), append, filename)
+
+    def open_sink(self, append=True, filename=None):
+        """
+        Writer of the file, a sink of Pipeline
+        """
+        writer_class = self.writers[self.output_format]
+        return writer_class(self.get_full_filename(filename), append, self.buffer_size, self.compression, self.objects)
+
+    def write_batches(self, batches, append=True, filename=None):
+        """
+        Write batches of objects in compact form (see RowBatch) to the file
+        """
+        self.last_written_bytes = 0
+        generated_count, written = self.pipeline.run(batches, [self.open_sink(append, filename)])
+        self.last_written_bytes = written[0]
+        return generated_count
+
+    def flush(self, append=True, filename=None):
+        # write all the delayed objects to the file
+        return self.write_batches([self.flush_rows()], append, filename)
+
+    def generate_sharded(self, generating_time=1, shards=2, processes=None, append=True, filename=None, merge=True):
+        """
+        Generate in shards (see BaseGenerator.iter_sharded())
+            merge: write the output of all shards to the file, in shard order. Otherwise every shard writes its own
+                file, named after the file name and the shard index
+        """
+        if filename is None:
+            filename = self.filename
+        if not merge:
+            extension = self.extension
+            if extension and filename.endswith(extension):
+                filename = filename[:-len(extension)]
+            generate_kwargs = [{'append': append, 'filename': '{}-shard-{}'.format(filename, shard_index)}
+                               for shard_index in range(0, shards)]
+            return sum(self.iter_sharded(generating_time, shards, processes, generate_kwargs))
 
+        return self.write_batches(self.iter_sharded(generating_time, shards, processes, rows=True), append, filename)
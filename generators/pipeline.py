@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+
+import time
+import queue
+import threading
+import weakref
+
+from instrumentation import get_instrumentation
+from errors import *
+
+# marker closing the queue of a stage
+END = object()
+
+
+class Stage:
+    """
+    Statistics of a stage of a pipeline, accumulated over its runs
+        busy_seconds: time spent generating, serializing or writing
+        blocked_seconds: time spent waiting for room in the queue of the next stage, i.e. slowed down by backpressure
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.batches = 0
+        self.records = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0
+
+    def add(self, seconds, records):
+        self.busy_seconds += seconds
+        self.batches += 1
+        self.records += records
+
+
+class Pipeline:
+    """
+    Generate batches of objects and write them to one or several sinks concurrently: the batches are generated in the
+    calling thread and go through two stages per sink, each in its own thread, connected by bounded queues:
+        serialize: convert a batch to what the sink writes (text, record batches, rows...)
+        write: write it to the file or database
+    A stage waits when the queue of the next stage is full, so a slow sink slows the generation down instead of the
+    batches piling up in memory: at most 2 * queue_size batches per sink are in flight. All the sinks get the same
+    batches, the objects are generated once whatever the number of sinks
+    The batches are RowBatch objects. A sink is an object with:
+        name: name of the sink in the statistics
+        serialize(row_batch): the data written for a batch of objects, must not modify the batch
+        write(data): write the data, return the number of written bytes
+        close(): return the number of bytes written when closing
+    The statistics of the stages and the depth of the queues are kept across runs (see get_stats() and to_text())
+        queue_size: maximum number of batches waiting in the queue of a stage. 0 runs the stages one after the other
+            in the calling thread
+    """
+
+    def __init__(self, name, queue_size=4):
+        if not isinstance(queue_size, int) or queue_size < 0:
+            raise ConfigurationError("Parameter 'queue_size' must be 0 or a positive number")
+        self.name = name
+        self.queue_size = queue_size
+        self.stages = {}
+        # queues of the running stages, by name of the stage they feed
+        self.queues = {}
+        self.error = None
+        self.lock = threading.Lock()
+        with pipelines_lock:
+            pipelines[(name, id(self))] = self
+
+    def get_stage(self, name):
+        with self.lock:
+            if name not in self.stages:
+                self.stages[name] = Stage(name)
+            return self.stages[name]
+
+    def run(self, batches, sinks):
+        """
+        Write an iterable of batches of objects to the sinks and close them
+        Return the number of records and the list of the number of bytes written to every sink
+        """
+        names = [sink.name for sink in sinks]
+        names = [name if names.count(name) == 1 else '{}.{}'.format(name, index) for index, name in enumerate(names)]
+        instrumentation = get_instrumentation()
+        sink_timer = instrumentation.get_timer('sink.write') if instrumentation is not None else None
+        generate_stage = self.get_stage('generate')
+        # per sink: function serializing a batch, serialize stage, write stage
+        stages = [(sink.serialize, self.get_stage('serialize.' + name), self.get_stage('write.' + name))
+                  for name, sink in zip(names, sinks)]
+        written = [0] * len(sinks)
+
+        if self.queue_size == 0:
+            records = 0
+            try:
+                for row_batch in self.__timed(batches, generate_stage):
+                    records += len(row_batch)
+                    for index, (sink, (serialize, serialize_stage, write_stage)) in enumerate(zip(sinks, stages)):
+                        written[index] += self.__write(sink, self.__serialize(serialize, row_batch, serialize_stage),
+                                                       write_stage, sink_timer)
+            finally:
+                for index, sink in enumerate(sinks):
+                    written[index] += sink.close()
+            return records, written
+
+        self.error = None
+        serialize_queues = [queue.Queue(self.queue_size) for sink in sinks]
+        write_queues = [queue.Queue(self.queue_size) for sink in sinks]
+        threads = []
+        for index, (name, sink, stage) in enumerate(zip(names, sinks, stages)):
+            serialize, serialize_stage, write_stage = stage
+            self.queues['serialize.' + name] = serialize_queues[index]
+            self.queues['write.' + name] = write_queues[index]
+            threads.append(threading.Thread(target=self.__serialize_loop, name='pipeline-serialize-{}'.format(name),
+                                            args=(serialize, serialize_queues[index], write_queues[index], serialize_stage),
+                                            daemon=True))
+            threads.append(threading.Thread(target=self.__write_loop, name='pipeline-write-{}'.format(name),
+                                            args=(sink, index, write_queues[index], write_stage, sink_timer, written),
+                                            daemon=True))
+        for thread in threads:
+            thread.start()
+
+        records = 0
+        try:
+            for row_batch in self.__timed(batches, generate_stage):
+                records += len(row_batch)
+                for serialize_queue in serialize_queues:
+                    self.__put(serialize_queue, row_batch, generate_stage)
+        except Exception as e:
+            self.__fail(e)
+        finally:
+            for serialize_queue in serialize_queues:
+                self.__put(serialize_queue, END, generate_stage)
+            for thread in threads:
+                thread.join()
+            self.queues.clear()
+            for index, sink in enumerate(sinks):
+                try:
+                    written[index] += sink.close()
+                except Exception as e:
+                    self.__fail(e)
+        if self.error is not None:
+            raise self.error
+        return records, written
+
+    def __timed(self, batches, stage):
+        # iterate over the batches, timing their generation
+        iterator = iter(batches)
+        while True:
+            start = time.perf_counter()
+            try:
+                row_batch = next(iterator)
+            except StopIteration:
+                return
+            stage.add(time.perf_counter() - start, len(row_batch))
+            yield row_batch
+            if self.error is not None:
+                return
+
+    def __serialize(self, serialize, row_batch, stage):
+        start = time.perf_counter()
+        data = serialize(row_batch)
+        records = len(row_batch)
+        stage.add(time.perf_counter() - start, records)
+        return data, records
+
+    def __write(self, sink, serialized, stage, sink_timer):
+        data, records = serialized
+        start = time.perf_counter()
+        written = sink.write(data)
+        seconds = time.perf_counter() - start
+        stage.add(seconds, records)
+        if sink_timer is not None:
+            sink_timer.add(seconds, records)
+        return written
+
+    def __serialize_loop(self, serialize, serialize_queue, write_queue, stage):
+        row_batch = None
+        try:
+            while True:
+                row_batch = serialize_queue.get()
+                if row_batch is END or self.error is not None:
+                    break
+                self.__put(write_queue, self.__serialize(serialize, row_batch, stage), stage)
+        except Exception as e:
+            self.__fail(e)
+        finally:
+            # the batches still queued are dropped after a failure, until the generating thread closes the queue
+            while row_batch is not END:
+                row_batch = serialize_queue.get()
+            self.__put(write_queue, END, stage)
+
+    def __write_loop(self, sink, index, write_queue, stage, sink_timer, written):
+        serialized = None
+        try:
+            while True:
+                serialized = write_queue.get()
+                if serialized is END or self.error is not None:
+                    break
+                written[index] += self.__write(sink, serialized, stage, sink_timer)
+        except Exception as e:
+            self.__fail(e)
+        finally:
+            while serialized is not END:
+                serialized = write_queue.get()
+
+    def __put(self, stage_queue, item, stage):
+        # put an item in the queue of the next stage, accounting the time waited for room as backpressure
+        try:
+            stage_queue.put_nowait(item)
+        except queue.Full:
+            start = time.perf_counter()
+            stage_queue.put(item)
+            stage.blocked_seconds += time.perf_counter() - start
+
+    def __fail(self, error):
+        # keep the first error, raised by run() once all the stages are stopped
+        with self.lock:
+            if self.error is None:
+                self.error = error
+
+    def get_stats(self):
+        """
+        Per stage: batches, records, throughput in records per second of busy time, seconds blocked by backpressure,
+        and depth of the queue of the stage while a run is in progress
+        """
+        with self.lock:
+            stages = list(self.stages.values())
+        stats = {}
+        for stage in stages:
+            stage_queue = self.queues.get(stage.name)
+            stats[stage.name] = {
+                'batches': stage.batches,
+                'records': stage.records,
+                'records_per_second': stage.records / stage.busy_seconds if stage.busy_seconds > 0 else 0,
+                'busy_seconds': stage.busy_seconds,
+                'blocked_seconds': stage.blocked_seconds,
+                'queue_depth': stage_queue.qsize() if stage_queue is not None else 0,
+                'queue_size': self.queue_size,
+            }
+        return stats
+
+
+# pipelines of the generators alive in this process
+pipelines = weakref.WeakValueDictionary()
+pipelines_lock = threading.Lock()
+
+
+def to_text():
+    """
+    Statistics of the stages of the pipelines in plain text, in the format of Instrumentation.to_text()
+    """
+    with pipelines_lock:
+        alive = sorted(pipelines.items(), key=lambda item: item[0])
+    lines = []
+    for (name, identifier), pipeline in alive:
+        for stage, stats in sorted(pipeline.get_stats().items()):
+            labels = 'pipeline="{}",stage="{}"'.format(name, stage)
+            lines.append('simulated_data_pipeline_records_total{{{}}} {}'.format(labels, stats['records']))
+            lines.append('simulated_data_pipeline_batches_total{{{}}} {}'.format(labels, stats['batches']))
+            lines.append('simulated_data_pipeline_busy_seconds{{{}}} {:.6f}'.format(labels, stats['busy_seconds']))
+            lines.append('simulated_data_pipeline_blocked_seconds{{{}}} {:.6f}'.format(labels, stats['blocked_seconds']))
+            lines.append('simulated_data_pipeline_queue_depth{{{}}} {}'.format(labels, stats['queue_depth']))
+    return ''.join(line + '\n' for line in lines)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+import json
+import array
+import operator
+import itertools
+
+# types of the values encoded as JSON arrays or objects
+CONTAINER_TYPES = {list, tuple, dict}
+
+
+class RowBatch:
+    """
+    Generated objects in compact form. The field names of every object type are stored once (in the order of
+    BaseGenerator.get_object_schema()) and the values of its objects either as rows, one tuple of values per object, or
+    as columns, one numpy array per field as generated by the vectorized engine. A row costs a tuple of pointers instead
+    of a dictionary (and is not tracked by the garbage collector when its values are not containers), a numpy column
+    stores its numbers unboxed
+    The objects are converted to dictionaries only when asked for (to_dicts(), to_grouped_dicts()), the sinks read the
+    rows or the columns directly
+        keys: list of the tuples of field names of every object type
+        rows: list of the rows of every object type, None for the object types stored as columns
+        columns: list of the columns of every object type, None for the object types stored as rows
+        order: object type index of every object in generation order, None when there is only one object type
+    """
+
+    __slots__ = ('keys', 'rows', 'columns', 'order')
+
+    def __init__(self, keys, rows=None, columns=None, order=None):
+        self.keys = keys
+        self.rows = rows if rows is not None else [None] * len(keys)
+        self.columns = columns if columns is not None else [None] * len(keys)
+        self.order = order
+
+    def __len__(self):
+        return sum(self.get_count(object_index) for object_index in range(0, len(self.keys)))
+
+    def get_count(self, object_index):
+        rows = self.rows[object_index]
+        return len(rows) if rows is not None else len(self.columns[object_index][0])
+
+    def get_rows(self, object_index):
+        """
+        Rows of an object type, one sequence of values per object
+        """
+        rows = self.rows[object_index]
+        if rows is None:
+            rows = list(zip(*[column.tolist() for column in self.columns[object_index]]))
+        return rows
+
+    def get_columns(self, object_index):
+        """
+        Columns of an object type, one sequence of values per field
+        """
+        columns = self.columns[object_index]
+        if columns is None:
+            rows = self.rows[object_index]
+            columns = [list(map(operator.itemgetter(field_index), rows)) for field_index in range(0, len(self.keys[object_index]))]
+        return columns
+
+    def to_grouped_dicts(self):
+        # one list of dictionaries per object type, see BaseGenerator.generate_grouped()
+        return [list(map(dict, map(zip, itertools.repeat(keys), self.get_rows(object_index))))
+                for object_index, keys in enumerate(self.keys)]
+
+    def to_dicts(self):
+        # list of dictionaries in generation order, see BaseGenerator.generate()
+        return self.__in_order(self.to_grouped_dicts())
+
+    def to_json(self):
+        """
+        List of the JSON texts of the objects in generation order, each one being json.dumps() of the dictionary of the
+        object. Every column is encoded by one encoder call with one value per line, the field names being added
+        around the lines of the values. The columns holding lists or dictionaries, whose items would be split across
+        lines too, are encoded value by value
+        """
+        texts = []
+        for object_index, keys in enumerate(self.keys):
+            count = self.get_count(object_index)
+            if count == 0 or not keys:
+                texts.append(['{}'] * count)
+                continue
+            values = []
+            for field_index, column in enumerate(self.get_columns(object_index)):
+                last = field_index == len(keys) - 1
+                column = column if isinstance(column, list) else column.tolist()
+                if not CONTAINER_TYPES.isdisjoint(map(type, column)):
+                    lines = list(map(json.dumps, column))
+                    values.append(lines if last else [line + ',' for line in lines])
+                    continue
+                # [value 1,\nvalue 2,\n...]: the values but the ones of the last field keep the comma of the next field
+                lines = json.dumps(column, separators=('\n' if last else ',\n', ': ')).split('\n')
+                lines[0] = lines[0][1:]
+                lines[-1] = lines[-1][:-1] if last else lines[-1][:-1] + ','
+                values.append(lines)
+            template = '{{' + ' '.join('{}: {{}}'.format(json.dumps(key).replace('{', '{{').replace('}', '}}')) for key in keys) + '}}'
+            texts.append(list(map(template.format, *values)))
+        return self.__in_order(texts)
+
+    def __in_order(self, grouped_items):
+        # merge the items of every object type in generation order
+        if self.order is None:
+            return grouped_items[0] if grouped_items else []
+        iterators = [iter(items).__next__ for items in grouped_items]
+        return [iterators[object_index]() for object_index in self.order]
+
+
+def get_order(object_count):
+    # empty order of a batch of objects of object_count types, one byte per object up to 256 types
+    return array.array('B' if object_count <= 256 else 'I') if object_count > 1 else None
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import functools
+
+from errors import *
+
+ALPHABETS = {
+    'hex': '0123456789abcdef',
+    'digits': '0123456789',
+    'lowercase': 'abcdefghijklmnopqrstuvwxyz',
+    'uppercase': 'ABCDEFGHIJKLMNOPQRSTUVWXYZ',
+    'alpha': 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ',
+    'alphanumeric': '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ',
+}
+
+
+def get_alphabet(alphabet):
+    """
+    Return the characters of an alphabet: one of the names in ALPHABETS or the characters themselves
+    """
+    characters = ALPHABETS.get(alphabet, alphabet)
+    if not isinstance(characters, str) or len(characters) < 2 or len(characters) > 256:
+        raise ConfigurationError("Alphabet '{}' must be a name in {} or a string of 2 to 256 characters".format(alphabet, ', '.join(ALPHABETS)))
+    if len(set(characters)) != len(characters):
+        raise ConfigurationError("Alphabet '{}' must not contain a character twice".format(alphabet))
+    if not characters.isascii():
+        raise ConfigurationError("Alphabet '{}' must only contain ASCII characters".format(alphabet))
+    return characters
+
+
+@functools.lru_cache(maxsize=64)
+def get_translation(alphabet):
+    """
+    Translation table of random bytes to the characters of an alphabet, and the byte values to drop
+    """
+    alphabet_size = len(alphabet)
+    limit = 256 - 256 % alphabet_size
+    table = bytes(ord(alphabet[value % alphabet_size]) if value < limit else 0 for value in range(0, 256))
+    return table, bytes(range(limit, 256))
+
+
+class RandomStringSource:
+    """
+    Draw random strings out of a bulk buffer of random characters
+    The buffer is refilled by blocks of block_size random bytes, from os.urandom or from a PRNG when a seed is given,
+    each byte being translated to one character of the alphabet. Bytes that would bias the distribution (the last
+    256 % len(alphabet) byte values) are dropped
+    """
+
+    def __init__(self, alphabet='hex', seed=None, random_bytes=None, block_size=64*1024):
+        self.alphabet = get_alphabet(alphabet)
+        if random_bytes is not None:
+            self.random_bytes = random_bytes
+        elif seed is not None:
+            self.random_bytes = random.Random(seed).randbytes
+        else:
+            self.random_bytes = os.urandom
+        self.block_size = block_size
+
+        self.table, self.dropped_bytes = get_translation(self.alphabet)
+
+        self.buffer = ''
+        self.position = 0
+
+    def __refill(self, length):
+        blocks = [self.buffer[self.position:]]
+        available = len(blocks[0])
+        while available < length:
+            block = self.random_bytes(max(self.block_size, length)).translate(self.table, self.dropped_bytes).decode('ascii')
+            blocks.append(block)
+            available += len(block)
+        self.buffer = ''.join(blocks)
+        self.position = 0
+
+    def draw(self, length):
+        end = self.position + length
+        if end > len(self.buffer):
+            self.__refill(length)
+            end = length
+        value = self.buffer[self.position:end]
+        self.position = end
+        return value
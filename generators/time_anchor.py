@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+import time
+import datetime
+
+from errors import *
+
+EPOCH = datetime.datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+# ' HH:MM' for every minute of a day and ':SS' for every second of a minute
+MINUTE_STRINGS = [' {:02d}:{:02d}'.format(minute // 60, minute % 60) for minute in range(0, 1440)]
+SECOND_STRINGS = [':{:02d}'.format(second) for second in range(0, 60)]
+
+
+class TimeAnchor:
+    """
+    Resolve relative time configs ('NOW', 'YEAR-60', 'MINUTE+5', ...) to integer epoch seconds against one anchor time
+    Time values are naive local times counted in seconds from 1970-01-01 00:00:00, so that generating a datetime value
+    is one integer draw between two resolved bounds plus format_timestamp()
+        anchor_time: fixed anchor, datetime or time in 'YYYY-MM-DD HH24:MI:SS' format. A fixed anchor is never refreshed
+        refresh_interval: with no fixed anchor, minimum number of seconds between two refreshes of the anchor to the
+            current time. None refreshes the anchor on every call of refresh()
+    """
+
+    def __init__(self, anchor_time=None, refresh_interval=None):
+        if isinstance(anchor_time, str):
+            try:
+                anchor_time = datetime.datetime.strptime(anchor_time, '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                raise ConfigurationError("Value {} not valid for time anchor. Must be in '%Y-%m-%d %H:%M:%S' format".format(anchor_time))
+        self.fixed = anchor_time is not None
+        self.refresh_interval = refresh_interval
+        self.refreshed_at = None
+        self.now = (anchor_time if self.fixed else datetime.datetime.now()).replace(microsecond=0)
+
+        # resolved epoch seconds of the registered time configs, updated in place on every refresh
+        self.time_configs = {}
+        self.resolved = {}
+
+    def refresh(self, force=False):
+        if self.fixed:
+            return
+        monotonic_now = time.monotonic()
+        if not force and self.refresh_interval is not None and self.refreshed_at is not None \
+                and monotonic_now - self.refreshed_at < self.refresh_interval:
+            return
+        self.refreshed_at = monotonic_now
+        self.now = datetime.datetime.now().replace(microsecond=0)
+        for key, time_config in self.time_configs.items():
+            self.resolved[key] = self.to_timestamp(self.get_time_bound(time_config))
+
+    def register(self, time_config):
+        """
+        Register a validated time config, return the key of its resolved value in self.resolved
+        """
+        key = time_config['__org']
+        if key not in self.time_configs:
+            self.time_configs[key] = time_config
+            self.resolved[key] = self.to_timestamp(self.get_time_bound(time_config))
+        return key
+
+    def get_time_bound(self, time_config):
+        time_config_org = time_config['__org']
+        time_delta_direction = time_config['direction']
+        time_unit = time_config['unit']
+        time_delta = time_config['delta']
+
+        value = self.now
+        if time_unit == 'NOW':
+            pass
+        elif time_unit == 'SECOND':
+            value = value + datetime.timedelta(0, time_delta*time_delta_direction)
+        elif time_unit == 'MINUTE':
+            value = value.replace(second=0)
+            value = value + datetime.timedelta(0, time_delta * 60 * time_delta_direction)
+        elif time_unit == 'HOUR':
+            value = value.replace(minute=0, second=0)
+            value = value + datetime.timedelta(0, time_delta * 3600 * time_delta_direction)
+        elif time_unit == 'DAY':
+            value = value.replace(hour=0, minute=0, second=0)
+            value = value + datetime.timedelta(time_delta * time_delta_direction)
+        elif time_unit == 'MONTH':
+            # TODO: should solve the case a month have more or less than 30 days for absolute correction
+            # TO BE CONSIDERED: should it be that much accuracy?
+            value = value.replace(hour=0, minute=0, second=0)
+            value = value + datetime.timedelta(time_delta * 30 * time_delta_direction)
+        elif time_unit == 'YEAR':
+            # TODO: should solve the case a year have more than 365 days for absolute correction
+            # TO BE CONSIDERED: should it be that much accuracy?
+            value = value.replace(hour=0, minute=0, second=0)
+            value = value + datetime.timedelta(time_delta * 365 * time_delta_direction)
+        else:
+            raise ExporterError("Time parameter '{}' not valid".format(time_config_org))
+
+        return value
+
+    @staticmethod
+    def to_timestamp(value):
+        return int((value - EPOCH).total_seconds())
+
+
+date_strings = {}
+
+
+def format_timestamp(timestamp):
+    """
+    Format epoch seconds in '%Y-%m-%d %H:%M:%S' format, the same as strftime() with a cached date part
+    """
+    days, seconds = divmod(timestamp, 86400)
+    date_string = date_strings.get(days)
+    if date_string is None:
+        if len(date_strings) >= 100000:
+            date_strings.clear()
+        date_string = date_strings[days] = datetime.date.fromordinal(EPOCH_ORDINAL + days).isoformat()
+    minutes, seconds = divmod(seconds, 60)
+    return date_string + MINUTE_STRINGS[minutes] + SECOND_STRINGS[seconds]
@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+
+import os
+import mmap
+import math
+import struct
+import hashlib
+import threading
+
+from errors import *
+
+try:
+    import numpy
+except ImportError:  # numpy is only needed by the vectorized engine
+    numpy = None
+
+# state file header: magic, method, number of unique values generated, key of the permutation
+HEADER = struct.Struct('<4s12sQQ')
+MAGIC = b'SDGU'
+MASK64 = 2**64 - 1
+
+# bitmaps bigger than this number of bits must use another method
+MAX_BITMAP_BITS = 2**33
+# number of consecutive rejected draws after which the keyspace is considered exhausted
+MAX_REJECTED_DRAWS = 1000
+
+
+def mix64(x):
+    # splitmix64 finalizer, derives the round keys of the permutations
+    x = (x ^ (x >> 30)) * 0xbf58476d1ce4e5b9 & MASK64
+    x = (x ^ (x >> 27)) * 0x94d049bb133111eb & MASK64
+    return x ^ (x >> 31)
+
+
+# multiplier of the round function of the permutations, odd
+ROUND_MULTIPLIER = 0x9e3779b97f4a7c15
+
+
+def get_keyspace(config):
+    """
+    Number of distinct values of a validated 'numeric' or 'string' data config, None for variable length strings
+    """
+    if config['type'] == 'numeric':
+        return config['upper-bound'] - config['lower-bound'] + 1
+    if config['min-length'] != config['max-length']:
+        return None
+    return len(config['alphabet']) ** config['max-length']
+
+
+class UniqueConstraint:
+    """
+    State of a unique field: the number of unique values generated and the data telling which values were already
+    generated, in a buffer after a header. With a directory, the buffer is a memory-mapped file
+    '<directory>/<name>.unique' so that uniqueness holds across the runs and restarts of a task
+        shard, shards: the values are split into shards disjoint shares, the constraint generating the values of share
+            shard only, so that the shards of a sharded generation (each one with its own constraint in its own
+            process) never generate the same value. All the shards must use the same key
+    """
+
+    method = None
+
+    def __init__(self, name, data_size, directory=None, key=None, shard=0, shards=1):
+        self.name = name
+        self.shard = shard
+        self.shards = shards
+        # validated data config of the field, set by get_unique_constraint()
+        self.config = None
+        self.lock = threading.Lock()
+        self.fp = None
+        size = HEADER.size + data_size
+        if directory is None:
+            self.buffer = bytearray(size)
+            self.count = 0
+            self.key = key if key is not None else int.from_bytes(os.urandom(8), 'little')
+        else:
+            os.makedirs(directory, exist_ok=True)
+            self.filename = os.path.join(directory, '{}.unique'.format(name))
+            if os.path.isfile(self.filename):
+                self.fp = open(self.filename, 'r+b')
+                magic, method, self.count, self.key = HEADER.unpack(self.fp.read(HEADER.size))
+                if magic != MAGIC or method.rstrip(b'\0').decode('ascii') != self.method or os.path.getsize(self.filename) != size:
+                    raise ConfigurationError("File {} is not the '{}' unique state of this field".format(self.filename, self.method))
+            else:
+                self.count = 0
+                self.key = key if key is not None else int.from_bytes(os.urandom(8), 'little')
+                self.fp = open(self.filename, 'w+b')
+                self.fp.write(HEADER.pack(MAGIC, self.method.encode('ascii'), 0, self.key))
+                self.fp.truncate(size)
+            self.buffer = mmap.mmap(self.fp.fileno(), 0)
+        self.data = memoryview(self.buffer)[HEADER.size:]
+
+    @property
+    def nbytes(self):
+        # memory (or file) size of the state
+        return len(self.buffer)
+
+    def set_count(self, count):
+        self.count = count
+        if self.fp is not None:
+            struct.pack_into('<Q', self.buffer, 16, count)
+
+    def get_generator(self, draw):
+        """
+        Function returning a value never returned before, draw being the function generating the values of the field
+        """
+        raise NotImplementedError
+
+    def get_column_generator(self, draw_column):
+        """
+        Vectorized get_generator(): function returning a column of count values never returned before
+        """
+        generate = None
+
+        def generate_column(count, variables, rows):
+            nonlocal generate
+            if generate is None:
+                # values drawn one by one from batches of the field
+                pending = []
+
+                def draw(variables):
+                    if not pending:
+                        pending.extend(draw_column(max(count, 1024), variables, None).tolist())
+                    return pending.pop()
+                generate = self.get_generator(draw)
+            column = numpy.empty(count, dtype=object)
+            column[:] = [generate(None) for index in range(0, count)]
+            return column
+        return generate_column
+
+    def flush(self):
+        if self.fp is not None:
+            self.buffer.flush()
+
+
+class PermutationConstraint(UniqueConstraint):
+    """
+    Exact uniqueness without storage: the n-th value is the image of n by a keyed pseudo-random permutation of the
+    keyspace (a 4-round Feistel network on the smallest even number of bits covering the keyspace, cycle-walking
+    the images out of the keyspace back in). The round function is a multiply-shift hash of the right half and the
+    round key: cheap, and any round function makes a Feistel network a permutation. Only the number of generated
+    values is stored
+        encode: function turning an integer of the keyspace into a value
+    """
+
+    method = 'permutation'
+
+    def __init__(self, name, keyspace, encode, directory=None, key=None, encode_column=None, shard=0, shards=1):
+        super().__init__(name, 0, directory, key, shard, shards)
+        self.keyspace = keyspace
+        # the n-th value of a shard is the image of n * shards + shard
+        self.share = (keyspace - shard + shards - 1) // shards
+        self.encode = encode
+        self.encode_column = encode_column
+        self.half_bits = max(1, ((keyspace - 1).bit_length() + 1) // 2)
+        if self.half_bits > 64:
+            raise ConfigurationError("Keyspace of unique field '{}' too large for method 'permutation'".format(name))
+        self.half_mask = 2**self.half_bits - 1
+        self.round_keys = [mix64((self.key + index * 0x9e3779b97f4a7c15) & MASK64) for index in range(0, 4)]
+
+    def permute(self, value):
+        half_bits = self.half_bits
+        half_mask = self.half_mask
+        round_shift = 64 - half_bits
+        round_keys = self.round_keys
+        while True:
+            left = value >> half_bits
+            right = value & half_mask
+            for round_key in round_keys:
+                left, right = right, left ^ ((right ^ round_key) * ROUND_MULTIPLIER & MASK64) >> round_shift
+            value = (left << half_bits) | right
+            if value < self.keyspace:
+                return value
+
+    def permute_column(self, values):
+        # permute() of a numpy array of uint64, for keyspaces of at most 64 bits
+        half_bits = numpy.uint64(self.half_bits)
+        half_mask = numpy.uint64(self.half_mask)
+        round_shift = numpy.uint64(64 - self.half_bits)
+        round_keys = [numpy.uint64(round_key) for round_key in self.round_keys]
+        keyspace = numpy.uint64(self.keyspace)
+        pending = numpy.arange(len(values))
+        values = values.copy()
+        with numpy.errstate(over='ignore'):
+            while len(pending) > 0:
+                value = values[pending]
+                left = value >> half_bits
+                right = value & half_mask
+                for round_key in round_keys:
+                    left, right = right, left ^ (((right ^ round_key) * numpy.uint64(ROUND_MULTIPLIER)) >> round_shift)
+                value = (left << half_bits) | right
+                values[pending] = value
+                pending = pending[value >= keyspace]
+        return values
+
+    def __next_counters(self, count):
+        with self.lock:
+            start = self.count
+            if start + count > self.share:
+                raise ExporterError("All the {} values of unique field '{}' have been generated".format(self.share, self.name))
+            self.set_count(start + count)
+        return start
+
+    def get_generator(self, draw):
+        permute = self.permute
+        encode = self.encode
+        next_counters = self.__next_counters
+        shard = self.shard
+        shards = self.shards
+        return lambda variables: encode(permute(next_counters(1) * shards + shard))
+
+    def get_column_generator(self, draw_column):
+        if self.half_bits > 32 or self.encode_column is None:
+            return super().get_column_generator(draw_column)
+
+        def generate_column(count, variables, rows):
+            start = self.__next_counters(count)
+            counters = numpy.arange(start, start + count, dtype=numpy.uint64) * numpy.uint64(self.shards) + numpy.uint64(self.shard)
+            return self.encode_column(self.permute_column(counters))
+        return generate_column
+
+
+class BitmapConstraint(UniqueConstraint):
+    """
+    Exact uniqueness of integers of a bounded range: one bit per value of the range, set when the value is generated.
+    The values are drawn again until a value not generated yet is drawn. A drawn value is moved to the closest value
+    below it of the share of the shard
+    """
+
+    method = 'bitmap'
+
+    def __init__(self, name, lower_bound, upper_bound, directory=None, key=None, shard=0, shards=1):
+        bits = upper_bound - lower_bound + 1
+        if bits > MAX_BITMAP_BITS:
+            raise ConfigurationError("Range of unique field '{}' too large for method 'bitmap'".format(name))
+        super().__init__(name, (bits + 7) // 8, directory, key, shard, shards)
+        self.lower_bound = lower_bound
+        self.bits = bits
+        # values of the range whose index is shard modulo shards
+        self.share = (bits - shard + shards - 1) // shards
+
+    def get_generator(self, draw):
+        data = self.data
+        lower_bound = self.lower_bound
+        shard = self.shard
+        shards = self.shards
+
+        def generate_unique(variables):
+            with self.lock:
+                if self.count >= self.share:
+                    raise ExporterError("All the {} values of unique field '{}' have been generated".format(self.share, self.name))
+                while True:
+                    index = offset = draw(variables) - lower_bound
+                    if shards > 1:
+                        index = offset - offset % shards + shard
+                        if index > offset:
+                            index -= shards
+                        if index < 0:
+                            continue
+                    value = lower_bound + index
+                    byte = data[index >> 3]
+                    bit = 1 << (index & 7)
+                    if not byte & bit:
+                        data[index >> 3] = byte | bit
+                        self.set_count(self.count + 1)
+                        return value
+        return generate_unique
+
+
+class BloomConstraint(UniqueConstraint):
+    """
+    Uniqueness of any values through a Bloom filter sized for capacity values at error_rate false positive rate.
+    A value found in the filter is drawn again: no value is generated twice, false positives only skip some values
+    never generated. Past capacity, the false positive rate (and the number of draws per value) grows
+    The values of the share of a shard are the ones whose keyed hash is shard modulo shards, the other ones are drawn
+    again
+    """
+
+    method = 'bloom'
+
+    def __init__(self, name, capacity=10000000, error_rate=0.001, directory=None, key=None, shard=0, shards=1):
+        bits = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        super().__init__(name, (bits + 7) // 8, directory, key, shard, shards)
+        self.bits = bits
+        self.hash_count = max(1, round(bits / capacity * math.log(2)))
+        self.salt = self.key.to_bytes(8, 'little')
+
+    def get_generator(self, draw):
+        data = self.data
+        bits = self.bits
+        hash_count = self.hash_count
+        salt = self.salt
+        blake2b = hashlib.blake2b
+        shard = self.shard
+        shards = self.shards
+
+        def generate_unique(variables):
+            with self.lock:
+                for attempt in range(0, MAX_REJECTED_DRAWS * shards):
+                    value = draw(variables)
+                    digest = int.from_bytes(blake2b(str(value).encode('utf-8'), digest_size=16, salt=salt).digest(), 'little')
+                    if shards > 1 and (digest >> 112) % shards != shard:
+                        continue
+                    first_hash = digest & MASK64
+                    second_hash = (digest >> 64) | 1
+                    positions = [(first_hash + index * second_hash) % bits for index in range(0, hash_count)]
+                    if all(data[position >> 3] & (1 << (position & 7)) for position in positions):
+                        continue
+                    for position in positions:
+                        data[position >> 3] |= 1 << (position & 7)
+                    self.set_count(self.count + 1)
+                    return value
+            raise ExporterError("No new value of unique field '{}' found in {} draws".format(self.name, MAX_REJECTED_DRAWS))
+        return generate_unique
+
+
+unique_constraints = {}
+unique_constraints_lock = threading.Lock()
+
+
+def get_unique_constraint(name, config, directory=None, key=None, shard=0, shards=1):
+    """
+    Process-wide unique constraint of a name and directory, created from a validated 'numeric' or 'string' data config
+    with a 'unique' parameter. The shards of a field must have different names. A new version of the config of the field
+    (a generator edited and reloaded with the same task id) gets a new constraint, its file being reopened
+    """
+    with unique_constraints_lock:
+        registry_key = (os.path.abspath(directory) if directory is not None else None, name)
+        constraint = unique_constraints.get(registry_key)
+        if constraint is None or constraint.config != config:
+            if constraint is not None:
+                constraint.flush()
+            constraint = create_unique_constraint(name, config, directory, key, shard, shards)
+            constraint.config = config
+            unique_constraints[registry_key] = constraint
+        return constraint
+
+
+def create_unique_constraint(name, config, directory=None, key=None, shard=0, shards=1):
+    method = config['unique']
+    if method == 'bitmap':
+        return BitmapConstraint(name, config['lower-bound'], config['upper-bound'], directory, key, shard, shards)
+    if method == 'bloom':
+        return BloomConstraint(name, config['capacity'], config['error-rate'], directory, key, shard, shards)
+
+    keyspace = get_keyspace(config)
+    if config['type'] == 'numeric':
+        lower_bound = config['lower-bound']
+        encode_column = None
+        if -2**63 <= lower_bound and lower_bound + keyspace <= 2**63 and keyspace <= 2**63:
+            # values stored as int64 columns
+            encode_column = lambda values: lower_bound + values.astype(numpy.int64)
+        return PermutationConstraint(name, keyspace, lambda value: lower_bound + value, directory, key, encode_column,
+                                     shard, shards)
+
+    alphabet = config['alphabet']
+    base = len(alphabet)
+    length = config['max-length']
+
+    def encode(value):
+        # fixed length string of the digits of value in base len(alphabet)
+        characters = []
+        for index in range(0, length):
+            value, digit = divmod(value, base)
+            characters.append(alphabet[digit])
+        return ''.join(characters)
+
+    def encode_column(values):
+        characters = numpy.frombuffer(alphabet.encode('ascii'), dtype=numpy.uint8)
+        digits = numpy.empty((len(values), length), dtype=numpy.uint8)
+        for index in range(0, length):
+            digits[:, index] = characters[(values % numpy.uint64(base)).astype(numpy.intp)]
+            values = values // numpy.uint64(base)
+        return digits.view('S{}'.format(length)).ravel().astype('U{}'.format(length))
+
+    return PermutationConstraint(name, keyspace, encode, directory, key, encode_column, shard, shards)
+
+
+def to_text():
+    """
+    Number of values and memory of the unique constraints in plain text, in the format of Instrumentation.to_text()
+    """
+    with unique_constraints_lock:
+        constraints = sorted((constraint.name, constraint) for constraint in unique_constraints.values())
+    lines = []
+    for name, constraint in constraints:
+        lines.append('simulated_data_unique_values_total{{name="{}",method="{}"}} {}'.format(name, constraint.method, constraint.count))
+        lines.append('simulated_data_unique_bytes{{name="{}",method="{}"}} {}'.format(name, constraint.method, constraint.nbytes))
+    return ''.join(line + '\n' for line in lines)
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+import time
+import uuid
+import sqlite3
+import threading
+
+RUN_HISTORY_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS "run_history" (
+	"id"	TEXT UNIQUE,
+	"scheduler_id"	TEXT,
+	"task_id"	TEXT,
+	"planned_time"	TEXT,
+	"start_time"	TEXT,
+	"duration"	REAL,
+	"lag"	REAL,
+	"records"	INTEGER,
+	"bytes"	INTEGER,
+	"status"	TEXT,
+	PRIMARY KEY("id")
+)
+'''
+
+
+class Timer:
+    """
+    Accumulated duration and count (calls, values, records...) of an instrumented operation, added to by the threads
+    of the scheduler host and of the generators at the same time
+    """
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def add(self, seconds, count=1):
+        with self.lock:
+            self.seconds += seconds
+            self.count += count
+
+
+class CountingTemplate(list):
+    """
+    Row template of a generation plan counting the rows copied from it, so that counting the generated objects does
+    not add anything to the generation loop
+    """
+
+    def __init__(self, template, timer):
+        super().__init__(template)
+        self.timer = timer
+
+    def copy(self):
+        self.timer.add(0.0)
+        return list(self)
+
+
+class RunHistory:
+    """
+    Write the statistics of the scheduler runs to the 'run_history' table of a SQLite database, in batches
+        batch_size: number of runs written at once
+        flush_interval: maximum number of seconds a run waits before being written
+    """
+
+    def __init__(self, database, batch_size=100, flush_interval=10):
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending_runs = []
+        self.flushed_at = time.monotonic()
+        self.lock = threading.Lock()
+        connection = sqlite3.connect(self.database)
+        try:
+            connection.execute(RUN_HISTORY_SCHEMA)
+            connection.commit()
+        finally:
+            connection.close()
+
+    def add(self, run):
+        with self.lock:
+            self.pending_runs.append(run)
+            if len(self.pending_runs) < self.batch_size and time.monotonic() - self.flushed_at < self.flush_interval:
+                return
+            runs = self.pending_runs
+            self.pending_runs = []
+            self.flushed_at = time.monotonic()
+        self.__write(runs)
+
+    def flush(self):
+        with self.lock:
+            runs = self.pending_runs
+            self.pending_runs = []
+            self.flushed_at = time.monotonic()
+        self.__write(runs)
+
+    def __write(self, runs):
+        if not runs:
+            return
+        connection = sqlite3.connect(self.database)
+        try:
+            with connection:
+                connection.executemany(
+                    'INSERT INTO run_history (id, scheduler_id, task_id, planned_time, start_time, duration, lag, records, bytes, status) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    [(str(uuid.uuid4()), run['scheduler_id'], run['task_id'], run['planned_time'], run['start_time'],
+                      run['duration'], run['lag'], run['records'], run['bytes'], run['status']) for run in runs])
+        finally:
+            connection.close()
+
+
+class Instrumentation:
+    """
+    Timers of the instrumented operations and statistics of the scheduler runs
+    Timer names:
+        'object.<task id>.<object index>': objects generated per object type
+        'field_type.<type>': values generated per field type
+        'sink.write': records written by the sinks
+        'scheduler.tick': scheduler runs
+    Instrumentation is disabled unless enable() is called, instrumented code checks get_instrumentation() once when it
+    is built (generation plans) or once per call (sinks, scheduler ticks)
+    """
+
+    def __init__(self, run_history=None):
+        self.timers = {}
+        self.run_history = run_history
+        self.runs = 0
+        self.failed_runs = 0
+        self.records = 0
+        self.bytes = 0
+        self.last_lag = 0.0
+        self.lock = threading.Lock()
+
+    def get_timer(self, name):
+        with self.lock:
+            if name not in self.timers:
+                self.timers[name] = Timer()
+            return self.timers[name]
+
+    def timed(self, name, function, object_timer):
+        """
+        Wrap a value generating function of a generation plan so that its calls are timed, in the timer of its field
+        type and in the timer of its object
+        """
+        timer = self.get_timer(name)
+        perf_counter = time.perf_counter
+
+        def timed_function(variables):
+            start = perf_counter()
+            value = function(variables)
+            seconds = perf_counter() - start
+            timer.add(seconds)
+            object_timer.add(seconds, 0)
+            return value
+        return timed_function
+
+    def record_run(self, scheduler_id, task_id, planned_time, start_time, duration, records, written_bytes, status):
+        lag = (start_time - planned_time).total_seconds() if planned_time is not None else 0.0
+        with self.lock:
+            self.runs += 1
+            if status != 'Success':
+                self.failed_runs += 1
+            self.records += records
+            self.bytes += written_bytes
+            self.last_lag = lag
+        self.get_timer('scheduler.tick').add(duration, records)
+        if self.run_history is not None:
+            self.run_history.add({
+                'scheduler_id': scheduler_id,
+                'task_id': task_id,
+                'planned_time': planned_time.strftime('%Y-%m-%d %H:%M:%S') if planned_time is not None else None,
+                'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+                'duration': duration,
+                'lag': lag,
+                'records': records,
+                'bytes': written_bytes,
+                'status': status,
+            })
+
+    def to_text(self):
+        """
+        Metrics in plain text, one 'name{labels} value' line per metric
+        """
+        lines = [
+            'simulated_data_runs_total {}'.format(self.runs),
+            'simulated_data_failed_runs_total {}'.format(self.failed_runs),
+            'simulated_data_records_total {}'.format(self.records),
+            'simulated_data_bytes_total {}'.format(self.bytes),
+            'simulated_data_last_run_lag_seconds {:.6f}'.format(self.last_lag),
+        ]
+        with self.lock:
+            timers = sorted(self.timers.items())
+        for name, timer in timers:
+            lines.append('simulated_data_timer_seconds{{name="{}"}} {:.6f}'.format(name, timer.seconds))
+            lines.append('simulated_data_timer_count{{name="{}"}} {}'.format(name, timer.count))
+        return '\n'.join(lines) + '\n'
+
+
+current_instrumentation = None
+
+
+def enable(run_history_database=None, batch_size=100, flush_interval=10):
+    """
+    Enable the instrumentation in this process, for the generators and schedulers created from now on
+        run_history_database: SQLite database the run statistics are written to, not written if not set
+    """
+    global current_instrumentation
+    run_history = RunHistory(run_history_database, batch_size, flush_interval) if run_history_database is not None else None
+    current_instrumentation = Instrumentation(run_history)
+    return current_instrumentation
+
+
+def disable():
+    global current_instrumentation
+    if current_instrumentation is not None and current_instrumentation.run_history is not None:
+        current_instrumentation.run_history.flush()
+    current_instrumentation = None
+
+
+def get_instrumentation():
+    return current_instrumentation
@@ -1,27 +1,37 @@
 # -*- coding: utf-8 -*-
 
 import uuid
+import time
+import signal
 import datetime
 from multiprocessing import Process
 
+from instrumentation import get_instrumentation
 from errors import *
 
 class BaseScheduler:
 
-    def __init__(self, scheduler_id=None, schedule={}, generator=None):
+    def __init__(self, scheduler_id=None, schedule={}, generator=None, load_generator=None):
+        """
+        generator: the generator executed by the schedule
+        load_generator: function returning the generator, instead of generator. It is called on the first run of the
+            schedule, so that the generator config is only loaded and validated once the schedule is due
+        """
 
         # the process to manage the schedule
         self.process = None
+        # time of the last execution of the generating job
+        self.last_run = None
 
         if scheduler_id is not None:
             self.scheduler_id = scheduler_id
         else:
-            self.task_id = str(uuid.uuid4())
+            self.scheduler_id = str(uuid.uuid4())
 
-        if generator is not None:
-            self.generator = generator
-        else:
+        if generator is None and load_generator is None:
             raise Exception("Must set a generator to scheduler")
+        self.generator = generator
+        self.load_generator = load_generator
 
         if 'type' not in schedule:
             raise SchedulingError('Scheduling type not found')
@@ -30,35 +40,96 @@ class BaseScheduler:
         elif schedule['status'] not in ['Active', 'Inactive']:
             raise SchedulingError("Schedule status only take the following values: 'Active', 'Inactive'")
 
+        self.valid_from = None
         if 'valid_from' in schedule:
             try:
-                valid_from = datetime.datetime.strptime(schedule['valid_from'], '%Y-%m-%d %H:%M:%S')
+                self.valid_from = datetime.datetime.strptime(schedule['valid_from'], '%Y-%m-%d %H:%M:%S')
             except:
                 raise SchedulingError("Value {} not valid for parameter 'valid_from'. Must be in '%Y-%m-%d %H:%M:%S' format".format(schedule['valid_from']))
 
+        self.valid_to = None
         if 'valid_to' in schedule:
             try:
-                valid_to = datetime.datetime.strptime(schedule['valid_to'], '%Y-%m-%d %H:%M:%S')
+                self.valid_to = datetime.datetime.strptime(schedule['valid_to'], '%Y-%m-%d %H:%M:%S')
             except:
                 raise SchedulingError("Value {} not valid for parameter 'valid_to'. Must be in '%Y-%m-%d %H:%M:%S' format".format(schedule['valid_to']))
 
         self.schedule = schedule
 
+    def get_generator(self):
+        # the generator of the schedule, loaded on first use
+        if self.generator is None:
+            self.generator = self.load_generator()
+        return self.generator
+
+    def get_next_run(self, now):
+        # To be implemented by children class: time of the next execution after now, None when the schedule is over
+        raise SchedulingError("Function get_next_run() in class BaseScheduler should not be executed")
+
+    def execute(self):
+        # To be implemented by children class: execute the generating job once
+        raise SchedulingError("Function execute() in class BaseScheduler should not be executed")
+
     def run(self):
-        # To be implemented by children class
-        raise SchedulingError("Function run() in class BaseScheduler should not be executed")
+        # run the schedule in the current process until it is over
+        try:
+            next_run = self.get_next_run(datetime.datetime.now())
+            while next_run is not None:
+                delay = (next_run - datetime.datetime.now()).total_seconds()
+                if delay > 0:
+                    time.sleep(delay)
+                self.tick(next_run)
+                # runs missed while the job was executing are skipped
+                next_run = self.get_next_run(max(next_run, datetime.datetime.now()))
+        finally:
+            self.flush()
+
+    def tick(self, planned_run=None):
+        """
+        Execute the generating job once, recording the statistics of the run when the instrumentation is enabled
+        """
+        instrumentation = get_instrumentation()
+        if instrumentation is None:
+            return self.execute()
+
+        start_time = datetime.datetime.now()
+        start = time.perf_counter()
+        status = 'Failed'
+        result = None
+        try:
+            result = self.execute()
+            status = 'Success'
+            return result
+        finally:
+            # file generators return the number of written records, the other ones the records
+            records = result if isinstance(result, int) else len(result or [])
+            instrumentation.record_run(self.scheduler_id, getattr(self.generator, 'task_id', None), planned_run, start_time,
+                                       time.perf_counter() - start, records,
+                                       getattr(self.generator, 'last_written_bytes', 0), status)
+
+    def flush(self):
+        # release the objects the generator still holds (delayed objects), a generator not loaded yet holds none
+        return self.generator.flush() if self.generator is not None else []
+
+    def __run_process(self):
+        # stop() terminates the process with SIGTERM, exit cleanly so that run() flushes the generator
+        signal.signal(signal.SIGTERM, lambda signal_number, frame: exit(0))
+        self.run()
+
     def terminate(self):
         # To be implemented by children class
         raise SchedulingError("Function terminate() in class BaseScheduler should not be executed")
 
     def start(self):
         self.schedule['status'] = 'Active'
-        self.process = Process(target=self.run)
+        self.process = Process(target=self.__run_process)
         print('Start batch schedule {}'.format(self.scheduler_id))
         self.process.start()
 
     def stop(self):
         self.schedule['status'] = 'Inactive'
         print('Terminate batch schedule {}'.format(self.scheduler_id))
-        self.process.terminate()
+        if self.process is not None:
+            self.process.terminate()
+            self.process = None
         self.terminate()
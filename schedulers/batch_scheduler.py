@@ -1,9 +1,6 @@
 # -*- coding: utf-8 -*-
 
-import json
-import os
 import datetime
-import time
 
 from schedulers.base_scheduler import BaseScheduler
 from errors import *
@@ -13,7 +10,7 @@ class BatchScheduler(BaseScheduler):
         Schedule the generating job on a batchly manner
         """
 
-    def __init__(self, scheduler_id=None, schedule={}, generator=None):
+    def __init__(self, scheduler_id=None, schedule={}, generator=None, load_generator=None):
         """
         Needed parameters for batch scheduler:
             type: batch
@@ -30,14 +27,14 @@ class BatchScheduler(BaseScheduler):
             'valid_from': time in 'YYYY-MM-DD HH24:MI:SS' format or not needed. This parameter also triggers 'once' interval
             'valid_to': time in 'YYYY-MM-DD HH24:MI:SS' format or not needed
         """
-        super().__init__(scheduler_id, schedule, generator)
+        super().__init__(scheduler_id, schedule, generator, load_generator)
 
         # validate schedule based on configuration
         if schedule['type'] != 'batch':
             raise SchedulingError('Batch scheduling only!')
         if 'generating_time' not in schedule:
             raise SchedulingError("Schedule parameter 'generating_time' not found")
-        elif isinstance(schedule['generating_time'], int) or schedule['generating_time'] <= 0:
+        elif not isinstance(schedule['generating_time'], int) or schedule['generating_time'] <= 0:
             raise SchedulingError("Schedule parameter 'generating_time' must be a positive number")
 
         if 'interval' not in schedule:
@@ -59,104 +56,74 @@ class BatchScheduler(BaseScheduler):
 
         if schedule['interval'] in ['annually', 'monthly'] and 'day' not in schedule['detail']:
             raise SchedulingError("Interval {} requires 'day' parameter in detail field".format(schedule['interval']))
-        elif schedule['interval'] in ['annually', 'monthly'] and (not isinstance(schedule['detail']['day'], int) or (schedule['detail']['day'] < 0 or schedule['detail']['day'] > 31)):
+        elif schedule['interval'] in ['annually', 'monthly'] and (not isinstance(schedule['detail']['day'], int) or (schedule['detail']['day'] < 1 or schedule['detail']['day'] > 31)):
             raise SchedulingError("Value {} not valid for parameter 'day'".format(schedule['detail']['day']))
 
         if schedule['interval'] in ['annually'] and 'month' not in schedule['detail']:
             raise SchedulingError("Interval {} requires 'month' parameter in detail field".format(schedule['interval']))
-        elif schedule['interval'] in ['annually'] and (not isinstance(schedule['detail']['month'], int) or (schedule['detail']['month'] < 0 or schedule['detail']['month'] > 12)):
+        elif schedule['interval'] in ['annually'] and (not isinstance(schedule['detail']['month'], int) or (schedule['detail']['month'] < 1 or schedule['detail']['month'] > 12)):
             raise SchedulingError("Value {} not valid for parameter 'month'".format(schedule['detail']['month']))
+        if schedule['interval'] in ['annually']:
+            try:
+                datetime.date(2000, schedule['detail']['month'], schedule['detail']['day'])
+            except ValueError:
+                raise SchedulingError("Day {} does not exist in month {}".format(schedule['detail']['day'], schedule['detail']['month']))
 
-    def __process_once(self):
-        if 'valid_from' in self.schedule:
-            valid_from = datetime.datetime.strptime(self.schedule['valid_from'], '%Y-%m-%d %H:%M:%S')
-            now = datetime.datetime.now()
-            if valid_from > now:
-                time.sleep(int((valid_from - now).seconds))
-
-        self.generator.generate(self.schedule['generating_time'])
-
-    def __process_interval(self):
-        # sleep process to 'valid_from' time
-        now = datetime.datetime.now()
-        valid_from = datetime.datetime.strptime(self.schedule['valid_from'], '%Y-%m-%d %H:%M:%S')
-        valid_to = datetime.datetime.strptime(self.schedule['valid_to'], '%Y-%m-%d %H:%M:%S')
-        if valid_from > now:
-            time.sleep(int((valid_from - now).seconds))
-
-        # TODO: calculate next run
-        while now < valid_to:
-
-            now = datetime.datetime.now()
+    def get_next_run(self, now):
+        """
+        Time of the next execution strictly after now (or at 'valid_from'), None when the schedule is over
+        """
+        interval = self.schedule['interval']
+        detail = self.schedule.get('detail', {})
+        if self.valid_from is not None and now < self.valid_from:
+            now = self.valid_from - datetime.timedelta(microseconds=1)
+
+        if interval == 'once':
+            if self.last_run is not None:
+                return None
+            next_run = max(now, self.valid_from) if self.valid_from is not None else now
+        elif interval == 'per_minute':
+            next_run = now.replace(second=0, microsecond=0) + datetime.timedelta(0, 60)
+        elif interval == 'hourly':
+            next_run = now.replace(minute=detail['minute'], second=0, microsecond=0)
+            if next_run <= now:
+                next_run += datetime.timedelta(0, 3600)
+        elif interval == 'daily':
+            next_run = now.replace(hour=detail['hour'], minute=detail['minute'], second=0, microsecond=0)
+            if next_run <= now:
+                next_run += datetime.timedelta(1)
+        elif interval == 'monthly':
+            # months without the configured day are skipped
             next_run = None
-            if self.schedule['interval'] == 'per_minute':
-                next_run = now + datetime.timedelta(0, 60)
-                next_run = next_run.replace(second=0)
-
-            elif self.schedule['interval'] == 'hourly':
-                if self.schedule['detail']['minute'] < now.minute:
-                    next_run = datetime.datetime.now()
-                    next_run = next_run.replace(minute=self.schedule['detail']['minute'], second=0)
-                else:
-                    next_run = now + datetime.timedelta(0, 3600)
-                    next_run = next_run.replace(minute=self.schedule['detail']['minute'], second=0)
-            elif self.schedule['interval'] == 'daily':
-                if (self.schedule['detail']['hour'] < now.hour) or (self.schedule['detail']['hour'] == now.hour and self.schedule['detail']['minute'] < now.minute):
-                    next_run = datetime.datetime.now()
-                    next_run = next_run.replace(hour=self.schedule['detail']['hour'], minute=self.schedule['detail']['minute'], second=0)
-                else:
-                    next_run = now + datetime.timedelta(1)
-                    next_run = next_run.replace(hour=self.schedule['detail']['hour'], minute=self.schedule['detail']['minute'], second=0)
-
-            elif self.schedule['interval'] == 'monthly':
-                if (self.schedule['detail']['day'] < now.day) \
-                        or (self.schedule['detail']['day'] == now.day and self.schedule['detail']['hour'] < now.hour)\
-                        or (self.schedule['detail']['day'] == now.day and self.schedule['detail']['hour'] == now.hour and self.schedule['detail']['minute'] < now.minute):
-                    next_run = datetime.datetime.now()
-                    next_run = next_run.replace(day=self.schedule['detail']['day'], hour=self.schedule['detail']['hour'], minute=self.schedule['detail']['minute'], second=0)
-                else:
-                    next_run = datetime.datetime.now()
-                    if now.month == 12:
-                        next_run = next_run.replace(year=now.year+1, month=1, day=self.schedule['detail']['day'],
-                                                    hour=self.schedule['detail']['hour'], minute=self.schedule['detail']['minute'],
-                                                    second=0)
-                    else:
-                        next_run = next_run.replace(month=now.month+1, day=self.schedule['detail']['day'],
-                                                    hour=self.schedule['detail']['hour'],
-                                                    minute=self.schedule['detail']['minute'], second=0)
-            elif self.schedule['interval'] == 'annually':
-                if (self.schedule['detail']['month'] < now.month) \
-                        or (self.schedule['detail']['month'] == now.month and self.schedule['detail']['day'] < now.day) \
-                        or (self.schedule['detail']['month'] == now.month and self.schedule['detail']['day'] == now.day and self.schedule['detail']['hour'] < now.hour) \
-                        or (self.schedule['detail']['month'] == now.month and self.schedule['detail']['day'] == now.day and self.schedule['detail']['hour'] == now.hour and self.schedule['detail']['minute'] < now.minute):
-                    next_run = datetime.datetime.now()
-                    next_run = next_run.replace(month=self.schedule['detail']['month'],
-                                                day=self.schedule['detail']['day'],
-                                                hour=self.schedule['detail']['hour'],
-                                                minute=self.schedule['detail']['minute'],
-                                                second=0)
-                else:
-                    next_run = datetime.datetime.now()
-                    next_run = next_run.replace(year=next_run.year,
-                                                month=self.schedule['detail']['month'],
-                                                day=self.schedule['detail']['day'],
-                                                hour=self.schedule['detail']['hour'],
-                                                minute=self.schedule['detail']['minute'],
-                                                second=0)
-
-            if next_run >= valid_to:
-                break
-            time.sleep(int((next_run - now).seconds))
-            self.generator.generate(self.schedule['generating_time'])
-
-    def run(self):
-        if self.schedule['interval'] == 'once':
-            self.__process_once()
-            self.stop()
-            return
-        else:
-            self.__process_interval()
-
+            year, month = now.year, now.month
+            while next_run is None:
+                try:
+                    candidate = datetime.datetime(year, month, detail['day'], detail['hour'], detail['minute'])
+                    if candidate > now:
+                        next_run = candidate
+                except ValueError:
+                    pass
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        else:  # annually
+            # years without the configured day (29th of February) are skipped
+            next_run = None
+            year = now.year
+            while next_run is None:
+                try:
+                    candidate = datetime.datetime(year, detail['month'], detail['day'], detail['hour'], detail['minute'])
+                    if candidate > now:
+                        next_run = candidate
+                except ValueError:
+                    pass
+                year += 1
+
+        if self.valid_to is not None and next_run >= self.valid_to:
+            return None
+        return next_run
+
+    def execute(self):
+        self.last_run = datetime.datetime.now()
+        return self.get_generator().generate(self.schedule['generating_time'])
 
     def terminate(self):
         print('Terminate batch schedule {}'.format(self.scheduler_id))
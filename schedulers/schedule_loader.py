@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import sqlite3
+import functools
+import threading
+
+from generators.base_generator import BaseGenerator
+from schedulers.batch_scheduler import BatchScheduler
+from schedulers.stream_scheduler import StreamScheduler
+from errors import *
+
+# scheduler class of every schedule type
+SCHEDULER_TYPES = {'batch': BatchScheduler, 'stream': StreamScheduler}
+
+# edit time of the rows, their creation time until they are edited
+SCHEDULE_TIME = 'COALESCE(edited_date, created_date)'
+GENERATOR_TIME = 'COALESCE(edited_time, created_time)'
+SCHEDULE_COLUMNS = 'id, generator_id, status, ' + SCHEDULE_TIME
+GENERATOR_COLUMNS = 'id, ' + GENERATOR_TIME
+
+# maximum number of ids per 'IN (...)' query, below the SQLite limit of query parameters
+MAX_QUERY_IDS = 500
+
+
+def build_base_generator(generator_id, edited_time, config, pool_directory=None, unique_directory=None):
+    # the task id of a generator is the same for all its schedules and versions, so that the values of its unique
+    # fields stay unique across reloads and restarts
+    return BaseGenerator(task_id='generator-{}'.format(generator_id), job_config=config, generator_id=generator_id,
+                         edited_time=edited_time, pool_directory=pool_directory, unique_directory=unique_directory)
+
+
+class ScheduleLoader:
+    """
+    Keep the schedules of a SchedulerHost in sync with the 'schedulers' and 'generators' tables of a SQLite database,
+    so that the schedules edited in the web app are applied without restarting the host
+    Every poll reads the status and edited times of the schedules and of their generators, and applies the difference
+    with the previous poll:
+        new schedule: added to the host
+        deleted schedule: removed from the host, its generator is flushed once its run in progress is over
+        status changed only: started or stopped in place
+        schedule config changed: replaced by its new version, keeping its generator
+        generator changed: replaced by its new version, with a new generator
+    The other schedules are not touched and their runs in progress go on. The config of a schedule is read and
+    validated when it is applied, the config of its generator only when the schedule is first due (see
+    BaseScheduler.get_generator()), so that loading thousands of schedules does not build thousands of generators
+    An edit must update 'edited_date' of the schedule or 'edited_time' of the generator ('YYYY-MM-DD HH24:MI:SS'
+    times): a poll only reads the rows edited since the previous one, and all of them when rows were deleted
+        host: the SchedulerHost running the schedules
+        database: SQLite database of the web app
+        poll_interval: number of seconds between two polls of the tables
+        build_generator: function building the generator of a schedule from the generator id, its edited time and its
+            config (JSON text), a BaseGenerator if not set (see build_base_generator())
+        pool_directory, unique_directory: directories of the files of the entity pools and of the unique fields of the
+            BaseGenerators built when build_generator is not set (see BaseGenerator), None to keep them in memory
+    """
+
+    def __init__(self, host, database, poll_interval=10, build_generator=None, pool_directory=None, unique_directory=None):
+        if not isinstance(poll_interval, (int, float)) or poll_interval <= 0:
+            raise SchedulingError("Parameter 'poll_interval' must be a positive number")
+        if build_generator is None:
+            build_generator = functools.partial(build_base_generator, pool_directory=pool_directory, unique_directory=unique_directory)
+        elif pool_directory is not None or unique_directory is not None:
+            raise SchedulingError("Parameters 'pool_directory' and 'unique_directory' are only used without 'build_generator'")
+        self.host = host
+        self.database = database
+        self.poll_interval = poll_interval
+        self.build_generator = build_generator
+        # scheduler id -> (generator id, status, edited date, generator edited time) as of the previous poll
+        self.versions = {}
+        # generator id -> edited time as of the previous poll
+        self.generator_times = {}
+        # latest edited times read
+        self.schedules_since = ''
+        self.generators_since = ''
+        # scheduler id -> config of the hosted version of the schedule
+        self.configs = {}
+        self.stats = {'polls': 0, 'unchanged_polls': 0, 'added': 0, 'removed': 0, 'reloaded': 0, 'started': 0,
+                      'stopped': 0, 'failed': 0, 'poll_seconds': 0.0}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def poll(self):
+        """
+        Apply the changes made to the tables since the previous poll, return the number of schedules added, removed,
+        reloaded, started, stopped and failed to load
+        """
+        with self.lock:
+            start = time.perf_counter()
+            changes = {'added': 0, 'removed': 0, 'reloaded': 0, 'started': 0, 'stopped': 0, 'failed': 0}
+            connection = sqlite3.connect(self.database)
+            try:
+                generator_times, edited_generators, generators_since = self.__read_generators(connection)
+                versions, full, schedules_since = self.__read_schedules(connection, generator_times, edited_generators)
+                changed = [scheduler_id for scheduler_id, version in versions.items() if self.versions.get(scheduler_id) != version]
+                # the deleted schedules are only known after reading all of them
+                removed = [scheduler_id for scheduler_id in self.versions if scheduler_id not in versions] if full else []
+                configs = self.__read_configs(connection, changed)
+            finally:
+                connection.close()
+
+            self.generator_times = generator_times
+            self.generators_since = generators_since
+            self.schedules_since = schedules_since
+            for scheduler_id in removed:
+                self.versions.pop(scheduler_id)
+                self.configs.pop(scheduler_id, None)
+                if self.host.remove(scheduler_id) is not None:
+                    changes['removed'] += 1
+            for scheduler_id in changed:
+                # a schedule deleted after its version was read is removed by the next poll
+                change = self.__apply(scheduler_id, versions[scheduler_id], configs[scheduler_id]) if scheduler_id in configs else None
+                if change is not None:
+                    changes[change] += 1
+
+            self.stats['polls'] += 1
+            if not changed and not removed:
+                self.stats['unchanged_polls'] += 1
+            self.stats['poll_seconds'] += time.perf_counter() - start
+            for change, count in changes.items():
+                self.stats[change] += count
+            return changes
+
+    def __read_generators(self, connection):
+        """
+        Edit time of every generator, the generators edited or deleted since the previous poll and the latest edit
+        time read. The generators edited at the time of the latest edit already read are read again, an edit made
+        within the same second would be missed otherwise, and the ones without any time are read on every poll. They
+        are all read when some were deleted
+        """
+        count, = connection.execute('SELECT COUNT(*) FROM generators').fetchone()
+        rows = connection.execute('SELECT {0} FROM generators WHERE {1} >= ? OR {1} IS NULL'.format(GENERATOR_COLUMNS, GENERATOR_TIME),
+                                  (self.generators_since,)).fetchall()
+        generator_times = dict(self.generator_times)
+        generator_times.update(rows)
+        if len(generator_times) != count:
+            # deleted generators
+            rows = connection.execute('SELECT {} FROM generators'.format(GENERATOR_COLUMNS)).fetchall()
+            generator_times = dict(rows)
+        since = max([self.generators_since] + [edited_time for generator_id, edited_time in rows if edited_time is not None])
+        edited_generators = {generator_id for generator_id in self.generator_times.keys() | generator_times.keys()
+                             if self.generator_times.get(generator_id) != generator_times.get(generator_id)}
+        return generator_times, edited_generators, since
+
+    def __read_schedules(self, connection, generator_times, edited_generators):
+        """
+        Version of the schedules edited since the previous poll or whose generator was, as for the generators. Return
+        the versions, whether all the schedules were read and the latest edit time read
+        """
+        count, = connection.execute('SELECT COUNT(*) FROM schedulers').fetchone()
+        rows = connection.execute('SELECT {0} FROM schedulers WHERE {1} >= ? OR {1} IS NULL'.format(SCHEDULE_COLUMNS, SCHEDULE_TIME),
+                                  (self.schedules_since,)).fetchall()
+        added = sum(1 for row in rows if row[0] not in self.versions)
+        full = len(self.versions) + added != count
+        if full:
+            # deleted schedules
+            rows = connection.execute('SELECT {} FROM schedulers'.format(SCHEDULE_COLUMNS)).fetchall()
+        since = max([self.schedules_since] + [row[3] for row in rows if row[3] is not None])
+        versions = {scheduler_id: (generator_id, status, edited_date, generator_times.get(generator_id))
+                    for scheduler_id, generator_id, status, edited_date in rows}
+        if edited_generators:
+            for scheduler_id, (generator_id, status, edited_date, generator_time) in self.versions.items():
+                if generator_id in edited_generators and scheduler_id not in versions:
+                    versions[scheduler_id] = (generator_id, status, edited_date, generator_times.get(generator_id))
+        return versions, full, since
+
+    def __read_configs(self, connection, scheduler_ids):
+        configs = {}
+        for index in range(0, len(scheduler_ids), MAX_QUERY_IDS):
+            chunk = scheduler_ids[index:index + MAX_QUERY_IDS]
+            configs.update(connection.execute('SELECT id, config FROM schedulers WHERE id IN ({})'.format(', '.join('?' * len(chunk))), chunk))
+        return configs
+
+    def __apply(self, scheduler_id, version, config):
+        # apply a new version of a schedule, return the kind of change applied, None if the schedule is unchanged
+        generator_id, status, edited_date, generator_edited_time = version
+        previous = self.versions.get(scheduler_id)
+        # the version is recorded even if it fails to load, it is tried again once edited
+        self.versions[scheduler_id] = version
+        hosted = self.host.schedulers.get(scheduler_id)
+        same_generator = hosted is not None and previous is not None and previous[0] == generator_id and previous[3] == generator_edited_time
+        if same_generator and config == self.configs.get(scheduler_id):
+            if status == previous[1]:
+                # edit of the other columns (name...)
+                return None
+            if status == 'Active':
+                self.host.start_schedule(scheduler_id)
+                return 'started'
+            self.host.stop_schedule(scheduler_id)
+            return 'stopped'
+
+        try:
+            if generator_edited_time is None:
+                raise SchedulingError("Generator {} not found".format(generator_id))
+            schedule = json.loads(config)
+            if not isinstance(schedule, dict):
+                raise SchedulingError("Schedule config must be a JSON object")
+            schedule['status'] = status
+            if schedule.get('type') not in SCHEDULER_TYPES:
+                raise SchedulingError("Schedule type {} not supported".format(schedule.get('type')))
+            if same_generator:
+                scheduler = SCHEDULER_TYPES[schedule['type']](scheduler_id, schedule, hosted.generator, hosted.load_generator)
+            else:
+                scheduler = SCHEDULER_TYPES[schedule['type']](scheduler_id, schedule, load_generator=self.__get_generator_loader(generator_id))
+        except (SchedulingError, ValueError) as e:
+            print('Schedule {} failed to load: {}'.format(scheduler_id, e))
+            self.configs.pop(scheduler_id, None)
+            if hosted is not None:
+                self.host.remove(scheduler_id)
+            return 'failed'
+
+        self.configs[scheduler_id] = config
+        if hosted is None:
+            self.host.add(scheduler)
+            return 'added'
+        # the generator of the previous version is flushed unless the new version keeps it
+        self.host.reload(scheduler, flush=not same_generator)
+        return 'reloaded'
+
+    def __get_generator_loader(self, generator_id):
+        # function building the generator of a schedule from the current version of its config
+        def load_generator():
+            connection = sqlite3.connect(self.database)
+            try:
+                # the version of the generator as read by the polls, its key in the config cache
+                row = connection.execute('SELECT config, {} FROM generators WHERE id = ?'.format(GENERATOR_TIME), (generator_id,)).fetchone()
+            finally:
+                connection.close()
+            if row is None:
+                raise SchedulingError("Generator {} not found".format(generator_id))
+            return self.build_generator(generator_id, row[1], row[0])
+        return load_generator
+
+    def __loop(self):
+        while not self.stopping.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print('Schedules failed to reload: {}'.format(e))
+
+    def start(self):
+        """
+        Load the schedules, then poll the tables in a background thread
+        """
+        if self.thread is not None:
+            raise SchedulingError("Schedule loader is already started")
+        self.poll()
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.__loop, name='schedule-loader', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats['schedules'] = len(self.configs)
+        return stats
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import datetime
+import itertools
+import threading
+import concurrent.futures
+
+from errors import *
+
+
+class SchedulerHost:
+    """
+    Run many schedules in one process, instead of one process per schedule
+    Active schedules are kept in a priority queue keyed by their next run time, a single thread sleeps until the
+    earliest one is due and dispatches its generating job to a bounded worker pool. A schedule is queued again once its
+    job is over, so the runs of one schedule never overlap.
+    Schedules can be added, removed or reloaded while the host is running, without affecting the other schedules. A
+    run in progress is never interrupted: a new version of a schedule due while the run of its previous version is in
+    progress waits for that run to be over
+        max_workers: size of the worker pool, i.e. maximum number of generating jobs executed at the same time
+        max_sleep: maximum number of seconds the host sleeps before checking the clock again
+    """
+
+    def __init__(self, max_workers=4, max_sleep=60):
+        self.max_workers = max_workers
+        self.max_sleep = max_sleep
+        self.schedulers = {}
+        # heap of (next run, sequence, scheduler id, version), entries of a previous version of a schedule are stale
+        self.queue = []
+        self.versions = {}
+        self.running = {}
+        # scheduler id -> (planned run, version) of the schedules due while a run of a previous version is in progress
+        self.deferred = {}
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.executor = None
+        self.thread = None
+        self.stopping = False
+
+    def add(self, scheduler):
+        with self.condition:
+            if scheduler.scheduler_id in self.schedulers:
+                raise SchedulingError("Schedule {} is already hosted".format(scheduler.scheduler_id))
+            self.schedulers[scheduler.scheduler_id] = scheduler
+            self.versions[scheduler.scheduler_id] = next(self.sequence)
+            if scheduler.schedule['status'] == 'Active':
+                self.__enqueue(scheduler.scheduler_id, datetime.datetime.now())
+
+    def remove(self, scheduler_id, flush=True):
+        """
+        Stop a schedule. A run in progress is not interrupted, the schedule is just not executed anymore
+            flush: flush the generator of the schedule, once its run in progress is over
+        """
+        with self.condition:
+            scheduler = self.schedulers.pop(scheduler_id, None)
+            self.versions.pop(scheduler_id, None)
+            running = self.running.get(scheduler_id)
+            self.condition.notify()
+        if scheduler is not None and flush:
+            if running is not None:
+                running.add_done_callback(lambda future: self.__flush(scheduler))
+            else:
+                self.__flush(scheduler)
+        return scheduler
+
+    def reload(self, scheduler, flush=False):
+        """
+        Replace a schedule by a new version of it, the new version is scheduled from now
+            flush: flush the generator of the previous version, when the new version does not keep it
+        """
+        with self.condition:
+            self.remove(scheduler.scheduler_id, flush=flush)
+            self.add(scheduler)
+
+    def __flush(self, scheduler):
+        try:
+            scheduler.flush()
+        except Exception as e:
+            print('Schedule {} failed to flush: {}'.format(scheduler.scheduler_id, e))
+
+    def start_schedule(self, scheduler_id):
+        with self.condition:
+            scheduler = self.schedulers[scheduler_id]
+            scheduler.schedule['status'] = 'Active'
+            self.reload(scheduler)
+
+    def stop_schedule(self, scheduler_id):
+        with self.condition:
+            scheduler = self.schedulers[scheduler_id]
+            scheduler.schedule['status'] = 'Inactive'
+            self.reload(scheduler)
+
+    def __enqueue(self, scheduler_id, now):
+        # must be called with the condition held
+        next_run = self.schedulers[scheduler_id].get_next_run(now)
+        if next_run is not None:
+            heapq.heappush(self.queue, (next_run, next(self.sequence), scheduler_id, self.versions[scheduler_id]))
+            self.condition.notify()
+
+    def __is_stale(self, entry):
+        next_run, sequence, scheduler_id, version = entry
+        return self.versions.get(scheduler_id) != version
+
+    def __execute(self, scheduler, version, planned_run):
+        try:
+            scheduler.tick(planned_run)
+        except Exception as e:
+            print('Schedule {} failed: {}'.format(scheduler.scheduler_id, e))
+        finally:
+            with self.condition:
+                scheduler_id = scheduler.scheduler_id
+                self.running.pop(scheduler_id, None)
+                deferred = self.deferred.pop(scheduler_id, None)
+                if deferred is not None and self.versions.get(scheduler_id) == deferred[1] and not self.stopping:
+                    self.__submit(scheduler_id, *deferred)
+                elif self.versions.get(scheduler_id) == version and not self.stopping:
+                    # runs missed while the job was executing are skipped
+                    self.__enqueue(scheduler_id, max(planned_run, datetime.datetime.now()))
+
+    def __submit(self, scheduler_id, planned_run, version):
+        # must be called with the condition held
+        if scheduler_id in self.running:
+            # a previous version of the schedule is still running, the new one runs once it is over
+            self.deferred[scheduler_id] = (planned_run, version)
+            return
+        self.running[scheduler_id] = self.executor.submit(self.__execute, self.schedulers[scheduler_id], version, planned_run)
+
+    def __loop(self):
+        with self.condition:
+            while not self.stopping:
+                while self.queue and self.__is_stale(self.queue[0]):
+                    heapq.heappop(self.queue)
+                if not self.queue:
+                    self.condition.wait(self.max_sleep)
+                    continue
+                next_run, sequence, scheduler_id, version = self.queue[0]
+                delay = (next_run - datetime.datetime.now()).total_seconds()
+                if delay > 0:
+                    self.condition.wait(min(delay, self.max_sleep))
+                    continue
+                heapq.heappop(self.queue)
+                self.__submit(scheduler_id, next_run, version)
+
+    def start(self):
+        with self.condition:
+            if self.thread is not None:
+                raise SchedulingError("Scheduler host is already started")
+            self.stopping = False
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+            self.thread = threading.Thread(target=self.__loop, name='scheduler-host', daemon=True)
+            self.thread.start()
+
+    def stop(self, wait=True):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
+        if wait:
+            for scheduler in list(self.schedulers.values()):
+                self.__flush(scheduler)
+
+    def get_next_runs(self):
+        # next run time of every queued schedule
+        with self.condition:
+            return {entry[2]: entry[0] for entry in sorted(self.queue) if not self.__is_stale(entry)}
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+import time
+import datetime
+
+from schedulers.base_scheduler import BaseScheduler
+from errors import *
+
+
+class TokenBucket:
+    """
+    Token bucket pacer: tokens are earned at the target rate and spent by the emitted records
+    The bucket can go in debt when a batch emits more records than the available tokens, the debt is paid back before
+    the next batch. Tokens are capped to 'capacity' so that a pause is not followed by a burst
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.tokens = 0.0
+        self.updated_at = None
+
+    def refill(self, rate):
+        monotonic_now = time.monotonic()
+        if self.updated_at is not None:
+            self.tokens = min(self.capacity, self.tokens + rate * (monotonic_now - self.updated_at))
+        self.updated_at = monotonic_now
+        return self.tokens
+
+    def consume(self, tokens):
+        self.tokens -= tokens
+
+
+class StreamScheduler(BaseScheduler):
+    """
+    Emit records continuously at a target rate instead of in bursts
+    """
+
+    def __init__(self, scheduler_id=None, schedule={}, generator=None, load_generator=None):
+        """
+        Needed parameters for stream scheduler:
+            type: stream
+            status: 'Active', 'Inactive'
+            rate: target number of records per second
+            'ramp_up': number of seconds to ramp up linearly from 0 to the target rate, or not needed
+            'diurnal': list of 24 rate multipliers, one per hour of the day (linearly interpolated), or not needed
+            'batch_interval': number of seconds between two emissions, 0.1 if not set. Records are emitted in batches
+                so that the overhead per record stays low at high rates
+            'burst': maximum number of seconds of tokens that can be saved up, 1 if not set
+            'valid_from': time in 'YYYY-MM-DD HH24:MI:SS' format or not needed
+            'valid_to': time in 'YYYY-MM-DD HH24:MI:SS' format or not needed
+        """
+        super().__init__(scheduler_id, schedule, generator, load_generator)
+
+        if schedule['type'] != 'stream':
+            raise SchedulingError('Stream scheduling only!')
+        if 'rate' not in schedule:
+            raise SchedulingError("Schedule parameter 'rate' not found")
+        elif not isinstance(schedule['rate'], (int, float)) or schedule['rate'] <= 0:
+            raise SchedulingError("Schedule parameter 'rate' must be a positive number")
+        for parameter in ['ramp_up', 'batch_interval', 'burst']:
+            if parameter in schedule and (not isinstance(schedule[parameter], (int, float)) or schedule[parameter] < 0):
+                raise SchedulingError("Schedule parameter '{}' must be a positive number".format(parameter))
+        if schedule.get('batch_interval', 0.1) <= 0:
+            raise SchedulingError("Schedule parameter 'batch_interval' must be a positive number")
+        if 'diurnal' in schedule and (not isinstance(schedule['diurnal'], list) or len(schedule['diurnal']) != 24
+                                      or any(not isinstance(multiplier, (int, float)) or multiplier < 0 for multiplier in schedule['diurnal'])):
+            raise SchedulingError("Schedule parameter 'diurnal' must be a list of 24 positive numbers")
+
+        self.rate = schedule['rate']
+        self.ramp_up = schedule.get('ramp_up', 0)
+        self.diurnal = schedule.get('diurnal')
+        self.batch_interval = schedule.get('batch_interval', 0.1)
+        self.bucket = TokenBucket(max(1, self.rate * schedule.get('burst', 1)))
+
+        # expected number of records per generating iteration, corrected by the observed one
+        self.records_per_iteration = self.get_expected_records(generator) if generator is not None else None
+
+        self.started_at = None
+        self.emitted_records = 0
+
+    def get_expected_records(self, generator):
+        # expected number of records per generating iteration of a generator
+        expected = sum(min(1, object_config['__probability']) for object_config in generator.validated_job_config['objects'])
+        return expected if expected > 0 else 1
+
+    def get_target_rate(self, now=None):
+        if now is None:
+            now = datetime.datetime.now()
+        rate = self.rate
+        if self.diurnal is not None:
+            hour = now.hour + (now.minute * 60 + now.second) / 3600
+            multiplier = self.diurnal[int(hour)] + (self.diurnal[(int(hour) + 1) % 24] - self.diurnal[int(hour)]) * (hour - int(hour))
+            rate *= multiplier
+        if self.ramp_up > 0 and self.started_at is not None:
+            elapsed = time.monotonic() - self.started_at
+            if elapsed < self.ramp_up:
+                rate *= elapsed / self.ramp_up
+        return rate
+
+    def get_next_run(self, now):
+        if self.valid_from is not None and now < self.valid_from:
+            return self.valid_from
+        next_run = now + datetime.timedelta(0, self.batch_interval)
+        rate = self.get_target_rate(now)
+        if self.bucket.tokens < 0 and rate > 0:
+            # pay the debt of the previous batch back first
+            next_run = max(next_run, now + datetime.timedelta(0, -self.bucket.tokens / rate))
+        if self.valid_to is not None and next_run >= self.valid_to:
+            return None
+        return next_run
+
+    def execute(self):
+        monotonic_now = time.monotonic()
+        if self.started_at is None:
+            self.started_at = monotonic_now
+        self.last_run = datetime.datetime.now()
+        tokens = self.bucket.refill(self.get_target_rate(self.last_run))
+        if tokens < 1:
+            return 0
+
+        generator = self.get_generator()
+        if self.records_per_iteration is None:
+            self.records_per_iteration = self.get_expected_records(generator)
+        iterations = max(1, int(tokens / self.records_per_iteration))
+        generated = generator.generate(iterations)
+        # file generators return the number of written records, the other ones the records
+        records = generated if isinstance(generated, int) else len(generated)
+        self.bucket.consume(records)
+        self.records_per_iteration = 0.9 * self.records_per_iteration + 0.1 * max(records / iterations, 0.001)
+
+        self.emitted_records += records
+        return records
+
+    def get_stats(self):
+        """
+        Achieved rate versus target rate, in records per second
+        """
+        elapsed = time.monotonic() - self.started_at if self.started_at is not None else 0
+        return {
+            'target_rate': self.get_target_rate(),
+            'achieved_rate': self.emitted_records / elapsed if elapsed > 0 else 0,
+            'emitted_records': self.emitted_records,
+            'elapsed': elapsed,
+        }
+
+    def terminate(self):
+        print('Terminate stream schedule {}'.format(self.scheduler_id))
@@ -3,7 +3,7 @@ import time
 import json
 
 import generators.base_generator as base_generator
-from generators.generator_errors import *
+from errors import *
 
 def job(number=0):
     print("I'm working...", number)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from errors import ConfigurationError
+from generators.base_generator import BaseGenerator
+from generators.delay_queue import DelayQueue
+
+
+class Clock:
+    # settable clock of the delay queues
+
+    def __init__(self, now=0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_records_released_in_due_time_order():
+    clock = Clock()
+    queue = DelayQueue(clock=clock)
+    for delay, record in [(30, 'c'), (10, 'a'), (20, 'b1'), (20, 'b2'), (40, 'd')]:
+        queue.push(delay, record)
+    assert queue.pop_due() == []
+    clock.now = 20
+    # records due at the same time are released in arrival order
+    assert queue.pop_due() == ['a', 'b1', 'b2']
+    assert len(queue) == 2
+    assert queue.flush() == ['c', 'd']
+    assert len(queue) == 0
+
+
+def test_overflow_policies():
+    queue = DelayQueue(max_size=2, overflow='release', clock=Clock())
+    assert queue.push(20, 'b') is None
+    assert queue.push(10, 'a') is None
+    # the record due the earliest makes room for the new one
+    assert queue.push(30, 'c') == 'a'
+    assert queue.push(5, 'first') == 'first'
+    assert queue.flush() == ['b', 'c']
+
+    queue = DelayQueue(max_size=2, overflow='drop', clock=Clock())
+    for delay, record in [(20, 'b'), (10, 'a'), (5, 'c')]:
+        assert queue.push(delay, record) is None
+    assert queue.dropped_count == 1
+    assert queue.flush() == ['a', 'b']
+
+
+@pytest.mark.parametrize('max_size, overflow', [(0, 'release'), (10, 'wait')])
+def test_invalid_parameters(max_size, overflow):
+    with pytest.raises(ConfigurationError):
+        DelayQueue(max_size, overflow)
+
+
+JOB_CONFIG = {
+    'variables': {'iteration': {'type': 'numeric', 'lower-bound': 0, 'upper-bound': 1000000, 'unique': 'permutation'}},
+    'objects': [
+        {'iteration': {'type': 'variable', 'id': 'iteration'}, 'kind': 'order'},
+        {'__delay': {'probability': 1, 'delay_time': 'MINUTE+5'}, 'iteration': {'type': 'variable', 'id': 'iteration'}, 'kind': 'payment'},
+    ]
+}
+
+
+@pytest.mark.parametrize('vectorized', [False, True])
+def test_delayed_objects_exported_first_once_due(vectorized):
+    clock = Clock(1000)
+    generator = BaseGenerator(job_config=JOB_CONFIG, seed=1, vectorized=vectorized)
+    generator.delay_queue.clock = clock
+    first = generator.generate(5)
+    assert [item['kind'] for item in first] == ['order'] * 5
+
+    clock.now += 299
+    second = generator.generate(3)
+    assert [item['kind'] for item in second] == ['order'] * 3
+
+    clock.now += 1
+    third = generator.generate(2)
+    # the payments of the first call are due, they come first and in generation order
+    assert [item['kind'] for item in third] == ['payment'] * 5 + ['order'] * 2
+    assert [item['iteration'] for item in third[:5]] == [item['iteration'] for item in first]
+
+    # the payments of the later calls are not due yet
+    remaining = generator.flush()
+    assert [item['iteration'] for item in remaining] == [item['iteration'] for item in second + third[5:]]
+    assert generator.flush() == []
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import statistics
+import tracemalloc
+
+import pytest
+
+from errors import ExporterError
+from generators.base_generator import BaseGenerator
+from generators.time_anchor import TimeAnchor
+
+TIME_ANCHOR = '2024-01-01 00:00:00'
+
+
+def generate_values(config, vectorized, generate_time=20000):
+    generator = BaseGenerator(task_id='distributions', job_config={'objects': [{'value': config}]}, seed=7, time_anchor=TIME_ANCHOR,
+                              vectorized=vectorized)
+    return [item['value'] for item in generator.generate(generate_time)]
+
+
+@pytest.mark.parametrize('vectorized', [False, True])
+@pytest.mark.parametrize('config, mean', [
+    ({'type': 'numeric', 'lower-bound': 1000, 'upper-bound': 2000, 'distribution': 'normal', 'mean': 1200, 'stddev': 50}, 1200),
+    ({'type': 'float', 'lower-bound': -10.0, 'upper-bound': 10.0, 'distribution': 'normal', 'mean': -5.0, 'stddev': 1.0}, -5.0),
+    ({'type': 'numeric', 'lower-bound': 1000, 'upper-bound': 2000, 'distribution': 'normal'}, 1500),
+    ({'type': 'numeric', 'lower-bound': 1000, 'upper-bound': 2000, 'distribution': 'poisson', 'lambda': 1010}, 1010),
+    ({'type': 'numeric', 'lower-bound': -500000, 'upper-bound': 500000, 'distribution': 'poisson', 'lambda': 0}, 0),
+])
+def test_location_is_a_value_of_the_field(config, mean, vectorized):
+    values = generate_values(config, vectorized)
+    assert all(config['lower-bound'] <= value <= config['upper-bound'] for value in values)
+    assert statistics.mean(values) == pytest.approx(mean, abs=(config['upper-bound'] - config['lower-bound']) / 200)
+
+
+@pytest.mark.parametrize('vectorized', [False, True])
+def test_datetime_location_is_a_time(vectorized):
+    config = {'type': 'datetime', 'lower-bound': 'DAY-10', 'upper-bound': 'NOW', 'distribution': 'normal',
+              'mean': 'DAY-2', 'stddev': 3600}
+    values = generate_values(config, vectorized, 5000)
+    anchor = datetime.datetime.strptime(TIME_ANCHOR, '%Y-%m-%d %H:%M:%S')
+    offsets = [(anchor - datetime.datetime.strptime(value, '%Y-%m-%d %H:%M:%S')).total_seconds() for value in values]
+    assert statistics.mean(offsets) == pytest.approx(2 * 86400, abs=600)
+
+    config = {'type': 'datetime', 'lower-bound': 'DAY-1', 'upper-bound': 'NOW', 'distribution': 'poisson', 'lambda': 'HOUR-1'}
+    values = generate_values(config, vectorized, 5000)
+    offsets = [(anchor - datetime.datetime.strptime(value, '%Y-%m-%d %H:%M:%S')).total_seconds() for value in values]
+    assert statistics.mean(offsets) == pytest.approx(3600, abs=10)
+
+
+@pytest.mark.parametrize('config', [
+    {'type': 'numeric', 'lower-bound': 1000, 'upper-bound': 2000, 'distribution': 'normal', 'mean': 500},
+    {'type': 'float', 'lower-bound': 0.0, 'upper-bound': 1.0, 'distribution': 'normal', 'mean': 1.5},
+    {'type': 'numeric', 'lower-bound': 1000, 'upper-bound': 2000, 'distribution': 'poisson', 'lambda': 20},
+    {'type': 'numeric', 'lower-bound': 1000, 'upper-bound': 2000, 'distribution': 'poisson', 'lambda': 1000},
+    {'type': 'numeric', 'lower-bound': 1000, 'upper-bound': 2000, 'distribution': 'poisson'},
+    {'type': 'datetime', 'lower-bound': 'DAY-10', 'upper-bound': 'NOW', 'distribution': 'normal', 'mean': 'DAY+1'},
+    {'type': 'datetime', 'lower-bound': 'DAY-10', 'upper-bound': 'NOW', 'distribution': 'normal', 'mean': 3600},
+    {'type': 'numeric', 'lower-bound': 0, 'upper-bound': 10, 'distribution': 'exponential', 'scale': 0},
+])
+def test_invalid_parameters(config):
+    with pytest.raises(ExporterError):
+        BaseGenerator(job_config={'objects': [{'value': config}]}, time_anchor=TIME_ANCHOR)
+
+
+def test_poisson_samplers_do_not_accumulate():
+    time_anchor = TimeAnchor('2024-01-01 00:30:00')
+    config = {'type': 'datetime', 'lower-bound': 'HOUR-1', 'upper-bound': 'NOW', 'distribution': 'poisson', 'lambda': 'NOW'}
+    generator = BaseGenerator(job_config={'objects': [{'value': config}]}, seed=7, time_anchor=time_anchor)
+    generator.generate(1)
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        for index in range(0, 200):
+            # a refresh one second later moves 'NOW' away from 'HOUR-1'
+            time_anchor.resolved['NOW'] += 1
+            generator.generate(5)
+        growth = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    assert growth < 1000000
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import threading
+
+from instrumentation import Timer, CountingTemplate
+
+
+def test_timer_adds_from_several_threads():
+    timer = Timer()
+    template = CountingTemplate([None, 'constant'], timer)
+
+    def add():
+        for index in range(0, 20000):
+            timer.add(0.5, 2)
+            template.copy()
+
+    # switch threads as often as possible, between the reads and the writes of the counters
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(0.000001)
+    try:
+        threads = [threading.Thread(target=add) for index in range(0, 8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    assert timer.count == 8 * 20000 * 3
+    assert timer.seconds == 8 * 20000 * 0.5
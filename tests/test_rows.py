@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+
+import pytest
+
+from generators.base_generator import BaseGenerator
+from generators.file_generator import FileGenerator
+
+NESTED_JOB_CONFIG = {
+    'objects': [
+        {
+            'nested': {'type': 'choice', 'values': [{'x': 1, 'y': [2, 3]}, [1, 2], 'text', None]},
+            'id': {'type': 'numeric', 'lower-bound': 0, 'upper-bound': 100},
+            'last': {'type': 'choice', 'values': [[], {}, {'z': {'w': 1}}]},
+        },
+        {
+            '__probability': 0.5,
+            'name': 'line\nbreak, "quoted"',
+            'nested': {'type': 'choice', 'values': [[{'a': 1}, {'b': [1, 2]}]]},
+        },
+    ]
+}
+
+
+@pytest.mark.parametrize('vectorized', [False, True])
+def test_to_json_matches_json_dumps_of_the_objects(vectorized):
+    generator = BaseGenerator(job_config=NESTED_JOB_CONFIG, seed=1, vectorized=vectorized)
+    row_batch = generator.generate_rows(200)
+    assert row_batch.to_json() == [json.dumps(item) for item in row_batch.to_dicts()]
+
+
+@pytest.mark.parametrize('output_format', ['json', 'ndjson'])
+@pytest.mark.parametrize('vectorized', [False, True])
+def test_written_file_round_trips_nested_values(tmp_path, output_format, vectorized):
+    generator = FileGenerator(job_config=NESTED_JOB_CONFIG, seed=1, vectorized=vectorized, directory=str(tmp_path),
+                              filename='objects', output_format=output_format, batch_size=64)
+    generator.generate(200)
+    with open(os.path.join(str(tmp_path), 'objects.' + output_format)) as fp:
+        if output_format == 'json':
+            items = json.loads(fp.read())
+        else:
+            items = [json.loads(line) for line in fp]
+
+    expected = BaseGenerator(job_config=NESTED_JOB_CONFIG, seed=1, vectorized=vectorized, task_id=generator.task_id)
+    expected_items = [item for batch in expected.iter_generate(200, batch_size=64) for item in batch]
+    assert items == expected_items
+    assert any(isinstance(item.get('nested'), dict) for item in items)
+    assert any(isinstance(item.get('nested'), list) for item in items)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import sqlite3
+
+import pytest
+
+from errors import SchedulingError
+from generators.base_generator import BaseGenerator
+from schedulers.scheduler_host import SchedulerHost
+from schedulers.schedule_loader import ScheduleLoader
+
+UNIQUE_JOB_CONFIG = {'objects': [{'id': {'type': 'numeric', 'lower-bound': 0, 'upper-bound': 999, 'unique': 'bitmap'}}]}
+STREAM_SCHEDULE = {'type': 'stream', 'rate': 100, 'batch_interval': 1}
+
+
+class Tables:
+    # 'generators' and 'schedulers' tables of the web app, in a database of the temporary directory of a test
+
+    def __init__(self, directory):
+        self.database = os.path.join(str(directory), 'app.db')
+        connection = sqlite3.connect(self.database)
+        with connection:
+            connection.execute('CREATE TABLE generators (id TEXT UNIQUE, name TEXT UNIQUE, config TEXT, created_by TEXT, '
+                               'created_time TEXT, edited_by TEXT, edited_time TEXT, PRIMARY KEY(id))')
+            connection.execute('CREATE TABLE schedulers (id TEXT UNIQUE, name TEXT UNIQUE, generator_id TEXT, config TEXT, '
+                               'status TEXT, created_by TEXT, created_date TEXT, edited_by TEXT, edited_date TEXT, PRIMARY KEY(id))')
+        connection.close()
+
+    def execute(self, query, parameters=()):
+        connection = sqlite3.connect(self.database)
+        with connection:
+            connection.execute(query, parameters)
+        connection.close()
+
+    def put_generator(self, generator_id, job_config, edited_time):
+        self.execute('INSERT OR REPLACE INTO generators (id, name, config, edited_time) VALUES (?, ?, ?, ?)',
+                     (generator_id, generator_id, json.dumps(job_config), edited_time))
+
+    def put_schedule(self, scheduler_id, generator_id, schedule, status, edited_date):
+        self.execute('INSERT OR REPLACE INTO schedulers (id, name, generator_id, config, status, edited_date) VALUES (?, ?, ?, ?, ?, ?)',
+                     (scheduler_id, scheduler_id, generator_id, json.dumps(schedule), status, edited_date))
+
+
+@pytest.fixture
+def tables(tmp_path):
+    return Tables(tmp_path)
+
+
+def test_generators_keep_their_task_id_and_unique_values(tables, tmp_path):
+    unique_directory = os.path.join(str(tmp_path), 'unique')
+    tables.put_generator('g1', UNIQUE_JOB_CONFIG, '2024-01-01 00:00:00')
+    tables.put_schedule('s1', 'g1', STREAM_SCHEDULE, 'Inactive', '2024-01-01 00:00:00')
+    host = SchedulerHost()
+    loader = ScheduleLoader(host, tables.database, unique_directory=unique_directory)
+    loader.poll()
+    generator = host.schedulers['s1'].get_generator()
+    assert isinstance(generator, BaseGenerator)
+    assert generator.task_id == 'generator-g1'
+    assert generator.unique_directory == unique_directory
+    values = [item['id'] for item in generator.generate(400)]
+
+    # a new version of the generator goes on with the unique values of the previous one
+    tables.put_generator('g1', UNIQUE_JOB_CONFIG, '2024-01-02 00:00:00')
+    assert loader.poll()['reloaded'] == 1
+    reloaded = host.schedulers['s1'].get_generator()
+    assert reloaded is not generator
+    assert reloaded.task_id == 'generator-g1'
+    values.extend(item['id'] for item in reloaded.generate(400))
+    assert len(set(values)) == 800
+    assert os.path.isfile(os.path.join(unique_directory, 'generator-g1.object_0.id.unique'))
+
+
+def test_edited_unique_field_gets_a_new_state(tables):
+    tables.put_generator('g1', UNIQUE_JOB_CONFIG, '2024-01-01 00:00:00')
+    tables.put_schedule('s1', 'g1', STREAM_SCHEDULE, 'Inactive', '2024-01-01 00:00:00')
+    host = SchedulerHost()
+    loader = ScheduleLoader(host, tables.database)
+    loader.poll()
+    host.schedulers['s1'].get_generator().generate(10)
+
+    job_config = {'objects': [{'id': {'type': 'numeric', 'lower-bound': 5000, 'upper-bound': 5009, 'unique': 'bitmap'}}]}
+    tables.put_generator('g1', job_config, '2024-01-02 00:00:00')
+    loader.poll()
+    values = [item['id'] for item in host.schedulers['s1'].get_generator().generate(10)]
+    assert sorted(values) == list(range(5000, 5010))
+
+
+def test_directories_need_the_default_generators(tables):
+    with pytest.raises(SchedulingError):
+        ScheduleLoader(SchedulerHost(), tables.database, build_generator=lambda *args: None, unique_directory='unique')
+
+
+def poll_changes(loader, **counts):
+    changes = {'added': 0, 'removed': 0, 'reloaded': 0, 'started': 0, 'stopped': 0, 'failed': 0}
+    changes.update(counts)
+    assert loader.poll() == changes
+
+
+def test_polls_apply_the_difference_with_the_previous_poll(tables):
+    tables.put_generator('g1', UNIQUE_JOB_CONFIG, '2024-01-01 00:00:00')
+    tables.put_generator('g2', UNIQUE_JOB_CONFIG, '2024-01-01 00:00:00')
+    tables.put_schedule('s1', 'g1', STREAM_SCHEDULE, 'Active', '2024-01-01 00:00:00')
+    tables.put_schedule('s2', 'g1', STREAM_SCHEDULE, 'Inactive', '2024-01-01 00:00:00')
+    tables.put_schedule('s3', 'g2', STREAM_SCHEDULE, 'Active', '2024-01-01 00:00:00')
+    built = []
+
+    def build_generator(generator_id, edited_time, config):
+        built.append((generator_id, edited_time))
+        return BaseGenerator(job_config=config)
+
+    host = SchedulerHost()
+    loader = ScheduleLoader(host, tables.database, build_generator=build_generator)
+    poll_changes(loader, added=3)
+    assert sorted(host.schedulers) == ['s1', 's2', 's3']
+    # the generators are only built when first needed
+    assert built == []
+    s1 = host.schedulers['s1']
+    generator = s1.get_generator()
+    poll_changes(loader)
+    assert loader.get_stats()['unchanged_polls'] == 1
+
+    # status changed only
+    tables.put_schedule('s2', 'g1', STREAM_SCHEDULE, 'Active', '2024-01-02 00:00:00')
+    poll_changes(loader, started=1)
+    tables.put_schedule('s2', 'g1', STREAM_SCHEDULE, 'Inactive', '2024-01-03 00:00:00')
+    poll_changes(loader, stopped=1)
+    # other columns edited
+    tables.execute("UPDATE schedulers SET name = 'renamed', edited_date = '2024-01-04 00:00:00' WHERE id = 's3'")
+    poll_changes(loader)
+
+    # schedule config changed: new version of the schedule, same generator
+    tables.put_schedule('s1', 'g1', dict(STREAM_SCHEDULE, rate=200), 'Active', '2024-01-05 00:00:00')
+    poll_changes(loader, reloaded=1)
+    assert host.schedulers['s1'] is not s1
+    assert host.schedulers['s1'].get_generator() is generator
+    assert host.schedulers['s1'].rate == 200
+
+    # generator changed: new version of its schedules, with a new generator
+    s3 = host.schedulers['s3']
+    tables.put_generator('g1', UNIQUE_JOB_CONFIG, '2024-01-06 00:00:00')
+    poll_changes(loader, reloaded=2)
+    assert host.schedulers['s1'].get_generator() is not generator
+    assert built[-1] == ('g1', '2024-01-06 00:00:00')
+    assert host.schedulers['s3'] is s3
+
+    tables.execute("DELETE FROM schedulers WHERE id = 's2'")
+    poll_changes(loader, removed=1)
+    assert sorted(host.schedulers) == ['s1', 's3']
+    stats = loader.get_stats()
+    assert (stats['polls'], stats['unchanged_polls'], stats['schedules']) == (8, 1, 2)
+
+
+def test_schedules_failing_to_load_are_tried_again_once_edited(tables):
+    tables.put_schedule('s1', 'g1', STREAM_SCHEDULE, 'Active', '2024-01-01 00:00:00')
+    tables.put_schedule('s2', 'g2', {'type': 'hourly'}, 'Active', '2024-01-01 00:00:00')
+    tables.put_generator('g2', UNIQUE_JOB_CONFIG, '2024-01-01 00:00:00')
+    host = SchedulerHost()
+    loader = ScheduleLoader(host, tables.database)
+    # missing generator, unknown schedule type
+    poll_changes(loader, failed=2)
+    poll_changes(loader)
+    assert host.schedulers == {}
+
+    tables.put_generator('g1', UNIQUE_JOB_CONFIG, '2024-01-02 00:00:00')
+    tables.put_schedule('s2', 'g2', STREAM_SCHEDULE, 'Active', '2024-01-02 00:00:00')
+    poll_changes(loader, added=2)
+
+    # a hosted schedule whose new version fails to load is removed
+    tables.put_schedule('s2', 'g2', {'type': 'hourly'}, 'Active', '2024-01-03 00:00:00')
+    poll_changes(loader, failed=1)
+    assert sorted(host.schedulers) == ['s1']
+    tables.execute("DELETE FROM generators WHERE id = 'g1'")
+    poll_changes(loader, failed=1)
+    assert host.schedulers == {}
+
+
+def test_generators_never_edited_are_built_with_their_creation_time(tables):
+    tables.execute('INSERT INTO generators (id, name, config, created_time) VALUES (?, ?, ?, ?)',
+                   ('g1', 'g1', json.dumps(UNIQUE_JOB_CONFIG), '2024-01-01 00:00:00'))
+    tables.put_schedule('s1', 'g1', STREAM_SCHEDULE, 'Inactive', '2024-01-01 00:00:00')
+    host = SchedulerHost()
+    loader = ScheduleLoader(host, tables.database)
+    poll_changes(loader, added=1)
+    generator = host.schedulers['s1'].get_generator()
+    assert (generator.generator_id, generator.edited_time) == ('g1', '2024-01-01 00:00:00')
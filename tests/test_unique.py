@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from errors import ExporterError
+from generators.base_generator import BaseGenerator
+
+
+def unique_job_config(method):
+    return {
+        'objects': [
+            {
+                'id': {'type': 'numeric', 'lower-bound': 1, 'upper-bound': 5000, 'unique': method},
+                'code': {'type': 'string', 'length': 6, 'unique': True},
+            }
+        ]
+    }
+
+
+@pytest.mark.parametrize('method', ['permutation', 'bitmap', 'bloom'])
+@pytest.mark.parametrize('vectorized', [False, True])
+def test_unique_values_generated_once(method, vectorized):
+    generator = BaseGenerator(job_config=unique_job_config(method), seed=5, vectorized=vectorized)
+    items = generator.generate(2000)
+    assert len({item['id'] for item in items}) == len(items) == 2000
+    assert len({item['code'] for item in items}) == len(items)
+    assert all(1 <= item['id'] <= 5000 for item in items)
+
+
+@pytest.mark.parametrize('method', ['permutation', 'bitmap', 'bloom'])
+def test_unique_values_generated_once_across_shards(method):
+    job_config = unique_job_config(method)
+    items = BaseGenerator(task_id='sharded', job_config=job_config, seed=5, time_anchor='2024-01-01 00:00:00').generate_sharded(4000, shards=4, processes=4)
+    assert len(items) == 4000
+    assert len({item['id'] for item in items}) == len(items)
+    assert len({item['code'] for item in items}) == len(items)
+    assert all(1 <= item['id'] <= 5000 for item in items)
+
+    # the shares do not depend on the processes the shards run in
+    in_one_process = BaseGenerator(task_id='sharded', job_config=job_config, seed=5, time_anchor='2024-01-01 00:00:00').generate_sharded(4000, shards=4, processes=1)
+    assert in_one_process == items
+
+
+def test_unique_range_exhausted_by_shards():
+    job_config = {'objects': [{'id': {'type': 'numeric', 'lower-bound': 0, 'upper-bound': 99, 'unique': 'permutation'}}]}
+    items = BaseGenerator(job_config=job_config, seed=2).generate_sharded(100, shards=3, processes=3)
+    assert sorted(item['id'] for item in items) == list(range(0, 100))
+
+
+@pytest.mark.parametrize('method', ['permutation', 'bitmap'])
+def test_exact_methods_reject_distributions(method):
+    job_config = {'objects': [{'id': {'type': 'numeric', 'lower-bound': 0, 'upper-bound': 99, 'distribution': 'normal',
+                                      'mean': 50, 'stddev': 1, 'unique': method}}]}
+    with pytest.raises(ExporterError):
+        BaseGenerator(job_config=job_config)
+
+
+def test_bloom_fails_when_the_distribution_is_exhausted():
+    job_config = {'objects': [{'id': {'type': 'numeric', 'lower-bound': 0, 'upper-bound': 99, 'distribution': 'normal',
+                                      'mean': 50, 'stddev': 1, 'unique': True}}]}
+    generator = BaseGenerator(job_config=job_config, seed=1)
+    with pytest.raises(ExporterError):
+        generator.generate(30)
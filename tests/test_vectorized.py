@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+
+import pytest
+
+from errors import ExporterError
+from generators.base_generator import BaseGenerator
+
+TIME_ANCHOR = '2024-01-01 00:00:00'
+
+JOB_CONFIG = {
+    'variables': {
+        'iteration': {'type': 'numeric', 'lower-bound': 0, 'upper-bound': 1000000, 'unique': 'permutation'},
+        'customer': {'type': 'string', 'length': 8},
+    },
+    'objects': [
+        {
+            'iteration': {'type': 'variable', 'id': 'iteration'},
+            'customer_id': {'type': 'variable', 'id': 'customer'},
+            'age': {'type': 'numeric', 'lower-bound': 18, 'upper-bound': 90},
+            'score': {'type': 'float', 'lower-bound': -1.5, 'upper-bound': 1.5},
+            'birthdate': {'type': 'datetime', 'lower-bound': 'YEAR-60', 'upper-bound': 'YEAR-20'},
+            'code': {'type': 'string', 'min-length': 2, 'max-length': 6},
+            'country': ['FR', 'DE', 'IT'],
+            'source': 'web',
+            'version': 3,
+        },
+        {
+            '__probability': 0.3,
+            'iteration': {'type': 'variable', 'id': 'iteration'},
+            'customer_id': {'type': 'variable', 'id': 'customer'},
+            'status': {'type': 'choice', 'values': ['new', 'paid', 'shipped']},
+            'amount': {'type': 'float', 'lower-bound': 0, 'upper-bound': 500},
+            'created': {'type': 'datetime', 'lower-bound': 'DAY-1', 'upper-bound': 'NOW'},
+        },
+        {
+            # never generated, an empty batch of this object type every time
+            '__probability': 0,
+            'iteration': {'type': 'variable', 'id': 'iteration'},
+            'seen': {'type': 'datetime', 'lower-bound': 'DAY-1', 'upper-bound': 'NOW'},
+        },
+    ]
+}
+
+
+def generate_both(generate_time):
+    scalar = BaseGenerator(job_config=JOB_CONFIG, seed=4, time_anchor=TIME_ANCHOR)
+    vectorized = BaseGenerator(job_config=JOB_CONFIG, seed=4, time_anchor=TIME_ANCHOR, vectorized=True)
+    return scalar.generate(generate_time), vectorized.generate_batch(generate_time)
+
+
+def check_domains(item):
+    if 'age' in item:
+        assert 18 <= item['age'] <= 90
+        assert -1.5 <= item['score'] <= 1.5
+        # years of 365 days
+        assert '1964-01-16' <= item['birthdate'] <= '2004-01-07'
+        assert 2 <= len(item['code']) <= 6
+        assert item['country'] in ['FR', 'DE', 'IT']
+        assert (item['source'], item['version']) == ('web', 3)
+    else:
+        assert item['status'] in ['new', 'paid', 'shipped']
+        assert 0 <= item['amount'] <= 500
+        assert '2023-12-31 00:00:00' <= item['created'] <= TIME_ANCHOR
+    for key in ('birthdate', 'created'):
+        if key in item:
+            datetime.datetime.strptime(item[key], '%Y-%m-%d %H:%M:%S')
+    assert len(item['customer_id']) == 8
+
+
+def test_same_fields_types_and_domains():
+    scalar_items, vectorized_items = generate_both(3000)
+    assert {tuple(item) for item in scalar_items} == {tuple(item) for item in vectorized_items}
+    scalar_types = {(key, type(value)) for item in scalar_items for key, value in item.items()}
+    vectorized_types = {(key, type(value)) for item in vectorized_items for key, value in item.items()}
+    assert scalar_types == vectorized_types
+    for item in scalar_items + vectorized_items:
+        check_domains(item)
+
+
+def test_iteration_order():
+    for items in generate_both(3000):
+        # iteration by iteration, the objects of an iteration in config order
+        iterations = []
+        for item in items:
+            if not iterations or iterations[-1][0] != item['iteration']:
+                iterations.append((item['iteration'], []))
+            iterations[-1][1].append('age' in item)
+        assert len(iterations) == 3000
+        assert len({iteration for iteration, objects in iterations}) == 3000
+        assert all(objects in ([True], [True, False]) for iteration, objects in iterations)
+
+
+def test_object_counts_follow_probabilities():
+    scalar_items, vectorized_items = generate_both(10000)
+    for items in (scalar_items, vectorized_items):
+        assert sum(1 for item in items if 'age' in item) == 10000
+        assert 2700 < sum(1 for item in items if 'status' in item) < 3300
+        assert not any('seen' in item for item in items)
+
+
+@pytest.mark.parametrize('generate_time', [0, 1])
+def test_small_batches(generate_time):
+    scalar_items, vectorized_items = generate_both(generate_time)
+    assert sum(1 for item in scalar_items if 'age' in item) == generate_time
+    assert sum(1 for item in vectorized_items if 'age' in item) == generate_time
+    scalar_grouped = BaseGenerator(job_config=JOB_CONFIG, seed=4, time_anchor=TIME_ANCHOR).generate_grouped(generate_time)
+    vectorized_grouped = BaseGenerator(job_config=JOB_CONFIG, seed=4, time_anchor=TIME_ANCHOR, vectorized=True).generate_batch(generate_time, grouped=True)
+    for grouped in (scalar_grouped, vectorized_grouped):
+        assert len(grouped) == 3
+        assert (len(grouped[0]), len(grouped[2])) == (generate_time, 0)
+
+
+def test_sample_config():
+    # the sample config has a datetime field in an object type with few objects, often none in a single iteration
+    for seed in range(0, 20):
+        items = BaseGenerator(job_config=BaseGenerator.sample, seed=seed, vectorized=True).generate(1)
+        assert len(items) <= 2
+
+
+@pytest.mark.parametrize('vectorized', [False, True])
+@pytest.mark.parametrize('config', [
+    {'type': 'numeric', 'lower-bound': 0, 'upper-bound': 2**70},
+    {'type': 'numeric', 'lower-bound': 2**63 - 10, 'upper-bound': 2**63 - 1},
+    {'type': 'numeric', 'lower-bound': -2**63, 'upper-bound': 2**63 - 1, 'unique': True},
+    {'type': 'numeric', 'lower-bound': 0, 'upper-bound': 2**70, 'distribution': 'normal'},
+])
+def test_integers_out_of_int64(config, vectorized):
+    generator = BaseGenerator(job_config={'objects': [{'value': config}]}, seed=4, vectorized=vectorized)
+    values = [item['value'] for item in generator.generate(100)]
+    assert all(type(value) is int and config['lower-bound'] <= value <= config['upper-bound'] for value in values)
+    if 'unique' in config:
+        assert len(set(values)) == 100
+
+
+@pytest.mark.parametrize('vectorized', [False, True])
+def test_datetime_bounds_order(vectorized):
+    config = {'type': 'datetime', 'lower-bound': 'DAY-1', 'upper-bound': 'DAY-2'}
+    with pytest.raises(ExporterError):
+        BaseGenerator(job_config={'objects': [{'value': config}]}, time_anchor=TIME_ANCHOR, vectorized=vectorized)
+
+    # bounds whose order changes with the time of the day
+    config = {'type': 'datetime', 'lower-bound': 'DAY-1', 'upper-bound': 'HOUR-30'}
+    generator = BaseGenerator(job_config={'objects': [{'value': config}]}, seed=4, time_anchor='2024-01-01 12:00:00',
+                              vectorized=vectorized)
+    generator.generate(1)
+    generator.time_anchor.resolved['HOUR-30'] = generator.time_anchor.resolved['DAY-1'] - 3600
+    values = [item['value'] for item in generator.generate(100)]
+    assert all('2023-12-30 23:00:01' <= value <= '2023-12-31 00:00:00' for value in values)
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+
+from flask import Blueprint, Response
+
+from instrumentation import get_instrumentation
+from generators.config_cache import get_config_cache
+from generators import unique, pipeline
+
+metrics = Blueprint('metrics', __name__)
+
+
+@metrics.route('/metrics')
+def get_metrics():
+    # plain text metrics of the generators and schedulers running in this process
+    instrumentation = get_instrumentation()
+    text = instrumentation.to_text() if instrumentation is not None else ''
+    text += get_config_cache().to_text()
+    text += unique.to_text()
+    text += pipeline.to_text()
+    return Response(text, mimetype='text/plain')